@@ -1,4 +1,10 @@
+from django.apps import apps
 from django.contrib import admin
+from django.contrib.admin.sites import all_sites
+from django.contrib.contenttypes.models import ContentType
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 from django.shortcuts import reverse
@@ -8,7 +14,11 @@ from django.urls import path
 from admin_numeric_filter.admin import NumericFilterModelAdmin
 
 from simpellab.core import hooks
-from simpellab.admin.views import PDFPrintDetailView
+from simpellab.core.journal import journal_transitions
+from simpellab.core.search import SEARCH_RESULTS_LIMIT, search
+from simpellab.admin.views import (
+    PDFPrintDetailView, PDFRenderStatusView,
+    pdf_download_view, print_selected_view)
 from simpellab.admin.sites import admin_site
 from simpellab.admin.menus import (
     admin_menu, 
@@ -31,10 +41,121 @@ class ReadOnlyAdminMixin(admin.ModelAdmin):
         return False
 
 
+class PolymorphicParentAdminMixin:
+    """
+    Child models of polymorphic parent admin, ``child_models`` extended
+    by models returned from ``child_models_hook`` functions::
+
+        @hooks.register('product_child_model', order=1)
+        def register_child_model():
+            return ProductChildModel
+
+    Resolved on first use once apps are loaded and kept per admin class,
+    menus instantiate admins on every request. Invalid hooks are reported
+    by ``check_polymorphic_admins`` at startup.
+    """
+    child_models_hook = None
+
+    # Admin class to tuple of child models
+    _child_models = {}
+
+    @classmethod
+    def resolve_child_models(cls, model):
+        if cls in cls._child_models:
+            return cls._child_models[cls]
+        child_models = list(cls.child_models or [])
+        hook_funcs = hooks.get_hooks(cls.child_models_hook) if cls.child_models_hook else []
+        for func in hook_funcs:
+            value = func()
+            if not (isinstance(value, type) and issubclass(value, model)):
+                raise ImproperlyConfigured(
+                    'Hook %s should return %s subclass, got %r' % (
+                        cls.child_models_hook, model.__name__, value))
+            child_models.append(value)
+        child_models = tuple(child_models)
+        # Hooks are final once apps are loaded
+        if apps.ready:
+            cls._child_models[cls] = child_models
+        return child_models
+
+    @cached_property
+    def registered_child_models(self):
+        return self.resolve_child_models(self.model)
+
+    @cached_property
+    def child_content_type_ids(self):
+        """ Content type id of each child model, from content types
+            cached by ContentTypeManager """
+        content_types = ContentType.objects.get_for_models(
+            *self.registered_child_models, for_concrete_models=False)
+        return {
+            model: content_types[model].id
+            for model in self.registered_child_models
+        }
+
+    def get_child_models(self):
+        return list(self.registered_child_models)
+
+    def get_child_type_choices(self, request, action):
+        self._lazy_setup()
+        choices = []
+        for model, ct_id in self.child_content_type_ids.items():
+            model_admin = self._get_real_admin_by_model(model)
+            if getattr(model_admin, 'has_%s_permission' % action)(request):
+                choices.append((ct_id, model._meta.verbose_name))
+        return choices
+
+
+def check_polymorphic_admins(app_configs=None, **kwargs):
+    """ System check of child model hooks of registered polymorphic
+        parent admins, invalid hooks fail at startup """
+    errors = []
+    for site in all_sites:
+        for model, modeladmin in site._registry.items():
+            if not isinstance(modeladmin, PolymorphicParentAdminMixin):
+                continue
+            try:
+                modeladmin.resolve_child_models(model)
+            except ImproperlyConfigured as err:
+                errors.append(checks.Error(
+                    str(err), obj=modeladmin.__class__, id='simpellab_admin.E001'))
+    return errors
+
+
+class StatusJournalAdminMixin(admin.ModelAdmin):
+    """ Journal status transitions of change form and actions
+        in one write, by the request user """
+
+    def changeform_view(self, request, *args, **kwargs):
+        with journal_transitions(actor=request.user):
+            return super().changeform_view(request, *args, **kwargs)
+
+    def response_action(self, request, queryset):
+        with journal_transitions(actor=request.user):
+            return super().response_action(request, queryset)
+
+
+class SearchIndexAdminMixin(admin.ModelAdmin):
+    """ Search changelist and autocomplete with model search index,
+        autocomplete results are limited to the best matches, ranked
+        best match first """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        limit = None
+        match = getattr(request, 'resolver_match', None)
+        if match and match.url_name and match.url_name.endswith('_autocomplete'):
+            limit = SEARCH_RESULTS_LIMIT
+        return search(queryset, search_term, limit=limit), False
+
+
 class ModelAdminPDFPrintMixin(admin.ModelAdmin):
 
     print_view_class = PDFPrintDetailView
+    print_status_view_class = PDFRenderStatusView
     print_template = 'admin/print/content.html'
+    print_async = False
     document_title = None
     document_show_cover = False
     document_show_header = True
@@ -44,6 +165,18 @@ class ModelAdminPDFPrintMixin(admin.ModelAdmin):
         info = self.model._meta.app_label, self.model._meta.model_name
         urls = super().get_urls()
         custom_urls = []
+        custom_urls.append(
+            path('print/<slug:key>/',
+                    self.admin_site.admin_view(self.print_status_view),
+                    name='%s_%s_print_status' % info
+                    )
+        )
+        custom_urls.append(
+            path('print/<slug:key>/download/',
+                    self.admin_site.admin_view(self.print_download_view),
+                    name='%s_%s_print_download' % info
+                    )
+        )
         custom_urls.append(
             path('<path:object_id>/print/',
                     self.admin_site.admin_view(self.print_view),
@@ -55,11 +188,29 @@ class ModelAdminPDFPrintMixin(admin.ModelAdmin):
     def print_view(self, request, object_id, *args, **kwargs):
         kwargs.update(**{
             'modeladmin':self,
-            'instance_pk':object_id
+            'instance_pk':object_id,
+            'render_async': self.print_async,
         })
         view_class = self.print_view_class
         return view_class.as_view(**kwargs)(request)
 
+    def print_status_view(self, request, key, *args, **kwargs):
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        kwargs.update(**{'modeladmin': self, 'key': key})
+        view_class = self.print_status_view_class
+        return view_class.as_view(**kwargs)(request)
+
+    def print_download_view(self, request, key):
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        return pdf_download_view(request, self, key)
+
+    def print_selected_action(self, request, queryset):
+        return print_selected_view(request, self, queryset)
+
+    print_selected_action.short_description = _('Print selected %(verbose_name_plural)s')
+
     def get_list_display(self, request):
         list_display = super().get_list_display(request).copy()
         if self.has_view_or_change_permission(request):
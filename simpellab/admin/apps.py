@@ -4,4 +4,9 @@ from django.utils.translation import ugettext_lazy as _
 class AppConfig(BaseAppConfig):
     name = 'simpellab.admin'
     label = 'simpellab_admin'
-    verbose_name = _('Simpellab Admin')
\ No newline at end of file
+    verbose_name = _('Simpellab Admin')
+
+    def ready(self):
+        from django.core import checks
+        from simpellab.admin.admin import check_polymorphic_admins
+        checks.register(check_polymorphic_admins, checks.Tags.admin)
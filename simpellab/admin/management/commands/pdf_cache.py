@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from simpellab.admin.pdf import pdf_cache
+
+
+class Command(BaseCommand):
+    help = 'Show rendered PDF cache hit/miss counters and size.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Remove cached files and reset counters.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            pdf_cache.clear()
+            self.stdout.write(self.style.SUCCESS('PDF cache cleared'))
+            return
+        stats = pdf_cache.stats()
+        self.stdout.write(
+            'hits: {hits}, misses: {misses}, hit ratio: {hit_ratio:.2%}\n'
+            'files: {files}, size: {size} bytes'.format(**stats))
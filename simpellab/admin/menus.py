@@ -1,7 +1,7 @@
 from django.utils.functional import lazy
 from django.shortcuts import reverse
 
-from simpellab.core.menus import MenuItem, Menu, MenuDropdown
+from simpellab.core.menus import MenuItem, Menu, MenuDropdown, CachedMenu
 
 
 class ModelAdminMenuItem(MenuItem):
@@ -76,4 +76,4 @@ class SubMenu(Menu):
         self._registered_menu_items = menuitem_list
 
 
-admin_menu = Menu(hook_name='admin_menu_item')
\ No newline at end of file
+admin_menu = CachedMenu(hook_name='admin_menu_item')
\ No newline at end of file
@@ -0,0 +1,278 @@
+import fcntl
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.encoding import smart_str
+
+from PyPDF2 import PdfFileMerger
+from wkhtmltopdf.utils import convert_to_pdf, make_absolute_paths
+from wkhtmltopdf.views import PDFTemplateResponse
+
+
+__all__ = [
+    'render_html',
+    'html_to_pdf',
+    'PDFRenderBusy',
+    'process_slot',
+    'merge_pdfs',
+    'PDFCache',
+    'pdf_cache',
+    'CachedPDFTemplateResponse',
+]
+
+
+PDF_CACHE_ROOT = getattr(
+    settings, 'PDF_CACHE_ROOT', os.path.join(settings.BASE_DIR, 'pdfcache'))
+PDF_CACHE_MAX_SIZE = getattr(settings, 'PDF_CACHE_MAX_SIZE', 512 * 1024 * 1024)
+PDF_MAX_PROCESSES = getattr(settings, 'PDF_MAX_PROCESSES', 2)
+PDF_PROCESS_TIMEOUT = getattr(settings, 'PDF_PROCESS_TIMEOUT', 30)
+PDF_LOCK_ROOT = getattr(
+    settings, 'PDF_LOCK_ROOT',
+    os.path.join(tempfile.gettempdir(), 'simpellab_wkhtmltopdf'))
+
+
+class PDFRenderBusy(Exception):
+    """ All wkhtmltopdf slots are still used after timeout """
+
+
+@contextmanager
+def process_slot(slots=PDF_MAX_PROCESSES, timeout=PDF_PROCESS_TIMEOUT):
+    """
+    Hold one of ``slots`` lock files in PDF_LOCK_ROOT, every process on
+    the host share the same files so no more than ``slots`` wkhtmltopdf
+    run at once. Raise PDFRenderBusy when no slot is freed in ``timeout``
+    seconds.
+    """
+    os.makedirs(PDF_LOCK_ROOT, exist_ok=True)
+    deadline = time.monotonic() + timeout
+    while True:
+        for slot in range(slots):
+            lock_file = open(os.path.join(PDF_LOCK_ROOT, '%s.lock' % slot), 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+            try:
+                yield slot
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+            return
+        if time.monotonic() >= deadline:
+            raise PDFRenderBusy(
+                'No wkhtmltopdf slot freed in %s seconds' % timeout)
+        time.sleep(0.1)
+
+
+def render_html(template, context, request=None):
+    """ Render resolved template for wkhtmltopdf, media and static
+        urls are converted to file paths """
+    if template is None:
+        return None
+    content = smart_str(template.render(context, request))
+    return make_absolute_paths(content)
+
+
+def write_temporary_file(content):
+    html_file = tempfile.NamedTemporaryFile(
+        prefix='wkhtmltopdf', suffix='.html', delete=True)
+    html_file.write(content.encode('utf-8'))
+    html_file.flush()
+    return html_file
+
+
+def html_to_pdf(content, header=None, footer=None, cover=None, cmd_options=None):
+    """ Convert rendered html pages to PDF bytes with wkhtmltopdf,
+        wait for a free process slot first """
+    files = {
+        name: write_temporary_file(html)
+        for name, html in [('content', content), ('header', header),
+                           ('footer', footer), ('cover', cover)]
+        if html is not None
+    }
+    try:
+        with process_slot():
+            return convert_to_pdf(
+                filename=files['content'].name,
+                header_filename=files['header'].name if 'header' in files else None,
+                footer_filename=files['footer'].name if 'footer' in files else None,
+                cover_filename=files['cover'].name if 'cover' in files else None,
+                cmd_options=dict(cmd_options or {}))
+    finally:
+        for html_file in files.values():
+            html_file.close()
+
+
+def merge_pdfs(parts):
+    """ Concatenate PDF bytes into single PDF """
+    merger = PdfFileMerger()
+    for part in parts:
+        merger.append(io.BytesIO(part))
+    output = io.BytesIO()
+    merger.write(output)
+    merger.close()
+    return output.getvalue()
+
+
+class PDFCache:
+    """
+    Rendered PDF files stored on disk, keyed by hash of rendered html
+    and wkhtmltopdf options. Least recently used files are evicted
+    when total size exceed ``max_size``. Hit and miss are counted in
+    Django cache so every process share the counters.
+    """
+
+    def __init__(self, root=PDF_CACHE_ROOT, max_size=PDF_CACHE_MAX_SIZE):
+        self.root = root
+        self.max_size = max_size
+
+    def make_key(self, pages, cmd_options=None):
+        digest = hashlib.sha256()
+        for page in pages:
+            digest.update((page or '').encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(json.dumps(cmd_options or {}, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def make_merged_key(self, documents):
+        """ Key of merged PDF from list of (pages, cmd_options) """
+        return self.make_key(
+            [self.make_key(pages, cmd_options) for pages, cmd_options in documents])
+
+    def get_path(self, key):
+        return os.path.join(self.root, '%s.pdf' % key)
+
+    def count(self, name):
+        key = 'pdfcache:%s' % name
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted between add and incr
+            cache.set(key, 1, None)
+
+    def stats(self):
+        hits = cache.get('pdfcache:hits', 0)
+        misses = cache.get('pdfcache:misses', 0)
+        files = self.get_files()
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else 0,
+            'files': len(files),
+            'size': sum(size for path, size, used in files),
+        }
+
+    def exists(self, key):
+        return os.path.exists(self.get_path(key))
+
+    def get(self, key):
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as pdf_file:
+                content = pdf_file.read()
+        except FileNotFoundError:
+            self.count('misses')
+            return None
+        # Mark as recently used
+        os.utime(path)
+        self.count('hits')
+        return content
+
+    def set(self, key, content):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as pdf_file:
+            pdf_file.write(content)
+        os.replace(tmp_path, self.get_path(key))
+        self.evict()
+
+    def get_files(self):
+        files = []
+        if not os.path.isdir(self.root):
+            return files
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def evict(self):
+        """ Remove least recently used files until under max size """
+        files = self.get_files()
+        total = sum(size for path, size, used in files)
+        for path, size, used in sorted(files, key=lambda f: f[2]):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for path, size, used in self.get_files():
+            os.remove(path)
+        cache.delete_many(['pdfcache:hits', 'pdfcache:misses'])
+
+    def render(self, content, header=None, footer=None, cover=None, cmd_options=None):
+        """ Get cached PDF of rendered pages or convert and store it """
+        key = self.make_key([content, header, footer, cover], cmd_options)
+        pdf = self.get(key)
+        if pdf is None:
+            pdf = html_to_pdf(content, header, footer, cover, cmd_options)
+            self.set(key, pdf)
+        return pdf
+
+    def render_merged(self, documents, workers=PDF_MAX_PROCESSES, key=None):
+        """
+        Render each (pages, cmd_options) document, reusing cached ones,
+        and store them merged in a single PDF under ``key``, default to
+        key of the documents. Return key of the merged PDF.
+
+        Documents are converted concurrently by ``workers`` threads, a
+        process pool isn't needed: html is already rendered and each
+        thread only waits on its own wkhtmltopdf subprocess.
+        """
+        key = key or self.make_merged_key(documents)
+        if self.exists(key):
+            self.count('hits')
+            return key
+        self.count('misses')
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(
+                lambda document: self.render(*document[0], document[1]),
+                documents))
+        self.set(key, merge_pdfs(parts))
+        return key
+
+
+pdf_cache = PDFCache()
+
+
+class CachedPDFTemplateResponse(PDFTemplateResponse):
+    """ PDFTemplateResponse reusing PDF rendered from identical html """
+
+    def get_rendered_pages(self):
+        context = self.resolve_context(self.context_data)
+        return [
+            render_html(self.resolve_template(template), context, self._request)
+            if template else None
+            for template in [self.template_name, self.header_template,
+                             self.footer_template, self.cover_template]
+        ]
+
+    @property
+    def rendered_content(self):
+        content, header, footer, cover = self.get_rendered_pages()
+        return pdf_cache.render(
+            content, header, footer, cover, self.cmd_options.copy())
@@ -1,15 +1,66 @@
-from django.utils import timezone
-from django.shortcuts import get_object_or_404
+from django.apps import apps
+from django.conf import settings
+from django.contrib.admin.sites import all_sites
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone, translation
+from django.utils.crypto import constant_time_compare
+from django.utils.http import urlencode
+from django.utils.text import get_valid_filename
+from django.shortcuts import get_object_or_404, redirect
+from django.views.generic import TemplateView
 
 from constance import config
 from wkhtmltopdf.views import PDFTemplateView
 
+from simpellab.admin.pdf import (
+    CachedPDFTemplateResponse, PDFRenderBusy, PDF_PROCESS_TIMEOUT, pdf_cache)
+from simpellab.admin.workers import (
+    fetch_render_job, render_pdf_later, render_selected_pdf_later)
+
+_ = translation.gettext_lazy
+
+# Print selected renders in request up to this many documents, more
+# are rendered in background even if the model admin print in request
+PDF_SYNC_MAX_DOCUMENTS = getattr(settings, 'PDF_SYNC_MAX_DOCUMENTS', 5)
+
+
+def get_print_token(opts, key):
+    """ Signature of PDF cache key printed by model admin of opts """
+    return signing.Signer(salt='simpellab.admin.print').signature(
+        '%s:%s' % (opts.label, key))
+
+
+def check_print_token(request, opts, key):
+    """ Deny PDF cache key not printed by model admin of opts """
+    token = request.GET.get('token', '')
+    if not constant_time_compare(token, get_print_token(opts, key)):
+        raise Http404(_('Print job not found.'))
+
+
+def get_print_url(modeladmin, action, key, filename=None):
+    url = reverse(modeladmin.get_url_name(action), args=(key,))
+    return '%s?%s' % (url, urlencode({
+        'filename': filename or '',
+        'token': get_print_token(modeladmin.opts, key),
+    }))
+
+
+def redirect_to_print(modeladmin, key, filename=None):
+    """ Redirect to rendered PDF download, or to its job status page """
+    action = 'print_download' if pdf_cache.exists(key) else 'print_status'
+    return redirect(get_print_url(modeladmin, action, key, filename))
+
 
 class ModelAdminPDFViewBase(PDFTemplateView):
+    response_class = CachedPDFTemplateResponse
     title = None
     modeladmin = None
     filename = None
     show_content_in_browser = True
+    render_async = False
     template_name = 'admin/print/content.html'
     cover_template = 'admin/print/cover.html'
     header_template = 'admin/print/header.html'
@@ -62,15 +113,54 @@ class ModelAdminPDFViewBase(PDFTemplateView):
     def get_cmd_options(self):
         return self.cmd_options
 
+    def get_pdf_response(self, context, **response_kwargs):
+        """ Unrendered PDF response, or html response for ?as=html """
+        return super().render_to_response(context, **response_kwargs)
+
+    def get_document(self, request):
+        """ Rendered html pages and wkhtmltopdf options of this view """
+        self.setup(request)
+        self.apply_settings(request)
+        response = self.get_pdf_response(self.get_context_data())
+        return response.get_rendered_pages(), response.cmd_options.copy()
+
+    def render_to_response(self, context, **response_kwargs):
+        response = self.get_pdf_response(context, **response_kwargs)
+        if not isinstance(response, CachedPDFTemplateResponse):
+            # Requested as html
+            return response
+        if self.render_async:
+            return self.render_later(response)
+        try:
+            return response.render()
+        except PDFRenderBusy:
+            busy = HttpResponse(
+                _('Too many documents are being printed, please try again.'),
+                status=503)
+            busy['Retry-After'] = PDF_PROCESS_TIMEOUT
+            return busy
+
+    def render_later(self, response):
+        """ Enqueue PDF conversion and redirect to the job status page,
+            or straight to the file when it is already rendered """
+        pages = response.get_rendered_pages()
+        cmd_options = response.cmd_options.copy()
+        key = pdf_cache.make_key(pages, cmd_options)
+        if not pdf_cache.exists(key):
+            render_pdf_later(pages, cmd_options)
+        return redirect_to_print(self.modeladmin, key, response.filename)
+
 
 class PDFPrintDetailView(ModelAdminPDFViewBase):
     instance = None
     instance_pk = None
 
-    def __init__(self, modeladmin, instance_pk, *args, **kwargs):
+    def __init__(self, modeladmin, instance_pk=None, instance=None, *args, **kwargs):
         super().__init__(modeladmin, *args, **kwargs)
-        self.instance_pk = instance_pk
-        self.instance = get_object_or_404(self.model, pk=instance_pk)
+        if instance is None:
+            instance = get_object_or_404(self.model, pk=instance_pk)
+        self.instance_pk = instance.pk
+        self.instance = instance
 
     def get_title(self):
         return self.modeladmin.document_title or super().get_title()
@@ -83,10 +173,11 @@ class PDFPrintDetailView(ModelAdminPDFViewBase):
             'margin-bottom': config.PDF_MARGIN_BOTTOM,
             'orientation': config.PDF_ORIENTATION
         }
+        self.cmd_options = {**self.cmd_options, **options}
         if not self.modeladmin.document_show_cover:
             self.cover_template = None
         if not self.modeladmin.document_show_header:
-            self.headertemplate = None
+            self.header_template = None
         if not self.modeladmin.document_show_footer:
             self.footer_template = None
 
@@ -103,4 +194,140 @@ class PDFPrintDetailView(ModelAdminPDFViewBase):
                 'admin/print/%s/content.html' % (model_name),
                 'admin/print/%s/content.html' % (app_label),
                 'admin/print/content.html',
-            ]
\ No newline at end of file
+            ]
+
+
+class PDFRenderStatusView(TemplateView):
+    """ Show background PDF render job status until file is ready """
+    template_name = 'admin/print/status.html'
+    modeladmin = None
+    key = None
+    refresh_interval = 2
+
+    def __init__(self, modeladmin, key, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.modeladmin = modeladmin
+        self.opts = modeladmin.model._meta
+        self.key = key
+
+    def get_status(self):
+        if pdf_cache.exists(self.key):
+            return 'finished'
+        job = fetch_render_job(self.key)
+        if job is None:
+            raise Http404(_('Print job not found.'))
+        status = job.get_status()
+        # Job is finished but file is evicted
+        return 'failed' if status == 'finished' else status
+
+    def get_download_url(self):
+        return get_print_url(
+            self.modeladmin, 'print_download', self.key,
+            self.request.GET.get('filename'))
+
+    def get(self, request, *args, **kwargs):
+        check_print_token(request, self.opts, self.key)
+        status = self.get_status()
+        download_url = self.get_download_url() if status == 'finished' else None
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'status': status, 'download_url': download_url})
+        if download_url:
+            return redirect(download_url)
+        context = self.get_context_data(status=status, **kwargs)
+        return self.render_to_response(context)
+
+    def get_context_data(self, **kwargs):
+        context = {
+            **self.modeladmin.admin_site.each_context(self.request),
+            'title': _('Printing %s') % self.opts.verbose_name,
+            'opts': self.opts,
+            'refresh_interval': self.refresh_interval,
+            'pending': kwargs['status'] != 'failed',
+        }
+        context.update(**kwargs)
+        return super().get_context_data(**context)
+
+
+def pdf_file_response(key, filename=None):
+    """ Stream rendered PDF from PDF cache """
+    path = pdf_cache.get_path(key)
+    try:
+        pdf_file = open(path, 'rb')
+    except FileNotFoundError:
+        raise Http404(_('Printed file is expired, please print again.'))
+    filename = get_valid_filename(filename or '') or 'document'
+    if not filename.endswith('.pdf'):
+        filename += '.pdf'
+    return FileResponse(
+        pdf_file, filename=filename, content_type='application/pdf')
+
+
+def get_selected_documents(request, modeladmin, objs):
+    """ Rendered (pages, cmd_options) document of every object """
+    return [
+        modeladmin.print_view_class(
+            modeladmin=modeladmin, instance=obj).get_document(request)
+        for obj in objs
+    ]
+
+
+def get_selection_key(request, modeladmin, objs):
+    """
+    PDF cache key of merged print of objects, from their primary key,
+    last modification and print options, the documents are rendered
+    later by background job.
+    """
+    view = modeladmin.print_view_class(modeladmin=modeladmin, instance=objs[0])
+    view.setup(request)
+    view.apply_settings(request)
+    objects = [
+        '%s:%s' % (obj.pk, getattr(obj, 'modified_at', '')) for obj in objs
+    ]
+    return pdf_cache.make_key(
+        [modeladmin.opts.label] + objects, view.get_cmd_options())
+
+
+def render_selected_pdf(site_name, model_label, pks, key, user_pk=None):
+    """ Render merged print of objects outside of request, by background job """
+    site = next(site for site in all_sites if site.name == site_name)
+    modeladmin = site._registry[apps.get_model(model_label)]
+    request = HttpRequest()
+    if user_pk is not None:
+        request.user = get_user_model()._default_manager.get(pk=user_pk)
+    objs = modeladmin.model._default_manager.in_bulk(pks)
+    objs = [objs[pk] for pk in pks if pk in objs]
+    documents = get_selected_documents(request, modeladmin, objs)
+    return pdf_cache.render_merged(documents, key=key)
+
+
+def print_selected_view(request, modeladmin, queryset):
+    """
+    Merge PDF of every selected object into single file, streamed when
+    rendered in request or delivered by job status page when the model
+    admin print in background or more than PDF_SYNC_MAX_DOCUMENTS are
+    selected, then the documents are rendered by the job.
+    """
+    objs = list(queryset)
+    if not objs:
+        return None
+    filename = modeladmin.print_view_class(
+        modeladmin=modeladmin, instance=objs[0]).get_filename()
+    if modeladmin.print_async or len(objs) > PDF_SYNC_MAX_DOCUMENTS:
+        key = get_selection_key(request, modeladmin, objs)
+        if not pdf_cache.exists(key):
+            render_selected_pdf_later(
+                modeladmin, [obj.pk for obj in objs], key, user=request.user)
+        return redirect_to_print(modeladmin, key, filename)
+    documents = get_selected_documents(request, modeladmin, objs)
+    try:
+        key = pdf_cache.render_merged(documents)
+    except PDFRenderBusy:
+        return HttpResponse(
+            _('Too many documents are being printed, please try again.'),
+            status=503)
+    return pdf_file_response(key, filename)
+
+
+def pdf_download_view(request, modeladmin, key):
+    check_print_token(request, modeladmin.opts, key)
+    return pdf_file_response(key, request.GET.get('filename'))
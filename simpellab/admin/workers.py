@@ -0,0 +1,58 @@
+import django_rq
+from django.conf import settings
+
+from simpellab.admin.pdf import pdf_cache
+
+PDF_RENDER_QUEUE = getattr(settings, 'PDF_RENDER_QUEUE', 'default')
+
+queue = django_rq.get_queue(PDF_RENDER_QUEUE)
+
+PENDING_STATUSES = ('queued', 'started', 'deferred', 'scheduled')
+
+
+def get_job_id(key):
+    return 'pdf-%s' % key
+
+
+def render_pdf_task(pages, cmd_options=None):
+    """ Convert rendered pages and store it in PDF cache """
+    content, header, footer, cover = pages
+    pdf_cache.render(content, header, footer, cover, cmd_options)
+    return pdf_cache.make_key(pages, cmd_options)
+
+
+def render_selected_pdf_task(site_name, model_label, pks, key, user_pk=None):
+    """ Render documents of selected objects and store them merged """
+    from simpellab.admin.views import render_selected_pdf
+    return render_selected_pdf(site_name, model_label, pks, key, user_pk)
+
+
+def fetch_render_job(key):
+    return queue.fetch_job(get_job_id(key))
+
+
+def enqueue_render(key, func, *args):
+    """ Enqueue render job of PDF cache key, skipped if pending """
+    job = fetch_render_job(key)
+    if job is None or job.get_status() not in PENDING_STATUSES:
+        queue.enqueue(func, *args, job_id=get_job_id(key))
+    return key
+
+
+def render_pdf_later(pages, cmd_options=None):
+    """
+    Enqueue PDF conversion of rendered pages and return the PDF cache
+    key, identical pages share one pending job.
+    """
+    key = pdf_cache.make_key(pages, cmd_options)
+    return enqueue_render(key, render_pdf_task, list(pages), cmd_options)
+
+
+def render_selected_pdf_later(modeladmin, pks, key, user=None):
+    """
+    Enqueue merged PDF of model admin objects, their documents are
+    rendered by the job. Return the PDF cache key.
+    """
+    return enqueue_render(
+        key, render_selected_pdf_task, modeladmin.admin_site.name,
+        modeladmin.model._meta.label, list(pks), key, getattr(user, 'pk', None))
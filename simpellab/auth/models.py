@@ -3,13 +3,16 @@ from django.db import models
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 
 from django_numerators.models import NumeratorMixin
 from django_personals.models import AddressAbstract, ContactAbstract
 from django_personals.enums import Gender, AddressName
 
 from simpellab.core.enums import MaxLength
+from simpellab.core.menus import invalidate_menus
 from simpellab.core.models import BaseModel, SimpleBaseModel
 from simpellab.auth.managers import PersonManager
 
@@ -172,3 +175,18 @@ class PersonAddress(AddressAbstract):
         Person, on_delete=models.CASCADE,
         related_name='addresses'
     )
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_menus_on_permission_change(sender, action, **kwargs):
+    if action in ['post_add', 'post_remove', 'post_clear']:
+        invalidate_menus()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def invalidate_menus_on_group_change(sender, **kwargs):
+    invalidate_menus()
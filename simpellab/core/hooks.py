@@ -1,9 +1,19 @@
+import threading
+from collections import Counter
 from operator import itemgetter
 
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+
 from simpellab.utils.apps import get_app_submodules
 
 _hooks = {}
 
+# Hook name to tuple of functions sorted by order, set by freeze()
+_frozen_hooks = None
+
+_lookups = threading.local()
+
 
 def register(hook_name, fn=None, order=0):
     """
@@ -18,6 +28,9 @@ def register(hook_name, fn=None, order=0):
         def my_hook(...):
             pass
         register('hook_name', my_hook)
+
+    Hooks must be registered while apps are loading, registering after
+    the registry is frozen raise ImproperlyConfigured.
     """
 
     # Pretend to be a decorator if fn is not supplied
@@ -27,6 +40,11 @@ def register(hook_name, fn=None, order=0):
             return fn
         return decorator
 
+    if _frozen_hooks is not None:
+        raise ImproperlyConfigured(
+            "Hook %s registered for '%s' after hooks registry is frozen, "
+            "register hooks in a module imported while apps are loading."
+            % (fn, hook_name))
     if hook_name not in _hooks:
         _hooks[hook_name] = []
     _hooks[hook_name].append((fn, order))
@@ -42,9 +60,44 @@ def search_for_hooks():
         _searched_for_hooks = True
 
 
+def sort_hooks(hooks):
+    return tuple(hook[0] for hook in sorted(hooks, key=itemgetter(1)))
+
+
+def freeze():
+    """ Sort every registered hooks once and refuse new registration """
+    global _frozen_hooks
+    search_for_hooks()
+    _frozen_hooks = {
+        hook_name: sort_hooks(hooks) for hook_name, hooks in _hooks.items()
+    }
+
+
 def get_hooks(hook_name):
     """ Return the hooks function sorted by their order. """
-    search_for_hooks()
-    hooks = _hooks.get(hook_name, [])
-    hooks = sorted(hooks, key=itemgetter(1))
-    return [hook[0] for hook in hooks]
+    count_lookup(hook_name)
+    if _frozen_hooks is None:
+        if not apps.ready:
+            # Still loading, more hooks may be registered
+            search_for_hooks()
+            return sort_hooks(_hooks.get(hook_name, []))
+        freeze()
+    return _frozen_hooks.get(hook_name, ())
+
+
+def start_lookup_count():
+    """ Count get_hooks calls of current thread by hook name """
+    _lookups.counter = Counter()
+
+
+def stop_lookup_count():
+    """ Stop counting and return the Counter of hook lookups """
+    counter = getattr(_lookups, 'counter', None)
+    _lookups.counter = None
+    return counter or Counter()
+
+
+def count_lookup(hook_name):
+    counter = getattr(_lookups, 'counter', None)
+    if counter is not None:
+        counter[hook_name] += 1
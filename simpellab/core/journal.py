@@ -0,0 +1,96 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+
+__all__ = [
+    'journal_transitions',
+    'record_transition',
+    'record_transitions',
+]
+
+
+_local = threading.local()
+
+
+class TransitionJournal:
+    """ Collect status transitions and write them with single
+        bulk_create when the block exit """
+
+    def __init__(self, actor=None):
+        self.actor = actor
+        self.entries = []
+
+    def add(self, entries):
+        for entry in entries:
+            if entry.actor_id is None:
+                entry.actor = self.actor
+            self.entries.append(entry)
+
+    def flush(self):
+        from simpellab.core.models import StatusTransition
+        entries, self.entries = self.entries, []
+        StatusTransition.objects.bulk_create(entries)
+
+
+def get_current_journal():
+    return getattr(_local, 'journal', None)
+
+
+@contextmanager
+def journal_transitions(actor=None, using=None):
+    """
+    Buffer status transitions written inside the block and save
+    them at once, in the same transaction::
+
+        with journal_transitions(actor=request.user):
+            for order in orders:
+                order.validate()
+
+    Nested blocks join the outermost journal.
+    """
+    journal = get_current_journal()
+    if journal is not None:
+        yield journal
+        return
+    journal = TransitionJournal(actor=actor)
+    _local.journal = journal
+    try:
+        with transaction.atomic(using=using):
+            yield journal
+            journal.flush()
+    finally:
+        _local.journal = None
+
+
+def record_transitions(objs, to_status, from_statuses=None, actor=None, timestamp=None):
+    """
+    Record transition of ``objs`` to ``to_status``, ``from_statuses``
+    is list of previous status in the same order as ``objs``.
+    """
+    from simpellab.core.models import StatusTransition
+    timestamp = timestamp or timezone.now()
+    if from_statuses is None:
+        from_statuses = [None] * len(objs)
+    entries = [
+        StatusTransition.for_object(
+            obj,
+            from_status=from_status,
+            to_status=to_status,
+            actor=actor,
+            timestamp=timestamp
+        ) for obj, from_status in zip(objs, from_statuses)
+    ]
+    journal = get_current_journal()
+    if journal is None:
+        StatusTransition.objects.bulk_create(entries)
+    else:
+        journal.add(entries)
+    return entries
+
+
+def record_transition(obj, from_status, to_status, actor=None):
+    """ Record single object status transition """
+    return record_transitions([obj], to_status, [from_status], actor=actor)
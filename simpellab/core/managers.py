@@ -1,7 +1,13 @@
-from django.db import models
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
 from django.db.models.functions import Coalesce
-from django.utils import translation
+from django.utils import translation, timezone
 from polymorphic.managers import PolymorphicManager
+from polymorphic.query import PolymorphicQuerySet
+
+from simpellab.core.enums import Status
+from simpellab.core.journal import record_transitions
 
 _ = translation.gettext_lazy
 
@@ -41,6 +47,279 @@ _ = translation.gettext_lazy
 #     return sqs
 
 
+# action: (target status, date field, status message word), payment
+# is left out, Invoice.pay needs the paid amount of each row.
+STATUS_TRANSITIONS = {
+    'trash': (Status.TRASH, 'date_trashed', 'trash'),
+    'draft': (Status.DRAFT, 'date_drafted', 'draft'),
+    'pending': (Status.PENDING, 'date_pending', 'pending'),
+    'validate': (Status.VALID, 'date_validated', 'validated'),
+    'approve': (Status.APPROVED, 'date_approved', 'approved'),
+    'reject': (Status.REJECTED, 'date_rejected', 'rejected'),
+    'complete': (Status.COMPLETE, 'date_completed', 'completed'),
+    'process': (Status.PROCESSED, 'date_processed', 'processed'),
+    'close': (Status.CLOSED, 'date_closed', 'closed'),
+}
+
+
+class StatusTransitionReport:
+    """ Per row result of bulk status transition """
+
+    CHANGED = 'changed'
+    IGNORED = 'ignored'
+    REJECTED = 'rejected'
+    SKIPPED = 'skipped'
+
+    def __init__(self, action):
+        self.action = action
+        self.results = []
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def add(self, obj, result, message=''):
+        self.results.append((obj, result, message))
+
+    def get_rows(self, result):
+        return [obj for obj, res, msg in self.results if res == result]
+
+    @property
+    def changed(self):
+        return self.get_rows(self.CHANGED)
+
+    @property
+    def ignored(self):
+        return self.get_rows(self.IGNORED)
+
+    @property
+    def rejected(self):
+        return self.get_rows(self.REJECTED)
+
+    @property
+    def skipped(self):
+        return self.get_rows(self.SKIPPED)
+
+    @property
+    def messages(self):
+        return [msg for obj, res, msg in self.results if msg]
+
+
+class StatusQuerySetMixin:
+    """
+    Bulk status transition for models with status mixins, rows are
+    partitioned with ``<action>_ignore_condition`` and
+    ``<action>_valid_condition`` then eligible rows moved to target
+    status with one UPDATE per source status, rows changed meanwhile
+    are reported skipped. Models can define
+    ``pre_<action>_batch(rows)`` and ``post_<action>_batch(rows)``
+    classmethods replacing their ``pre_<action>_action`` and
+    ``post_<action>_action`` called per row, see get_batch_rows.
+    """
+
+    update_chunk_size = 500
+
+    def get_status_rows(self):
+        rows = list(self)
+        if getattr(self, 'polymorphic_disabled', False):
+            rows = self.get_real_instances(rows)
+        return rows
+
+    def get_batch_rows(self, stage, action, rows):
+        """
+        Rows handled by ``<stage>_<action>_batch`` hook, the batch hook
+        replaces the per row hook of the model defining it. Rows of
+        subclasses overriding the per row hook run their own hook.
+        """
+        batch_name = '%s_%s_batch' % (stage, action)
+        row_name = '%s_%s_action' % (stage, action)
+        owner = next(
+            (klass for klass in self.model.__mro__ if batch_name in vars(klass)),
+            None)
+        if owner is None:
+            return []
+        row_hook = getattr(owner, row_name, None)
+        return [
+            obj for obj in rows
+            if getattr(type(obj), row_name, None) is row_hook
+        ]
+
+    def run_transition_hooks(self, stage, action, rows):
+        """
+        Return rows passed the hooks and (row, error) of the others,
+        each per row hook runs in a savepoint so a refused row leaves
+        no side effect.
+        """
+        batch_rows = self.get_batch_rows(stage, action, rows)
+        if batch_rows:
+            getattr(self.model, '%s_%s_batch' % (stage, action))(batch_rows)
+        batch_pks = {obj.pk for obj in batch_rows}
+        failed = []
+        for obj in rows:
+            if obj.pk in batch_pks:
+                continue
+            hook = getattr(obj, '%s_%s_action' % (stage, action), None)
+            if hook is None:
+                continue
+            try:
+                with transaction.atomic(using=self.db):
+                    hook()
+            except PermissionError as err:
+                failed.append((obj, err))
+        failed_pks = {obj.pk for obj, err in failed}
+        passed = [obj for obj in rows if obj.pk not in failed_pks]
+        return passed, failed
+
+    def update_status(self, rows, status, date_field, now):
+        """
+        Move rows to status, each UPDATE also filter on the status the
+        row was checked with, rows changed meanwhile by another request
+        are not updated. Return the updated rows.
+        """
+        manager = self.model._base_manager.db_manager(self.db)
+        groups = {}
+        for obj in rows:
+            groups.setdefault(obj.status, []).append(obj)
+        skipped = set()
+        for from_status, objs in groups.items():
+            for i in range(0, len(objs), self.update_chunk_size):
+                pks = [obj.pk for obj in objs[i:i + self.update_chunk_size]]
+                count = manager.filter(pk__in=pks, status=from_status).update(
+                    status=status.value, **{date_field: now})
+                if count < len(pks):
+                    updated = set(manager.filter(
+                        pk__in=pks, status=status.value, **{date_field: now}
+                    ).values_list('pk', flat=True))
+                    skipped.update(pk for pk in pks if pk not in updated)
+        return [obj for obj in rows if obj.pk not in skipped]
+
+    def revert_status(self, obj, from_status, date_field, date_value):
+        """ Put back row whose post hook refused the transition """
+        manager = self.model._base_manager.db_manager(self.db)
+        manager.filter(pk=obj.pk).update(
+            status=from_status, **{date_field: date_value})
+        obj.status = from_status
+        setattr(obj, date_field, date_value)
+
+    def bulk_transition(self, action, actor=None):
+        """ Move eligible rows to ``action`` target status """
+        status, date_field, msg_word = STATUS_TRANSITIONS[action]
+        report = StatusTransitionReport(action)
+        eligible = []
+        with transaction.atomic(using=self.db):
+            for obj in self.get_status_rows():
+                if getattr(obj, '%s_ignore_condition' % action):
+                    report.add(obj, report.IGNORED)
+                elif getattr(obj, '%s_valid_condition' % action):
+                    eligible.append(obj)
+                else:
+                    report.add(obj, report.REJECTED, obj.get_status_msg(msg_word))
+            eligible, failed = self.run_transition_hooks('pre', action, eligible)
+            for obj, err in failed:
+                report.add(obj, report.REJECTED, str(err))
+
+            now = timezone.now()
+            updated = self.update_status(eligible, status, date_field, now)
+            updated_pks = {obj.pk for obj in updated}
+            for obj in eligible:
+                if obj.pk not in updated_pks:
+                    report.add(obj, report.SKIPPED, str(
+                        _('{} was changed by another user, try again.')
+                    ).format(obj))
+            previous = {
+                obj.pk: (obj.status, getattr(obj, date_field))
+                for obj in updated
+            }
+            for obj in updated:
+                obj.status = status.value
+                setattr(obj, date_field, now)
+
+            changed, failed = self.run_transition_hooks('post', action, updated)
+            for obj, err in failed:
+                from_status, date_value = previous[obj.pk]
+                self.revert_status(obj, from_status, date_field, date_value)
+                report.add(obj, report.REJECTED, str(err))
+            record_transitions(
+                changed, status.value,
+                [previous[obj.pk][0] for obj in changed],
+                actor=actor, timestamp=now)
+        for obj in changed:
+            report.add(obj, report.CHANGED)
+        return report
+
+    def bulk_trash(self, actor=None):
+        return self.bulk_transition('trash', actor=actor)
+
+    def bulk_draft(self, actor=None):
+        return self.bulk_transition('draft', actor=actor)
+
+    def bulk_pending(self, actor=None):
+        return self.bulk_transition('pending', actor=actor)
+
+    def bulk_validate(self, actor=None):
+        return self.bulk_transition('validate', actor=actor)
+
+    def bulk_approve(self, actor=None):
+        return self.bulk_transition('approve', actor=actor)
+
+    def bulk_reject(self, actor=None):
+        return self.bulk_transition('reject', actor=actor)
+
+    def bulk_complete(self, actor=None):
+        return self.bulk_transition('complete', actor=actor)
+
+    def bulk_process(self, actor=None):
+        return self.bulk_transition('process', actor=actor)
+
+    def bulk_close(self, actor=None):
+        return self.bulk_transition('close', actor=actor)
+
+
+class StatusQuerySet(StatusQuerySetMixin, models.QuerySet):
+    pass
+
+
+class PolymorphicStatusQuerySet(StatusQuerySetMixin, PolymorphicQuerySet):
+    pass
+
+
+class StatusTransitionQuerySet(models.QuerySet):
+    """ History query for status transition journal """
+
+    def for_model(self, model):
+        """ Transitions of model and its subclasses """
+        models_ = [m for m in apps.get_models() if issubclass(m, model)]
+        content_types = ContentType.objects.get_for_models(
+            *models_, for_concrete_models=False)
+        return self.filter(content_type__in=content_types.values())
+
+    def for_object(self, obj):
+        content_type = ContentType.objects.get_for_model(
+            obj, for_concrete_model=False)
+        return self.filter(content_type=content_type, object_id=obj.pk)
+
+    def to_status(self, *statuses):
+        return self.filter(to_status__in=statuses)
+
+    def from_status(self, *statuses):
+        return self.filter(from_status__in=statuses)
+
+    def between(self, start, end):
+        """ Transitions in [start, end) time window """
+        return self.filter(timestamp__gte=start, timestamp__lt=end)
+
+    def object_ids(self):
+        return self.order_by().values_list('object_id', flat=True).distinct()
+
+    def count_by_status(self):
+        """ Dict of to_status and number of transitions """
+        rows = self.order_by().values('to_status').annotate(
+            total=models.Count('id')).values_list('to_status', 'total')
+        return dict(rows)
+
+
 class ParanoidManagerMixin:
 
     def get_queryset(self):
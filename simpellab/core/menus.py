@@ -1,11 +1,83 @@
+import hashlib
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
 from django.forms import Media, MediaDefiningClass
 from django.forms.utils import flatatt
 from django.template.loader import render_to_string
+from django.utils import translation
 from django.utils.safestring import mark_safe
 from django.utils.text import slugify
 
 from simpellab.core import hooks
 
+MENU_CACHE_TIMEOUT = getattr(settings, 'MENU_CACHE_TIMEOUT', 60 * 60)
+
+ACTIVE_CLASS = 'mm-active'
+ACTIVE_MARKER_RE = re.compile(r'__menu_active_\d+__')
+
+
+def get_menu_version():
+    return cache.get_or_set('menu:version', new_menu_version, None)
+
+
+def new_menu_version():
+    """
+    Version for a missing or evicted key, a counter restarted at 1 could
+    match a version still having menus cached before the change.
+    """
+    return int(time.time() * 1000)
+
+
+def invalidate_menus():
+    """ Expire every cached menu, call when permissions change """
+    try:
+        cache.incr('menu:version')
+    except ValueError:
+        cache.set('menu:version', new_menu_version(), None)
+
+
+def get_permission_fingerprint(user):
+    """ Hash of everything menu permission checks depend on """
+    if not user.is_active:
+        return 'inactive'
+    if user.is_superuser:
+        return 'superuser'
+    key = 'menu:perms:%s:%s:%s' % (get_menu_version(), user.pk, user.is_staff)
+    fingerprint = cache.get(key)
+    if fingerprint is None:
+        perms = ','.join(sorted(user.get_all_permissions()))
+        fingerprint = hashlib.md5(
+            ('%s|%s' % (user.is_staff, perms)).encode()).hexdigest()
+        cache.set(key, fingerprint, MENU_CACHE_TIMEOUT)
+    return fingerprint
+
+
+class ActiveMarkers:
+    """
+    Collect placeholder of active class while rendering a menu for cache,
+    placeholders are replaced for the requested path after cache lookup.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.urls = {}
+
+    def mark(self, urls):
+        self.count += 1
+        marker = '__menu_active_%s__' % self.count
+        for url in urls:
+            self.urls.setdefault(str(url), []).append(marker)
+        return marker
+
+    @staticmethod
+    def apply(html, urls, path):
+        for marker in urls.get(path, []):
+            html = html.replace(marker, ACTIVE_CLASS)
+        return ACTIVE_MARKER_RE.sub('', html)
+
 
 class MenuItem(metaclass=MediaDefiningClass):
     template = 'admin/sidenav_menu_item.html'
@@ -34,6 +106,16 @@ class MenuItem(metaclass=MediaDefiningClass):
     def is_active(self, request):
         return request.path == str(self.url)
 
+    def get_active_urls(self, request):
+        """ Request paths where this item is active """
+        return [self.url]
+
+    def get_active_class(self, request):
+        markers = getattr(request, 'menu_markers', None)
+        if markers is not None:
+            return markers.mark(self.get_active_urls(request))
+        return ACTIVE_CLASS if self.is_active(request) else ''
+
     def get_context(self, request):
         """Defines context for the template, overridable to use more data"""
         return {
@@ -42,7 +124,7 @@ class MenuItem(metaclass=MediaDefiningClass):
             'classnames': self.classnames,
             'attr_string': self.attr_string,
             'label': self.label,
-            'active': self.is_active(request),
+            'active_class': self.get_active_class(request),
             'icon': self.icon
         }
 
@@ -67,6 +149,12 @@ class MenuDropdown(MenuItem):
     def is_active(self, request):
         return bool(self.menu.active_menu_items(request))
 
+    def get_active_urls(self, request):
+        return [
+            url for item in self.menu.menu_items_for_request(request)
+            for url in item.get_active_urls(request)
+        ]
+
     def get_context(self, request):
         context = super().get_context(request)
         context['menu_html'] = self.menu.render_html(request)
@@ -100,7 +188,7 @@ class Menu:
     def registered_menu_items(self):
         menu_item_from_register = self._registered_menu_items
         menu_from_hooks = hooks.get_hooks(self.hook_name)
-        return menu_item_from_register + menu_from_hooks
+        return menu_item_from_register + list(menu_from_hooks)
 
     def menu_items_for_request(self, request):
         menu_items = [ item(request) for item in self.registered_menu_items ]
@@ -128,4 +216,34 @@ class Menu:
         return mark_safe(''.join(rendered_menu_items))
 
 
+class CachedMenu(Menu):
+    """
+    Menu rendered once per permission fingerprint and language, active
+    item is highlighted after cache lookup. Items must only depend on
+    user permissions, see ``invalidate_menus``.
+    """
+
+    def get_cache_key(self, request):
+        return 'menu:%s:%s:%s:%s' % (
+            self.hook_name,
+            get_menu_version(),
+            translation.get_language(),
+            get_permission_fingerprint(request.user),
+        )
+
+    def render_html(self, request):
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            request.menu_markers = markers = ActiveMarkers()
+            try:
+                html = super().render_html(request)
+            finally:
+                del request.menu_markers
+            cached = (str(html), markers.urls)
+            cache.set(key, cached, MENU_CACHE_TIMEOUT)
+        html, urls = cached
+        return mark_safe(ActiveMarkers.apply(html, urls, request.path))
+
+
 website_menu = Menu(hook_name='website_menu_item')
@@ -0,0 +1,31 @@
+import logging
+
+from django.conf import settings
+
+from simpellab.core import hooks
+
+logger = logging.getLogger('simpellab.hooks')
+
+
+class HookLookupMiddleware:
+    """
+    Count hooks lookups made while handling each request, logged to
+    ``simpellab.hooks`` logger and added as X-Hook-Lookups header in
+    DEBUG mode. Settings only install it when DEBUG is on.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        hooks.start_lookup_count()
+        try:
+            response = self.get_response(request)
+        finally:
+            counter = hooks.stop_lookup_count()
+        total = sum(counter.values())
+        logger.debug(
+            '%s hook lookups on %s: %s', total, request.path, dict(counter))
+        if settings.DEBUG:
+            response['X-Hook-Lookups'] = total
+        return response
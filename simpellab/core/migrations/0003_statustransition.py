@@ -0,0 +1,42 @@
+# Generated by Django 3.0.8 on 2026-10-18 06:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('simpellab_core', '0002_delete_fourstepstatusmixin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusTransition',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.UUIDField(verbose_name='object id')),
+                ('from_status', models.CharField(blank=True, max_length=15, null=True, verbose_name='from status')),
+                ('to_status', models.CharField(max_length=15, verbose_name='to status')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now, verbose_name='timestamp')),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='status_transitions', to=settings.AUTH_USER_MODEL, verbose_name='actor')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType', verbose_name='content type')),
+            ],
+            options={
+                'verbose_name': 'Status transition',
+                'verbose_name_plural': 'Status transitions',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='statustransition',
+            index=models.Index(fields=['content_type', 'to_status', 'timestamp'], name='core_transition_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='statustransition',
+            index=models.Index(fields=['content_type', 'object_id', 'timestamp'], name='core_transition_object_idx'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models, transaction
 from django.utils import translation, timezone
 from simpellab.core.enums import Status
+from simpellab.core.journal import record_transition
 
 _ = translation.gettext_lazy
 
@@ -41,6 +42,10 @@ class StatusMessage(models.Model):
                 action
             )
 
+    def record_transition(self, from_status):
+        """ Write status change to transition journal """
+        record_transition(self, from_status, self.status)
+
 
 class TrashMixin(StatusMessage, models.Model):
     class Meta:
@@ -56,14 +61,24 @@ class TrashMixin(StatusMessage, models.Model):
         """ Check order status is trashed """
         return self.status == Status.TRASH.value
 
+    @property
+    def trash_ignore_condition(self):
+        return self.is_trash
+
+    @property
+    def trash_valid_condition(self):
+        return self.is_draft
+
     def trash(self):
         """ Trash drafted order """
-        if self.is_trash:
+        if self.trash_ignore_condition:
             return
-        if self.is_draft:
+        if self.trash_valid_condition:
+            from_status = self.status
             self.status = Status.TRASH.value
             self.date_trashed = timezone.now()
             self.save()
+            self.record_transition(from_status)
         else:
             raise PermissionError(self.get_status_msg('trash'))
 
@@ -82,14 +97,24 @@ class DraftMixin(StatusMessage, models.Model):
         """ Check order status is draft """
         return self.status == Status.DRAFT.value
 
+    @property
+    def draft_ignore_condition(self):
+        return self.is_draft
+
+    @property
+    def draft_valid_condition(self):
+        return self.is_trash
+
     def draft(self):
         """ Draft trashed """
-        if self.is_draft:
+        if self.draft_ignore_condition:
             return
-        if self.is_trash:
+        if self.draft_valid_condition:
+            from_status = self.status
             self.status = Status.DRAFT.value
             self.date_drafted = timezone.now()
             self.save()
+            self.record_transition(from_status)
         else:
             raise PermissionError(self.get_status_msg('draft'))
 
@@ -108,14 +133,24 @@ class PendingMixin(StatusMessage, models.Model):
         """ Check order status is pending """
         return self.status == Status.PENDING.value
 
+    @property
+    def pending_ignore_condition(self):
+        return self.is_pending
+
+    @property
+    def pending_valid_condition(self):
+        return self.is_trash
+
     def pending(self):
         """ pending trashed """
-        if self.is_pending:
+        if self.pending_ignore_condition:
             return
-        if self.is_trash:
+        if self.pending_valid_condition:
+            from_status = self.status
             self.status = Status.PENDING.value
             self.date_pending = timezone.now()
             self.save()
+            self.record_transition(from_status)
         else:
             raise PermissionError(self.get_status_msg('pending'))
 
@@ -155,9 +190,11 @@ class ValidateMixin(StatusMessage, models.Model):
             return
         if self.validate_valid_condition:
             self.pre_validate_action()
+            from_status = self.status
             self.status = Status.VALID.value
             self.date_validated = timezone.now()
             self.save()
+            self.record_transition(from_status)
             self.post_validate_action()
         else:
             raise PermissionError(self.get_status_msg('validated'))
@@ -198,9 +235,11 @@ class ApproveMixin(StatusMessage, models.Model):
             return
         if self.approve_valid_condition:
             self.pre_approve_action()
+            from_status = self.status
             self.status = Status.APPROVED.value
             self.date_approved = timezone.now()
             self.save()
+            self.record_transition(from_status)
             self.post_approve_action()
         else:
             raise PermissionError(self.get_status_msg('approved'))
@@ -241,9 +280,11 @@ class RejectMixin(StatusMessage, models.Model):
             return
         if self.reject_valid_condition:
             self.pre_reject_action()
+            from_status = self.status
             self.status = Status.REJECTED.value
             self.date_rejected = timezone.now()
             self.save()
+            self.record_transition(from_status)
             self.post_reject_action()
         else:
             raise PermissionError(self.get_status_msg('rejected'))
@@ -284,9 +325,11 @@ class CompleteMixin(StatusMessage, models.Model):
             return
         if self.complete_valid_condition:
             self.pre_complete_action()
+            from_status = self.status
             self.status = Status.COMPLETE.value
             self.date_completed = timezone.now()
             self.save()
+            self.record_transition(from_status)
             self.post_complete_action()
         else:
             raise PermissionError(self.get_status_msg('completed'))
@@ -327,9 +370,11 @@ class ProcessMixin(StatusMessage, models.Model):
             return
         if self.process_valid_condition:
             self.pre_process_action()
+            from_status = self.status
             self.status = Status.PROCESSED.value
             self.date_processed = timezone.now()
             self.save()
+            self.record_transition(from_status)
             self.post_process_action()
         else:
             raise PermissionError(self.get_status_msg('processed'))
@@ -369,9 +414,11 @@ class PaidMixin(StatusMessage, models.Model):
             return
         if self.pay_valid_condition:
             self.pre_pay_action()
+            from_status = self.status
             self.status = Status.PAID.value
             self.date_paid = timezone.now()
             self.save()
+            self.record_transition(from_status)
             self.post_pay_action()
         else:
             raise PermissionError(self.get_status_msg('paid'))
@@ -411,9 +458,11 @@ class CloseMixin(StatusMessage, models.Model):
             return
         if self.close_valid_condition:
             self.pre_close_action()
+            from_status = self.status
             self.status = Status.CLOSED.value
             self.date_closed = timezone.now()
             self.save()
+            self.record_transition(from_status)
             self.post_close_action()
         else:
             raise PermissionError(self.get_status_msg('closed'))
@@ -1,9 +1,12 @@
 import uuid
+from django.conf import settings
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.db.utils import cached_property
 from django.core.exceptions import ValidationError
 from django.utils import timezone, translation
-from simpellab.core.managers import ParanoidManager
+from simpellab.core.managers import ParanoidManager, StatusTransitionQuerySet
 
 _ = translation.ugettext_lazy
 
@@ -85,4 +88,54 @@ class ParanoidMixin(models.Model):
             raise ValidationError(self.get_restoration_error_message())
         self.deleted = False
         self.deleted_at = None
-        self.save()
\ No newline at end of file
+        self.save()
+
+
+class StatusTransition(models.Model):
+    """ Append only journal of status changes """
+
+    class Meta:
+        verbose_name = _('Status transition')
+        verbose_name_plural = _('Status transitions')
+        indexes = [
+            models.Index(
+                fields=['content_type', 'to_status', 'timestamp'],
+                name='core_transition_status_idx'),
+            models.Index(
+                fields=['content_type', 'object_id', 'timestamp'],
+                name='core_transition_object_idx'),
+        ]
+
+    objects = StatusTransitionQuerySet.as_manager()
+
+    content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        verbose_name=_('content type'))
+    object_id = models.UUIDField(verbose_name=_('object id'))
+    content_object = GenericForeignKey('content_type', 'object_id')
+    from_status = models.CharField(
+        max_length=15,
+        null=True, blank=True,
+        verbose_name=_('from status'))
+    to_status = models.CharField(
+        max_length=15,
+        verbose_name=_('to status'))
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True, blank=True,
+        on_delete=models.SET_NULL,
+        related_name='status_transitions',
+        verbose_name=_('actor'))
+    timestamp = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_('timestamp'))
+
+    def __str__(self):
+        return '%s -> %s' % (self.from_status, self.to_status)
+
+    @classmethod
+    def for_object(cls, obj, **kwargs):
+        content_type = ContentType.objects.get_for_model(
+            obj, for_concrete_model=False)
+        return cls(content_type=content_type, object_id=obj.pk, **kwargs)
@@ -0,0 +1,265 @@
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connections, models, router
+from django.db.migrations.operations.base import Operation
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import translation
+
+_ = translation.gettext_lazy
+
+# Number of best SQLite FTS5 matches returned by ranked search, admin
+# autocomplete only show the first pages of them.
+SEARCH_RESULTS_LIMIT = getattr(settings, 'SEARCH_RESULTS_LIMIT', 500)
+
+
+def normalize(*values):
+    """ Lower case ascii words of values joined by single space """
+    text = ' '.join(str(value) for value in values if value)
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore')
+    return ' '.join(re.findall(r'[a-z0-9]+', text.decode().lower()))
+
+
+class SearchIndexMixin(models.Model):
+    """
+    Model with normalized ``search_text`` column built from
+    ``search_index_fields`` on save. The column is indexed by FTS5 table
+    on SQLite and trigram GIN index on PostgreSQL, see CreateSearchIndex.
+    """
+
+    class Meta:
+        abstract = True
+
+    search_index_fields = []
+
+    search_text = models.TextField(
+        default='', blank=True, editable=False,
+        verbose_name=_('Search text'))
+
+    def get_search_values(self):
+        """ Values to index, override to add related objects values """
+        return [getattr(self, name) for name in self.search_index_fields]
+
+    def build_search_text(self):
+        return normalize(*self.get_search_values())
+
+    def refresh_search_index(self):
+        """ Rebuild search text after related objects changed """
+        self.search_text = self.build_search_text()
+        get_index_model(self.__class__)._base_manager.filter(
+            pk=self.pk).update(search_text=self.search_text)
+        update_search_index(self)
+
+
+def get_index_model(model):
+    """ Concrete model owning search_text column, root of polymorphic models """
+    return model._meta.get_field('search_text').model
+
+
+def get_index_table(model):
+    return '%s_search' % get_index_model(model)._meta.db_table
+
+
+def get_index_name(model):
+    return '%s_search_trgm' % get_index_model(model)._meta.db_table
+
+
+def _execute(connection, sql, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        if cursor.description:
+            return cursor.fetchall()
+
+
+def _db_pk(model, pk, connection):
+    return get_index_model(model)._meta.pk.get_db_prep_value(pk, connection)
+
+
+def update_search_index(instance, using=None):
+    """ Write instance search text to SQLite FTS5 table """
+    using = using or instance._state.db or router.db_for_write(instance.__class__)
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    table = connection.ops.quote_name(get_index_table(instance.__class__))
+    pk = _db_pk(instance.__class__, instance.pk, connection)
+    _execute(connection, 'DELETE FROM %s WHERE object_id = %%s' % table, [pk])
+    _execute(
+        connection,
+        'INSERT INTO %s (object_id, search_text) VALUES (%%s, %%s)' % table,
+        [pk, instance.search_text])
+
+
+def delete_search_index(instance, using=None):
+    using = using or instance._state.db or router.db_for_write(instance.__class__)
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    table = connection.ops.quote_name(get_index_table(instance.__class__))
+    pk = _db_pk(instance.__class__, instance.pk, connection)
+    _execute(connection, 'DELETE FROM %s WHERE object_id = %%s' % table, [pk])
+
+
+def rebuild_search_index(queryset, chunk_size=500, get_values=None, using=None):
+    """
+    Rebuild search text and index of every object in queryset, run after
+    the search migration or when indexed values changed without save.
+    Use ``prefetch_related`` for related values of get_search_values.
+    Data migrations pass ``get_values(obj)``, historical models don't
+    have get_search_values. Return number of indexed objects.
+    """
+    model = queryset.model
+    pks = list(queryset.values_list('pk', flat=True))
+    for i in range(0, len(pks), chunk_size):
+        objs = list(queryset.filter(pk__in=pks[i:i + chunk_size]))
+        for obj in objs:
+            if get_values is None:
+                obj.search_text = obj.build_search_text()
+            else:
+                obj.search_text = normalize(*get_values(obj))
+        _write_search_batch(model, objs, using=using)
+    return len(pks)
+
+
+def _write_search_batch(model, objs, using=None):
+    index_model = get_index_model(model)
+    using = using or router.db_for_write(index_model)
+    index_model._base_manager.using(using).bulk_update(objs, ['search_text'])
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        table = connection.ops.quote_name(get_index_table(model))
+        pks = [_db_pk(model, obj.pk, connection) for obj in objs]
+        _execute(
+            connection,
+            'DELETE FROM %s WHERE object_id IN (%s)' % (
+                table, ', '.join(['%s'] * len(pks))),
+            pks)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO %s (object_id, search_text) VALUES (%%s, %%s)' % table,
+                [(pk, obj.search_text) for pk, obj in zip(pks, objs)])
+
+
+def search(queryset, term, limit=None):
+    """
+    Filter queryset of SearchIndexMixin model by every word of term
+    (prefix on SQLite, substring on other databases), best match first.
+    On SQLite ranking needs ``limit``, only that many best matches are
+    returned. Without it matches are filtered by subquery and left
+    unordered, for admin changelist which apply its own ordering.
+    """
+    words = normalize(term).split()
+    if not words:
+        return queryset
+    connection = connections[queryset.db]
+    if connection.vendor == 'sqlite':
+        table = connection.ops.quote_name(get_index_table(queryset.model))
+        match = ' '.join('"%s"*' % word for word in words)
+        if limit is None:
+            return queryset.filter(pk__in=RawSQL(
+                'SELECT object_id FROM %s WHERE %s MATCH %%s' % (table, table),
+                [match]))
+        rows = _execute(
+            connection,
+            'SELECT object_id FROM %s WHERE %s MATCH %%s ORDER BY rank LIMIT %%s' % (
+                table, table),
+            [match, limit])
+        pk_field = get_index_model(queryset.model)._meta.pk
+        pks = [pk_field.to_python(row[0]) for row in rows]
+        if not pks:
+            return queryset.none()
+        rank = models.Case(
+            *[models.When(pk=pk, then=models.Value(i)) for i, pk in enumerate(pks)],
+            output_field=models.IntegerField())
+        return queryset.filter(pk__in=pks).annotate(
+            search_rank=rank).order_by('search_rank')
+
+    for word in words:
+        queryset = queryset.filter(search_text__contains=word)
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        queryset = queryset.annotate(
+            search_rank=TrigramSimilarity('search_text', ' '.join(words))
+        ).order_by('-search_rank')
+    return queryset
+
+
+class CreateSearchIndex(Operation):
+    """
+    Migration operation creating search index of model search_text,
+    FTS5 table on SQLite, pg_trgm GIN index on PostgreSQL which serve
+    both LIKE filter and similarity ranking. Other databases scan.
+    """
+    reduces_to_sql = True
+    reversible = True
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def deconstruct(self):
+        return self.__class__.__name__, [self.model_name], {}
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        quote = schema_editor.quote_name
+        vendor = schema_editor.connection.vendor
+        if vendor == 'sqlite':
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE %s USING fts5("
+                "object_id UNINDEXED, search_text, prefix='2 3')" % quote(
+                    get_index_table(model)))
+        elif vendor == 'postgresql':
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            schema_editor.execute(
+                'CREATE INDEX %s ON %s USING gin (search_text gin_trgm_ops)' % (
+                    quote(get_index_name(model)),
+                    quote(model._meta.db_table)))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        quote = schema_editor.quote_name
+        vendor = schema_editor.connection.vendor
+        if vendor == 'sqlite':
+            schema_editor.execute(
+                'DROP TABLE IF EXISTS %s' % quote(get_index_table(model)))
+        elif vendor == 'postgresql':
+            schema_editor.execute(
+                'DROP INDEX IF EXISTS %s' % quote(get_index_name(model)))
+
+    def describe(self):
+        return 'Create search index of %s' % self.model_name
+
+
+@receiver(pre_save)
+def before_save_searchable(sender, **kwargs):
+    instance = kwargs.pop('instance', None)
+    update_fields = kwargs.get('update_fields')
+    if isinstance(instance, SearchIndexMixin) and (
+            update_fields is None or 'search_text' in update_fields):
+        instance.search_text = instance.build_search_text()
+
+
+@receiver(post_save)
+def after_save_searchable(sender, **kwargs):
+    instance = kwargs.pop('instance', None)
+    update_fields = kwargs.get('update_fields')
+    if isinstance(instance, SearchIndexMixin) and (
+            update_fields is None or 'search_text' in update_fields):
+        update_search_index(instance, using=kwargs.get('using'))
+
+
+@receiver(post_delete)
+def after_delete_searchable(sender, **kwargs):
+    instance = kwargs.pop('instance', None)
+    if isinstance(instance, SearchIndexMixin):
+        delete_search_index(instance, using=kwargs.get('using'))
@@ -8,19 +8,21 @@ from polymorphic.admin import PolymorphicParentModelAdmin, PolymorphicChildModel
 
 from simpellab.core import hooks
 from simpellab.admin.menus import admin_menu
-from simpellab.admin.admin import ModelAdmin, ModelMenuGroup
+from simpellab.admin.admin import ModelAdmin, ModelMenuGroup, PolymorphicParentAdminMixin
 from simpellab.modules.carts.models import Cart
+from simpellab.modules.carts.stores import get_cart_item_url
 from simpellab.modules.blueprints.models import *
 
 
 @admin.register(Blueprint)
-class BlueprintAdmin(PolymorphicParentModelAdmin, ModelAdmin):
+class BlueprintAdmin(PolymorphicParentAdminMixin, PolymorphicParentModelAdmin, ModelAdmin):
     """ Parent admin Blueprint Model, set child model in settings """
     menu_icon = 'package'
     menu_label = _('My Blueprints')
     menu_order = 1
     search_fields = ['name']
     child_models = []
+    child_models_hook = 'blueprint_child_model'
     list_display = ['name']
     inspect_enabled = False
 
@@ -43,7 +45,7 @@ class BlueprintAdmin(PolymorphicParentModelAdmin, ModelAdmin):
         blueprint = get_object_or_404(self.model, pk=object_id)
         try:
             cart_item = blueprint.add_to_cart(request)
-            return redirect(reverse('admin:simpellab_carts_cart_change', args=(cart_item.id,)))
+            return redirect(get_cart_item_url(cart_item))
         except Exception as err:
             print(err)
             return redirect(reverse('admin:simpellab_carts_cart_changelist'))
@@ -62,27 +64,6 @@ class BlueprintAdmin(PolymorphicParentModelAdmin, ModelAdmin):
     add_to_cart_link.short_description=''
 
 
-    def get_child_models(self):
-        """ 
-            Register child model using hooks
-
-            @hooks.register('blueprint_child_model', order=1)
-            def register_child_model():
-                return BlueprintChildModel
-            
-        """
-        super_child_models = super().get_child_models()
-        child_models = list(super_child_models).copy()
-        
-        # list function that return Product subclass
-        func_list = hooks.get_hooks('blueprint_child_model')
-        for func in func_list:
-            value = func()
-            if issubclass(value, Blueprint):
-                child_models.append(value)
-            else:
-                raise ImproperlyConfigured('Hook blueprint_child_model should return Product subclass')
-        return child_models
 
 
 @hooks.register('admin_menu_item')
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import translation
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
@@ -39,5 +39,62 @@ class Blueprint(PolymorphicModel, BaseModel):
         verbose_name=_('Note')
         )
 
+    # Cart model of blueprint product type, set by child blueprint
+    cart_model = None
+
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+    def get_parameters(self):
+        """ Blueprint parameters as list of (parameter pk, note) """
+        return list(self.parameters.values_list('parameter', 'note'))
+
+    def apply(self, n=None, names=None, user=None, order=None, date=None):
+        """
+        Expand blueprint into ``n`` cart lines of ``user``, or ``n`` items
+        of ``order`` priced on date. Lines are named from ``names`` then
+        blueprint name, they and their parameters are inserted with two
+        bulk_create calls and prices are resolved once for all lines.
+        """
+        from simpellab.modules.carts.checkout import (
+            CheckoutLine, create_order_items, get_item_model)
+        from simpellab.modules.carts.stores import get_cart_store
+        from simpellab.utils.bulk import bulk_create_inherited
+
+        names = list(names or [])
+        if n is None:
+            n = len(names) or 1
+        names = [
+            names[i] if i < len(names) else self.name for i in range(n)]
+        parameters = self.get_parameters()
+
+        if order is not None:
+            item_model = get_item_model(self.product.get_real_instance_class())
+            lines = [
+                CheckoutLine(
+                    self.product, name=name, note=self.note,
+                    parameters=parameters)
+                for name in names
+            ]
+            with transaction.atomic():
+                return create_order_items(order, item_model, lines, date)
+
+        store = get_cart_store(user)
+        if store is not None:
+            return store.add_many(
+                self.product, names, note=self.note, parameters=parameters)
+        carts = [
+            self.cart_model(
+                user=user, product=self.product, name=name,
+                note=self.note, quantity=1)
+            for name in names
+        ]
+        parameter_model = self.cart_model._meta.get_field(
+            'parameters').related_model
+        with transaction.atomic():
+            bulk_create_inherited(carts)
+            parameter_model.objects.bulk_create([
+                parameter_model(cart=cart, parameter_id=pk, note=note)
+                for cart in carts for pk, note in parameters
+            ])
+        return carts
\ No newline at end of file
@@ -1,19 +1,22 @@
 from django.contrib import admin
 from django.urls import path
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import get_object_or_404, render
+from django.shortcuts import get_object_or_404, render, redirect
+from django.template.response import TemplateResponse
 from django.views.generic import FormView
 
 from polymorphic.admin import PolymorphicParentModelAdmin, PolymorphicChildModelAdmin
 
 from simpellab.core import hooks
-from simpellab.admin.admin import ModelAdmin
+from simpellab.admin.admin import ModelAdmin, PolymorphicParentAdminMixin
 from simpellab.modules.sales.admin import PolymorphicOrderAdmin
 from simpellab.modules.carts.models import Cart, CommonCart
+from simpellab.modules.carts.stores import get_cart_store
+from simpellab.modules.carts.views import OrderCreateView
 
 
 @admin.register(Cart)
-class CartAdmin(PolymorphicParentModelAdmin, ModelAdmin):
+class CartAdmin(PolymorphicParentAdminMixin, PolymorphicParentModelAdmin, ModelAdmin):
     menu_order = 1
     menu_label = 'My Cart'
     menu_icon = 'cart'
@@ -23,6 +26,7 @@ class CartAdmin(PolymorphicParentModelAdmin, ModelAdmin):
     child_models = [
         CommonCart
     ]
+    child_models_hook = 'cart_child_model'
     
     def product(self, obj):
         return obj.get_real_instance().product
@@ -36,6 +40,30 @@ class CartAdmin(PolymorphicParentModelAdmin, ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).filter(user=request.user)
 
+    def changelist_view(self, request, extra_context=None):
+        store = get_cart_store(request.user)
+        if store is None:
+            return super().changelist_view(request, extra_context)
+        return self.store_changelist_view(request, store, extra_context)
+
+    def store_changelist_view(self, request, store, extra_context=None):
+        """ Cart lines of redis store, loaded with one redis round-trip """
+        if request.method == 'POST' and request.POST.get('remove'):
+            store.remove(request.POST['remove'])
+            return redirect(request.path)
+        lines = store.get_lines()
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': self.menu_label,
+            'lines': lines,
+            'total': sum(line.total_price for line in lines),
+            **(extra_context or {}),
+        }
+        request.current_app = self.admin_site.name
+        return TemplateResponse(
+            request, 'admin/simpellab_carts/cart/store_change_list.html', context)
+
     def has_add_permission(self, request, obj=None):
         return False
 
@@ -52,29 +80,7 @@ class CartAdmin(PolymorphicParentModelAdmin, ModelAdmin):
         return custom_urls + urls
     
     def create_order_view(self, request, *args, **kwargs):
-        return OrderCreateView.as_view(*args, **kwargs)(request)
-
-    def get_child_models(self):
-        """ 
-            Register child model using hooks
-
-            @hooks.register('cart_child_model', order=1)
-            def register_child_model():
-                return CartChildModel
-            
-        """
-        super_child_models = super().get_child_models()
-        child_models = list(super_child_models).copy()
-        
-        # list function that return Cart subclass
-        func_list = hooks.get_hooks('cart_child_model')
-        for func in func_list:
-            value = func()
-            if issubclass(value, Cart):
-                child_models.append(value)
-            else:
-                raise ImproperlyConfigured('Hook cart_child_model should return Cart subclass')
-        return child_models
+        return OrderCreateView.as_view(model_admin=self)(request, *args, **kwargs)
 
 
 @admin.register(CommonCart)
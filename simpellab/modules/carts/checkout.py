@@ -0,0 +1,247 @@
+import uuid
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.utils import timezone
+
+from simpellab.modules.carts.models import Cart
+from simpellab.modules.products.models import Product, Parameter
+from simpellab.modules.products.pricing import (
+    resolve_prices, resolve_product_prices)
+from simpellab.modules.sales.models import OrderItem
+from simpellab.utils.bulk import bulk_create_inherited
+from simpellab.utils.numerators import allocate_reg_numbers
+
+
+class CheckoutLine:
+    """ Cart item or redis cart line to order, ``parameters`` is list
+        of (parameter pk, note) """
+
+    def __init__(self, product, quantity=1, name=None, note=None,
+                 parameters=None):
+        self.product = product
+        self.quantity = quantity
+        self.name = name
+        self.note = note
+        self.parameters = list(parameters or [])
+
+
+def get_item_models(model=OrderItem):
+    """ Concrete order item models with product foreign key """
+    for subclass in model.__subclasses__():
+        opts = subclass._meta
+        if not opts.abstract and not opts.proxy:
+            try:
+                opts.get_field('product')
+                yield subclass
+            except FieldDoesNotExist:
+                pass
+        yield from get_item_models(subclass)
+
+
+def get_item_model(product_model):
+    """ Order item model of the most specific product type """
+    candidates = [
+        item_model for item_model in get_item_models()
+        if issubclass(
+            product_model,
+            item_model._meta.get_field('product').related_model)
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda item_model: len(
+        item_model._meta.get_field('product').related_model.__mro__))
+
+
+def get_cart_lines(user):
+    """
+    Checkout lines from database carts of user, queries don't grow
+    with number of cart items.
+    """
+    carts = list(Cart.objects.filter(user=user).order_by('pk'))
+    products = Product.objects.non_polymorphic().in_bulk(
+        [cart.product_id for cart in carts])
+    parameters = {}
+    for cart_model in {cart.__class__ for cart in carts}:
+        try:
+            field = cart_model._meta.get_field('parameters')
+        except FieldDoesNotExist:
+            continue
+        rows = field.related_model.objects.filter(
+            cart__in=[cart.pk for cart in carts if isinstance(cart, cart_model)]
+        ).values_list('cart', 'parameter', 'note')
+        for cart_id, parameter_id, note in rows:
+            parameters.setdefault(cart_id, []).append((parameter_id, note))
+    return carts, [
+        CheckoutLine(
+            products[cart.product_id],
+            quantity=cart.quantity,
+            name=getattr(cart, 'name', None),
+            note=getattr(cart, 'note', None),
+            parameters=parameters.get(cart.pk))
+        for cart in carts
+    ]
+
+
+def delete_carts(carts):
+    """
+    Delete carts with one DELETE per table, deletion Collector would
+    fetch parent Cart of every child cart one by one.
+    """
+    groups = OrderedDict()
+    for cart in carts:
+        groups.setdefault(cart.__class__, []).append(cart.pk)
+    using = Cart._base_manager.db
+    for cart_model, ids in groups.items():
+        try:
+            field = cart_model._meta.get_field('parameters')
+            field.related_model._base_manager.filter(
+                cart__in=ids)._raw_delete(using)
+        except FieldDoesNotExist:
+            pass
+        if cart_model is not Cart:
+            cart_model._base_manager.filter(pk__in=ids)._raw_delete(using)
+    Cart._base_manager.filter(
+        pk__in=[cart.pk for cart in carts])._raw_delete(using)
+
+
+def get_checkout_lines(cart_lines):
+    """
+    Checkout lines from redis cart store lines, parameters deleted since
+    they were added to cart are skipped.
+    """
+    lines = []
+    for line in cart_lines:
+        loaded = {param.pk for param in line.parameter_objects}
+        parameters = [
+            (uuid.UUID(pk), note) for pk, note in line.parameters
+            if uuid.UUID(pk) in loaded
+        ]
+        lines.append(CheckoutLine(
+            line.product,
+            quantity=line.quantity,
+            name=line.name,
+            note=line.note,
+            parameters=parameters))
+    return lines
+
+
+def get_store_lines(store):
+    """ Redis cart store lines and their checkout lines """
+    lines = store.get_lines()
+    return lines, get_checkout_lines(lines)
+
+
+def group_lines(lines):
+    """ Group lines by order item model of their product type """
+    groups = OrderedDict()
+    for line in lines:
+        item_model = get_item_model(line.product.get_real_instance_class())
+        if item_model is None:
+            raise ValueError('%s product can not be ordered.' % line.product)
+        groups.setdefault(item_model, []).append(line)
+    return groups
+
+
+def create_order_items(order, item_model, lines, date=None,
+                       product_prices=None, parameter_prices=None):
+    """
+    Add ``lines`` to order as ``item_model`` items, items and parameters
+    are inserted with one bulk_create each and order totals are updated
+    with one UPDATE. Prices not given are resolved once for all lines.
+    """
+    date = date or timezone.localdate()
+    if product_prices is None:
+        product_prices = resolve_product_prices(
+            {line.product.pk for line in lines}, date)
+    if parameter_prices is None:
+        parameter_prices = resolve_prices(
+            Parameter, {pk for line in lines for pk, note in line.parameters}, date)
+
+    items = []
+    for line in lines:
+        item = item_model(
+            order=order,
+            product_id=line.product.pk,
+            name=line.name or line.product.name,
+            note=line.note,
+            quantity=line.quantity)
+        item.unit_price = product_prices[line.product.pk] + sum(
+            parameter_prices[pk] for pk, note in line.parameters)
+        item.total_price = item.unit_price * item.quantity
+        items.append(item)
+    allocate_reg_numbers(items)
+    bulk_create_inherited(items)
+
+    rows = [
+        item.parameters.model(
+            order_item=item,
+            parameter_id=parameter_id,
+            note=note,
+            price=parameter_prices[parameter_id],
+            date_effective=date)
+        for item, line in zip(items, lines)
+        for parameter_id, note in line.parameters
+    ]
+    if rows:
+        rows[0].__class__.objects.bulk_create(rows)
+
+    total = sum(item.total_price for item in items)
+    order.apply_total_delta(total)
+    order.total_order = (order.total_order or 0) + total
+    order.calc_total_discount()
+    order.calc_grand_total()
+    return items
+
+
+@transaction.atomic
+def create_orders(customer, lines, date=None, **order_fields):
+    """
+    Create one sales order per product type of ``lines``, prices are
+    resolved once for all orders.
+    """
+    date = date or timezone.localdate()
+    product_prices = resolve_product_prices(
+        {line.product.pk for line in lines}, date)
+    parameter_prices = resolve_prices(
+        Parameter, {pk for line in lines for pk, note in line.parameters}, date)
+
+    orders = []
+    for item_model, group in group_lines(lines).items():
+        order_model = item_model._meta.get_field('order').related_model
+        order = order_model(customer=customer, **order_fields)
+        order.save()
+        # Next save must not write back this stale numerator counter
+        order.numerator = None
+        create_order_items(
+            order, item_model, group, date,
+            product_prices=product_prices,
+            parameter_prices=parameter_prices)
+        orders.append(order)
+    return orders
+
+
+def checkout_carts(user, customer, **order_fields):
+    """ Order database cart items of user and delete them """
+    with transaction.atomic():
+        carts, lines = get_cart_lines(user)
+        orders = create_orders(customer, lines, **order_fields)
+        delete_carts(carts)
+    return orders
+
+
+def checkout_store(store, customer, keys=None, **order_fields):
+    """
+    Order redis cart lines, they are popped from the store first so a
+    repeated submit can't order them twice and put back when ordering
+    fails.
+    """
+    cart_lines = store.pop_lines(keys)
+    try:
+        with transaction.atomic():
+            return create_orders(
+                customer, get_checkout_lines(cart_lines), **order_fields)
+    except Exception:
+        store.restore(cart_lines)
+        raise
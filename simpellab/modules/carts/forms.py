@@ -0,0 +1,14 @@
+from django import forms
+from django.utils.translation import ugettext_lazy as _
+
+from simpellab.modules.partners.models import Partner
+
+
+class CheckoutForm(forms.Form):
+    customer = forms.ModelChoiceField(
+        queryset=Partner.objects.filter(is_customer=True),
+        label=_('Customer'))
+    customer_po = forms.CharField(
+        required=False, max_length=255, label=_('Customer PO'))
+    note = forms.CharField(
+        required=False, widget=forms.Textarea, label=_('Note'))
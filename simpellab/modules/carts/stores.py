@@ -0,0 +1,205 @@
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.shortcuts import reverse
+from django.utils.encoding import force_str
+
+from simpellab.modules.products.models import Product, Parameter
+
+# 'database' keep cart items as Cart rows, 'redis' keep cart lines in one
+# redis hash per user until they are ordered at checkout.
+CART_STORE = getattr(settings, 'CART_STORE', 'database')
+CART_REDIS_CACHE = getattr(settings, 'CART_REDIS_CACHE', 'default')
+CART_TIMEOUT = getattr(settings, 'CART_TIMEOUT', 60 * 60 * 24 * 30)
+
+
+class CartLine:
+    """
+    Cart line kept in redis store, ``parameters`` is list of
+    (parameter pk, note). Product and parameter objects are set by
+    RedisCartStore when lines are loaded.
+    """
+
+    def __init__(self, key, product_id, quantity=1, name=None, note=None,
+                 parameters=None, added=None):
+        self.key = key
+        self.product_id = product_id
+        self.quantity = quantity
+        self.name = name
+        self.note = note
+        self.parameters = [tuple(param) for param in parameters or []]
+        self.added = added or time.time()
+        self.product = None
+        self.parameter_objects = []
+
+    def __str__(self):
+        return self.name or str(self.product or self.product_id)
+
+    @property
+    def quantity_field(self):
+        return '%s:quantity' % self.key
+
+    @property
+    def price(self):
+        parameter_price = sum(param.price for param in self.parameter_objects)
+        return self.product.total_price + parameter_price
+
+    @property
+    def total_price(self):
+        return self.price * self.quantity
+
+    def dumps(self):
+        return json.dumps({
+            'product': str(self.product_id),
+            'name': self.name,
+            'note': self.note,
+            'parameters': [[str(pk), note] for pk, note in self.parameters],
+            'added': self.added,
+        })
+
+    @classmethod
+    def loads(cls, key, value, quantity):
+        data = json.loads(value)
+        return cls(
+            key, data['product'], quantity=int(quantity or 0),
+            name=data['name'], note=data['note'],
+            parameters=data['parameters'], added=data['added'])
+
+
+class RedisCartStore:
+    """ Cart lines of a user in one redis hash, every write is atomic """
+
+    def __init__(self, user, connection=None):
+        if connection is None:
+            from django_redis import get_redis_connection
+            connection = get_redis_connection(CART_REDIS_CACHE)
+        self.user = user
+        self.connection = connection
+        self.key = 'simpellab:cart:%s' % user.pk
+
+    def add(self, product, quantity=1, name=None, note=None, parameters=(),
+            merge=False):
+        """
+        Add product line, with ``merge`` the product line quantity is
+        incremented instead of adding new line.
+        """
+        key = str(product.pk) if merge else uuid.uuid4().hex
+        line = CartLine(
+            key, product.pk, name=name, note=note, parameters=parameters)
+        pipe = self.connection.pipeline()
+        pipe.hsetnx(self.key, line.key, line.dumps())
+        pipe.hincrby(self.key, line.quantity_field, quantity)
+        pipe.expire(self.key, CART_TIMEOUT)
+        line.quantity = pipe.execute()[1]
+        line.product = product
+        return line
+
+    def add_many(self, product, names, note=None, parameters=()):
+        """ Add one product line per name with one redis round-trip """
+        lines = [
+            CartLine(uuid.uuid4().hex, product.pk, name=name, note=note,
+                     parameters=parameters)
+            for name in names
+        ]
+        pipe = self.connection.pipeline()
+        for line in lines:
+            line.product = product
+            pipe.hset(self.key, line.key, line.dumps())
+            pipe.hset(self.key, line.quantity_field, line.quantity)
+        pipe.expire(self.key, CART_TIMEOUT)
+        pipe.execute()
+        return lines
+
+    def set_quantity(self, key, quantity):
+        if not self.connection.hexists(self.key, key):
+            return
+        self.connection.hset(self.key, '%s:quantity' % key, quantity)
+
+    def remove(self, *keys):
+        fields = []
+        for key in keys:
+            fields += [key, '%s:quantity' % key]
+        if fields:
+            self.connection.hdel(self.key, *fields)
+
+    def clear(self):
+        self.connection.delete(self.key)
+
+    def count(self):
+        return self.connection.hlen(self.key) // 2
+
+    def get_lines(self):
+        """ Load all lines with one redis round-trip """
+        return self.load_lines(self.connection.hgetall(self.key))
+
+    def pop_lines(self, keys=None):
+        """ Load and remove lines at once, used by checkout """
+        pipe = self.connection.pipeline(transaction=True)
+        if keys is None:
+            pipe.hgetall(self.key)
+            pipe.delete(self.key)
+            return self.load_lines(pipe.execute()[0])
+        fields = []
+        for key in keys:
+            fields += [key, '%s:quantity' % key]
+        pipe.hmget(self.key, fields)
+        pipe.hdel(self.key, *fields)
+        values = pipe.execute()[0]
+        return self.load_lines(dict(zip(fields, values)))
+
+    def restore(self, lines):
+        """ Put popped lines back, quantity added meanwhile is kept """
+        if not lines:
+            return
+        pipe = self.connection.pipeline()
+        for line in lines:
+            pipe.hset(self.key, line.key, line.dumps())
+            pipe.hincrby(self.key, line.quantity_field, line.quantity)
+        pipe.expire(self.key, CART_TIMEOUT)
+        pipe.execute()
+
+    def load_lines(self, data):
+        """
+        Build lines from hash data, products and parameters are fetched
+        with one query each. Lines of deleted products are skipped.
+        """
+        data = {
+            force_str(field): value for field, value in data.items()
+            if value is not None
+        }
+        lines = [
+            CartLine.loads(field, value, data.get('%s:quantity' % field))
+            for field, value in data.items()
+            if not field.endswith(':quantity')
+        ]
+        products = Product.objects.non_polymorphic().select_related(
+            'unit_of_measure').in_bulk([line.product_id for line in lines])
+        parameters = Parameter.objects.in_bulk([
+            pk for line in lines for pk, note in line.parameters])
+        loaded = []
+        for line in lines:
+            line.product = products.get(uuid.UUID(line.product_id))
+            if line.product is None:
+                continue
+            line.parameter_objects = [
+                parameters[uuid.UUID(pk)] for pk, note in line.parameters
+                if uuid.UUID(pk) in parameters
+            ]
+            loaded.append(line)
+        return sorted(loaded, key=lambda line: line.added)
+
+
+def get_cart_store(user):
+    """ Redis cart store of user, None when carts are kept in database """
+    if CART_STORE == 'redis':
+        return RedisCartStore(user)
+    return None
+
+
+def get_cart_item_url(cart_item):
+    """ Admin url of Cart object or changelist for redis cart line """
+    if isinstance(cart_item, CartLine):
+        return reverse('admin:simpellab_carts_cart_changelist')
+    return reverse('admin:simpellab_carts_cart_change', args=(cart_item.id,))
@@ -0,0 +1,53 @@
+from django.contrib import messages
+from django.contrib.admin import helpers
+from django.shortcuts import redirect, reverse
+from django.utils.translation import ugettext_lazy as _
+from django.views.generic import FormView
+
+from simpellab.modules.carts.checkout import (
+    checkout_carts, checkout_store, get_cart_lines, get_store_lines)
+from simpellab.modules.carts.forms import CheckoutForm
+from simpellab.modules.carts.stores import get_cart_store
+
+
+class OrderCreateView(FormView):
+    """ Checkout user cart into one sales order per service type """
+    model_admin = None
+    form_class = CheckoutForm
+    template_name = 'admin/simpellab_carts/create_order.html'
+
+    def dispatch(self, request, *args, **kwargs):
+        self.store = get_cart_store(request.user)
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_lines(self):
+        if self.store is not None:
+            return get_store_lines(self.store)[0]
+        return get_cart_lines(self.request.user)[0]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        form = context['form']
+        fieldsets = [(None, {'fields': list(form.base_fields)})]
+        context.update({
+            **self.model_admin.admin_site.each_context(self.request),
+            'opts': self.model_admin.model._meta,
+            'title': _('Create Order'),
+            'adminform': helpers.AdminForm(form, fieldsets, {}),
+            'errors': form.errors,
+            'lines': self.get_lines(),
+        })
+        return context
+
+    def form_valid(self, form):
+        fields = form.cleaned_data
+        if self.store is not None:
+            orders = checkout_store(self.store, **fields)
+        else:
+            orders = checkout_carts(self.request.user, **fields)
+        if not orders:
+            messages.warning(self.request, _('Your cart is empty.'))
+            return redirect(reverse('admin:simpellab_carts_cart_changelist'))
+        messages.success(self.request, _('%s order(s) created: %s') % (
+            len(orders), ', '.join(str(order) for order in orders)))
+        return redirect(reverse('admin:simpellab_sales_salesorder_changelist'))
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.utils import translation
 
 from simpellab.core import hooks
-from simpellab.admin.admin import ModelAdmin
+from simpellab.admin.admin import ModelAdmin, SearchIndexAdminMixin
 from simpellab.modules.partners.models import (
     Partner,
     PartnerContact,
@@ -39,10 +39,11 @@ class PartnerAddressInline(admin.StackedInline):
 
 
 @admin.register(Partner)
-class PartnerAdmin(ModelAdmin):
+class PartnerAdmin(SearchIndexAdminMixin, ModelAdmin):
     menu_icon = 'account'
-    search_fields = ['owner__company__name']
+    search_fields = ['inner_id', 'name']
     list_display = ['inner_id', 'name', 'is_customer', 'is_supplier', 'balance']
+    readonly_fields = ['balance']
     inlines = [PartnerContactInline, PartnerAddressInline, ContactPersonInline]
 
 
@@ -0,0 +1,22 @@
+import datetime
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from simpellab.modules.partners.models import BalanceCheckpoint
+
+
+class Command(BaseCommand):
+    help = 'Write partner balance checkpoints, run it periodically (eg. daily).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date', type=datetime.date.fromisoformat,
+            help='Checkpoint date in YYYY-MM-DD, default to yesterday.')
+
+    def handle(self, *args, **options):
+        date = options['date']
+        if date is None:
+            date = timezone.localdate() - datetime.timedelta(days=1)
+        checkpoints = BalanceCheckpoint.create_for_date(date)
+        self.stdout.write(self.style.SUCCESS(
+            '%s balance checkpoint(s) written for %s' % (len(checkpoints), date)))
@@ -0,0 +1,37 @@
+# Generated by Django 3.0.8 on 2026-10-18 06:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simpellab_partners', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='balancemutation',
+            name='partner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_mutations', to='simpellab_partners.Partner', verbose_name='Partner'),
+        ),
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('modified_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('date', models.DateField(verbose_name='Date')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Balance')),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', to='simpellab_partners.Partner', verbose_name='Partner')),
+            ],
+            options={
+                'verbose_name': 'Balance Checkpoint',
+                'verbose_name_plural': 'Balance Checkpoints',
+                'unique_together': {('partner', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.0.8 on 2026-10-18 07:37
+
+from django.db import migrations, models
+import simpellab.core.search
+
+
+def get_partner_values(partner):
+    values = [partner.name, partner.inner_id]
+    contact = getattr(partner, 'contact', None)
+    if contact:
+        values += [contact.phone, contact.email, contact.whatsapp]
+    for person in partner.contact_persons.all():
+        values += [person.name, person.phone, person.email]
+    return values
+
+
+def backfill_search_index(apps, schema_editor):
+    using = schema_editor.connection.alias
+    Partner = apps.get_model('simpellab_partners', 'Partner')
+    simpellab.core.search.rebuild_search_index(
+        Partner.objects.using(using).select_related(
+            'contact').prefetch_related('contact_persons'),
+        get_values=get_partner_values, using=using)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simpellab_partners', '0002_balancecheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partner',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Search text'),
+        ),
+        simpellab.core.search.CreateSearchIndex('partner'),
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+import datetime
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.utils.functional import cached_property
 from django.conf import settings
@@ -6,6 +10,7 @@ from django.conf import settings
 from django_numerators.models import NumeratorMixin
 from simpellab.core.models import SimpleBaseModel, BaseModel
 from simpellab.core.managers import BaseManager
+from simpellab.core.search import SearchIndexMixin
 from simpellab.auth.models import AddressAbstract, ContactAbstract
 
 
@@ -17,7 +22,7 @@ class PartnerManager(BaseManager):
         return self.get(inner_id=inner_id)
 
 
-class Partner(NumeratorMixin, SimpleBaseModel):
+class Partner(SearchIndexMixin, NumeratorMixin, SimpleBaseModel):
     class Meta:
         verbose_name = _('Partner')
         verbose_name_plural = _('Partners')
@@ -28,6 +33,7 @@ class Partner(NumeratorMixin, SimpleBaseModel):
 
     doc_code = 'PRT'
     objects = PartnerManager()
+    search_index_fields = ['name', 'inner_id']
     name = models.CharField(
         max_length=255, verbose_name=_('Partner name'),
         help_text=_('Partner name eg. Google .Inc or person name if partner is personal'))
@@ -99,16 +105,61 @@ class Partner(NumeratorMixin, SimpleBaseModel):
     def __str__(self):
         return self.name
 
+    def get_search_values(self):
+        values = super().get_search_values()
+        if self._state.adding:
+            return values
+        try:
+            contact = self.contact
+        except PartnerContact.DoesNotExist:
+            contact = None
+        if contact:
+            values += [contact.phone, contact.email, contact.whatsapp]
+        for person in self.contact_persons.all():
+            values += [person.name, person.phone, person.email]
+        return values
+
     @cached_property
     def primary_address(self):
-        address_set = getattr(self, 'addresses', None)
-        primaries = address_set.filter(is_primary=True)
+        if 'addresses' in getattr(self, '_prefetched_objects_cache', {}):
+            primaries = [addr for addr in self.addresses.all() if addr.is_primary]
+        else:
+            primaries = self.addresses.filter(is_primary=True)
         return None if not primaries else primaries[0]
 
     def natural_key(self):
         key = (self.inner_id,)
         return key
 
+    def update_balance(self, amount):
+        """
+        Add signed ``amount`` to partner balance with row lock and
+        atomic UPDATE, only balance column is written.
+        """
+        with transaction.atomic():
+            Partner.objects.select_for_update().only('pk').get(pk=self.pk)
+            Partner.objects.filter(pk=self.pk).update(
+                balance=models.F('balance') + amount)
+            self.balance = Partner.objects.filter(
+                pk=self.pk).values_list('balance', flat=True).get()
+        return self.balance
+
+    def get_balance_as_of(self, date):
+        """
+        Partner balance at the end of ``date``, start from latest
+        checkpoint and sum mutations made after it.
+        """
+        checkpoint = self.balance_checkpoints.filter(
+            date__lte=date).order_by('-date').first()
+        mutations = self.balance_mutations.filter(
+            created_at__lt=end_of_day(date))
+        balance = 0
+        if checkpoint is not None:
+            balance = checkpoint.balance
+            mutations = mutations.filter(
+                created_at__gte=end_of_day(checkpoint.date))
+        return balance + mutations.total()
+
 
 class PartnerContact(ContactAbstract):
     class Meta:
@@ -173,11 +224,37 @@ class ContactPerson(SimpleBaseModel):
         return self.name
 
 
+def end_of_day(date):
+    """ Aware datetime of next day midnight """
+    value = datetime.datetime.combine(
+        date + datetime.timedelta(days=1), datetime.time.min)
+    return timezone.make_aware(value)
+
+
+class BalanceMutationQuerySet(models.QuerySet):
+
+    def total(self):
+        """ Sum of signed mutation amount """
+        total = self.order_by().aggregate(
+            total=models.Sum(models.Case(
+                models.When(
+                    flow=BalanceMutation.OUT,
+                    then=models.F('amount') * -1),
+                default=models.F('amount'),
+                output_field=models.DecimalField(
+                    max_digits=15, decimal_places=2)
+            ))
+        )['total']
+        return total or 0
+
+
 class BalanceMutation(BaseModel):
     class Meta:
         verbose_name = _('Balance Mutation')
         verbose_name = _('Balance Mutations')
-    
+
+    objects = BalanceMutationQuerySet.as_manager()
+
     IN = 'IN'
     OUT = 'OUT'
 
@@ -189,6 +266,7 @@ class BalanceMutation(BaseModel):
     partner = models.ForeignKey(
         Partner,
         on_delete=models.CASCADE,
+        related_name='balance_mutations',
         verbose_name=_('Partner')
         )
     flow = models.CharField(
@@ -213,22 +291,122 @@ class BalanceMutation(BaseModel):
         verbose_name=_('Amount')
     )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ori_partner_id = self.__dict__.get('partner_id')
+        self._ori_signed_amount = self.get_signed_amount()
+
     def __str__(self):
         return self.partner.name
 
+    def get_signed_amount(self):
+        amount = self.__dict__.get('amount') or 0
+        return -amount if self.flow == self.OUT else amount
+
     def add_balance(self):
-        self.partner.balance += self.amount
-        self.partner.save()
+        self.partner.update_balance(self.amount)
 
     def drop_balance(self):
-        self.partner.balance -= self.amount
-        self.partner.save()
+        self.partner.update_balance(-self.amount)
 
+    @transaction.atomic
     def save(self, *args, **kwargs):
+        adding = self._state.adding
         super().save(*args, **kwargs)
-        
-        # update partner balance
-        if self.flow == self.IN:
-            self.add_balance()
-        else:
-            self.drop_balance()
+
+        # update partner balance with the change made by this save
+        signed_amount = self.get_signed_amount()
+        if adding:
+            self.partner.update_balance(signed_amount)
+        elif self._ori_partner_id != self.partner_id:
+            Partner(pk=self._ori_partner_id).update_balance(-self._ori_signed_amount)
+            self.partner.update_balance(signed_amount)
+        elif signed_amount != self._ori_signed_amount:
+            self.partner.update_balance(signed_amount - self._ori_signed_amount)
+
+        # checkpoints from mutation date on no longer add up
+        if adding or signed_amount != self._ori_signed_amount:
+            BalanceCheckpoint.invalidate(self.partner_id, self.created_at)
+        if not adding and self._ori_partner_id != self.partner_id:
+            BalanceCheckpoint.invalidate(self._ori_partner_id, self.created_at)
+        self._ori_partner_id = self.partner_id
+        self._ori_signed_amount = signed_amount
+
+
+class BalanceCheckpoint(BaseModel):
+    """ Partner balance at the end of a day """
+
+    class Meta:
+        verbose_name = _('Balance Checkpoint')
+        verbose_name_plural = _('Balance Checkpoints')
+        unique_together = ('partner', 'date')
+
+    partner = models.ForeignKey(
+        Partner,
+        on_delete=models.CASCADE,
+        related_name='balance_checkpoints',
+        verbose_name=_('Partner')
+        )
+    date = models.DateField(verbose_name=_('Date'))
+    balance = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0,
+        verbose_name=_('Balance')
+    )
+
+    def __str__(self):
+        return '%s %s' % (self.partner, self.date)
+
+    @classmethod
+    def create_for_date(cls, date, partners=None):
+        """
+        Write checkpoint as of ``date`` for partners having balance
+        mutations, each balance computed from previous checkpoint.
+        """
+        if partners is None:
+            partners = Partner.objects.filter(
+                balance_mutations__created_at__lt=end_of_day(date)
+            ).distinct()
+        checkpoints = []
+        for partner in partners:
+            balance = partner.get_balance_as_of(date)
+            checkpoint, created = cls.objects.update_or_create(
+                partner=partner, date=date,
+                defaults={'balance': balance})
+            checkpoints.append(checkpoint)
+        return checkpoints
+
+    @classmethod
+    def invalidate(cls, partner_id, created_at):
+        """ Delete partner checkpoints including a mutation made at
+            ``created_at``, balance as of is summed from earlier ones """
+        return cls.objects.filter(
+            partner_id=partner_id,
+            date__gte=timezone.localdate(created_at)).delete()
+
+
+@receiver(post_delete, sender=BalanceMutation)
+def after_delete_balance_mutation(sender, **kwargs):
+    instance = kwargs.pop('instance', None)
+    if instance._ori_partner_id is None:
+        return
+    Partner(pk=instance._ori_partner_id).update_balance(
+        -instance._ori_signed_amount)
+    BalanceCheckpoint.invalidate(instance._ori_partner_id, instance.created_at)
+
+
+@receiver(post_save, sender=PartnerContact)
+@receiver(post_save, sender=ContactPerson)
+def after_save_partner_contact(sender, **kwargs):
+    instance = kwargs.pop('instance', None)
+    instance.partner.refresh_search_index()
+
+
+@receiver(post_delete, sender=PartnerContact)
+@receiver(post_delete, sender=ContactPerson)
+def after_delete_partner_contact(sender, **kwargs):
+    instance = kwargs.pop('instance', None)
+    partner = Partner.objects.filter(pk=instance.partner_id).first()
+    if partner is not None:
+        partner.refresh_search_index()
@@ -5,6 +5,7 @@ from django.core.validators import MinValueValidator
 from django_numerators.models import NumeratorMixin
 from polymorphic.models import PolymorphicModel
 from simpellab.core.models import BaseModel, SimpleBaseModel
+from simpellab.core.journal import record_transition
 from simpellab.core.enums import MaxLength
 from simpellab.modules.partners.models import Partner, BalanceMutation
 from simpellab.modules.sales.models import Invoice
@@ -199,9 +200,11 @@ class CashFlow(PolymorphicModel, NumeratorMixin, SimpleBaseModel):
             return
         if self.confirm_valid_condition:
             self.pre_confirm_action()
+            from_status = self.status
             self.status = PaymentStatus.CONFIRMED
             self.date_confirmed = timezone.now()
             self.save()
+            record_transition(self, from_status, self.status)
             self.post_confirm_action()
         else:
             raise PermissionError(self.get_status_msg('confirmed'))
@@ -232,9 +235,11 @@ class CashFlow(PolymorphicModel, NumeratorMixin, SimpleBaseModel):
             return
         if self.reject_valid_condition:
             self.pre_reject_action()
+            from_status = self.status
             self.status = PaymentStatus.REJECTED
             self.date_rejected = timezone.now()
             self.save()
+            record_transition(self, from_status, self.status)
             self.post_reject_action()
         else:
             raise PermissionError(self.get_status_msg('rejected'))
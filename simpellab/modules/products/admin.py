@@ -9,11 +9,14 @@ from polymorphic.admin import PolymorphicParentModelAdmin, PolymorphicChildModel
 
 from simpellab.core import hooks
 from simpellab.admin.menus import admin_menu
-from simpellab.admin.admin import ModelAdmin, ModelMenuGroup
+from simpellab.admin.admin import (
+    ModelAdmin, ModelMenuGroup, PolymorphicParentAdminMixin, SearchIndexAdminMixin)
 from simpellab.modules.products.models import *
 from simpellab.modules.carts.models import CommonCart
+from simpellab.modules.carts.stores import get_cart_item_url
 
 from .filters import ProductChildFilter
+from .pricing import apply_price_versions
 
 
 @admin.register(Tag)
@@ -37,25 +40,62 @@ class UnitOfMeasureAdmin(ModelAdmin):
     menu_icon = 'tag'
 
 
+class PriceVersionInline(admin.TabularInline):
+    extra = 0
+    fields = ['date_effective', 'price']
+
+
+class ParameterPriceInline(PriceVersionInline):
+    model = ParameterPrice
+
+
+class FeePriceInline(PriceVersionInline):
+    model = FeePrice
+
+
+class PriceHistoryAdminMixin:
+    """ Apply price version effective today after versions are saved """
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        updated = apply_price_versions(
+            self.model, self.model._base_manager.filter(pk=form.instance.pk))
+        if updated:
+            form.instance = updated[0]
+
+
 @admin.register(Parameter)
-class ParameterAdmin(ModelAdmin):
+class ParameterAdmin(PriceHistoryAdminMixin, SearchIndexAdminMixin, ModelAdmin):
     inspect_enabled = False
     search_fields = ['name']
     list_display = ['name', 'ptype', 'price']
     autocomplete_fields = ['unit_of_measure']
+    inlines = [ParameterPriceInline]
     menu_icon = 'filter'
 
 @admin.register(Fee)
-class FeeAdmin(ModelAdmin):
+class FeeAdmin(PriceHistoryAdminMixin, ModelAdmin):
     inspect_enabled = False
     search_fields = ['name']
     list_display = ['name', 'description', 'price']
     autocomplete_fields = ['unit_of_measure']
+    inlines = [FeePriceInline]
     menu_icon = 'tag'
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        obj = form.instance
+        if not hasattr(obj, 'repriced_products'):
+            return
+        if obj.repriced_products is None:
+            msg = _('Products carrying this fee are being repriced in background.')
+        else:
+            msg = _('%s product(s) repriced.') % obj.repriced_products
+        self.message_user(request, msg, messages.INFO)
+
 
 @admin.register(Product)
-class ProductAdmin(PolymorphicParentModelAdmin, ModelAdmin):
+class ProductAdmin(PolymorphicParentAdminMixin, PolymorphicParentModelAdmin, SearchIndexAdminMixin, ModelAdmin):
     """ Parent admin Product Model, set child model in settings """
     menu_icon = 'package'
     search_fields = ['name']
@@ -63,6 +103,7 @@ class ProductAdmin(PolymorphicParentModelAdmin, ModelAdmin):
         Asset,
         Inventory
     ]
+    child_models_hook = 'product_child_model'
     list_filter = [ProductChildFilter]
     list_display = ['inner_id', 'name', 'price', 'fee', 'total_price']
 
@@ -82,7 +123,7 @@ class ProductAdmin(PolymorphicParentModelAdmin, ModelAdmin):
         product = get_object_or_404(self.model, pk=object_id)
         try:
             cart_item = product.add_to_cart(request)
-            return redirect(reverse('admin:simpellab_carts_cart_change', args=(cart_item.id,)))
+            return redirect(get_cart_item_url(cart_item))
         except Exception as err:
             print(err)
             return redirect(reverse('admin:simpellab_carts_cart_changelist'))
@@ -100,28 +141,6 @@ class ProductAdmin(PolymorphicParentModelAdmin, ModelAdmin):
     
     add_to_cart_link.short_description=''
 
-    def get_child_models(self):
-        """ 
-            Register child model using hooks
-
-            @hooks.register('product_child_model', order=1)
-            def register_child_model():
-                return ProductChildModel
-            
-        """
-        super_child_models = super().get_child_models()
-        child_models = list(super_child_models).copy()
-        
-        # list function that return Product subclass
-        func_list = hooks.get_hooks('product_child_model')
-        for func in func_list:
-            value = func()
-            if issubclass(value, Product):
-                child_models.append(value)
-            else:
-                raise ImproperlyConfigured('Hook product_child_model should return Product subclass')
-        return child_models
-
 
 class SpecificationInline(admin.StackedInline):
     extra = 0
@@ -135,7 +154,7 @@ class ProductFeeInline(admin.TabularInline):
     readonly_fields = ['price', 'date_effective']
 
     
-class ProductAdmin(ModelAdmin):
+class ProductAdmin(SearchIndexAdminMixin, ModelAdmin):
     menu_icon = 'package'
     ordering = ['-created_at']
     list_display = ['name']
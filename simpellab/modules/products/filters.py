@@ -1,6 +1,5 @@
 from django.contrib import admin
 from django.utils.translation import ugettext_lazy as _
-from django.contrib.contenttypes.models import ContentType
 
 
 class ProductChildFilter(admin.SimpleListFilter):
@@ -8,10 +7,10 @@ class ProductChildFilter(admin.SimpleListFilter):
     parameter_name = 'ctype'
 
     def lookups(self, request, model_admin):
-        models = model_admin.get_child_models()
-        child_ctypes = ContentType.objects.get_for_models(*models)
-        lookup = [(str(val.id), str(val.name)) for val in child_ctypes.values()]
-        return lookup
+        return [
+            (str(ct_id), str(model._meta.verbose_name))
+            for model, ct_id in model_admin.child_content_type_ids.items()
+        ]
 
     def queryset(self, request, queryset):
         if not self.value():
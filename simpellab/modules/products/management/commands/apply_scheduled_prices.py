@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from simpellab.modules.products.models import Fee, Parameter
+from simpellab.modules.products.pricing import apply_price_versions
+
+
+class Command(BaseCommand):
+    help = (
+        'Set fee and parameter prices to their version effective today, '
+        'run daily so scheduled prices take effect.'
+    )
+
+    def handle(self, *args, **options):
+        for model in [Fee, Parameter]:
+            updated = apply_price_versions(model)
+            self.stdout.write(self.style.SUCCESS('%s: %s price(s) updated' % (
+                model._meta.verbose_name_plural, len(updated))))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from simpellab.core.search import rebuild_search_index
+from simpellab.modules.partners.models import Partner
+from simpellab.modules.products.models import Parameter, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild search text and search index of products, parameters '
+        'and partners, run once after the search index migration.'
+    )
+
+    def handle(self, *args, **options):
+        querysets = [
+            Product.objects.non_polymorphic().prefetch_related(
+                'tagged_products__tag'),
+            Parameter.objects.all(),
+            Partner.objects.select_related('contact').prefetch_related(
+                'contact_persons'),
+        ]
+        for queryset in querysets:
+            count = rebuild_search_index(queryset)
+            self.stdout.write(self.style.SUCCESS('%s: %s object(s) indexed' % (
+                queryset.model._meta.verbose_name_plural, count)))
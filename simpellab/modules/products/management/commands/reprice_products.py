@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from simpellab.modules.products.pricing import propagate_fee_prices
+from simpellab.modules.products.workers import queue, propagate_prices_task
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute fee and total price of products from their product '
+        'fees in one UPDATE statement.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fee', type=int, action='append', dest='fees', default=[],
+            help='Only reprice products carrying this fee id, repeatable.')
+        parser.add_argument(
+            '--background', action='store_true',
+            help='Reprice with rq worker instead of this process.')
+
+    def handle(self, *args, **options):
+        fees = options['fees'] or None
+        if options['background']:
+            queue.enqueue(propagate_prices_task, fees)
+            self.stdout.write(self.style.SUCCESS('Repricing enqueued'))
+            return
+        count = propagate_fee_prices(fees)
+        self.stdout.write(self.style.SUCCESS(
+            '%s product(s) repriced' % count))
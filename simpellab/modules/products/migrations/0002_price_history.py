@@ -0,0 +1,71 @@
+# Generated by Django 3.0.8 on 2026-10-18 07:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+def seed_price_versions(apps, schema_editor):
+    """ Current fee and parameter prices become their first version """
+    for model_name, version_name, field in [
+            ('Fee', 'FeePrice', 'fee'),
+            ('Parameter', 'ParameterPrice', 'parameter')]:
+        model = apps.get_model('simpellab_products', model_name)
+        version = apps.get_model('simpellab_products', version_name)
+        version.objects.bulk_create([
+            version(**{
+                field: obj,
+                'price': obj.price,
+                'date_effective': obj.date_effective
+            }) for obj in model.objects.all()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simpellab_products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParameterPrice',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('modified_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('price', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Price')),
+                ('date_effective', models.DateField(default=django.utils.timezone.now, verbose_name='Date effective')),
+                ('parameter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='simpellab_products.Parameter', verbose_name='Parameter')),
+            ],
+            options={
+                'verbose_name': 'Parameter Price',
+                'verbose_name_plural': 'Parameter Prices',
+                'ordering': ('-date_effective',),
+            },
+        ),
+        migrations.CreateModel(
+            name='FeePrice',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('modified_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('price', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Price')),
+                ('date_effective', models.DateField(default=django.utils.timezone.now, verbose_name='Date effective')),
+                ('fee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='simpellab_products.Fee', verbose_name='Fee')),
+            ],
+            options={
+                'verbose_name': 'Fee Price',
+                'verbose_name_plural': 'Fee Prices',
+                'ordering': ('-date_effective',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='parameterprice',
+            index=models.Index(fields=['parameter', '-date_effective'], name='products_param_price_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feeprice',
+            index=models.Index(fields=['fee', '-date_effective'], name='products_fee_price_date_idx'),
+        ),
+        migrations.RunPython(seed_price_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.0.8 on 2026-10-18 07:37
+
+from django.db import migrations, models
+import simpellab.core.search
+
+
+def get_product_values(product):
+    return [product.name, product.alias_name, product.inner_id] + [
+        item.tag.name for item in product.tagged_products.all()]
+
+
+def get_parameter_values(parameter):
+    return [parameter.code, parameter.name]
+
+
+def backfill_search_index(apps, schema_editor):
+    using = schema_editor.connection.alias
+    Product = apps.get_model('simpellab_products', 'Product')
+    Parameter = apps.get_model('simpellab_products', 'Parameter')
+    simpellab.core.search.rebuild_search_index(
+        Product.objects.using(using).prefetch_related('tagged_products__tag'),
+        get_values=get_product_values, using=using)
+    simpellab.core.search.rebuild_search_index(
+        Parameter.objects.using(using),
+        get_values=get_parameter_values, using=using)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simpellab_products', '0002_price_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parameter',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Search text'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Search text'),
+        ),
+        simpellab.core.search.CreateSearchIndex('parameter'),
+        simpellab.core.search.CreateSearchIndex('product'),
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.db.utils import cached_property
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django.core.validators import MinValueValidator
 from django.contrib.auth import get_user_model
@@ -108,4 +109,57 @@ class SellableMixin(models.Model):
         abstract = True
 
     display_price = models.DecimalField(default=0.0, max_digits=15, decimal_places=2)
-    discount = models.DecimalField(default=0.0, max_digits=15, decimal_places=2)
\ No newline at end of file
+    discount = models.DecimalField(default=0.0, max_digits=15, decimal_places=2)
+
+class PriceHistoryMixin(models.Model):
+    """
+    Model with ``price`` and ``date_effective`` fields, each price is
+    kept as version in ``prices`` related model.
+    """
+
+    class Meta:
+        abstract = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ori_price = self.__dict__.get('price')
+        self._ori_date_effective = self.__dict__.get('date_effective')
+
+    def price_changed(self):
+        return (
+            self._ori_price != self.price
+            or self._ori_date_effective != self.date_effective
+        )
+
+    def get_price_version(self, date=None):
+        """ Price version effective on date, default to today """
+        from simpellab.modules.products.pricing import as_date
+        version = self.prices.filter(
+            date_effective__lte=as_date(date)
+        ).order_by('-date_effective').first()
+        if version is None:
+            version = self.prices.model(
+                price=self.price, date_effective=self.date_effective)
+        return version
+
+    def get_price_at(self, date=None):
+        return self.get_price_version(date).price
+
+    def record_price(self, force=False):
+        """ Save current price as version effective on date_effective """
+        if force or self.price_changed():
+            versions = self.prices.filter(date_effective=self.date_effective)
+            if not versions.update(price=self.price):
+                self.prices.create(
+                    price=self.price, date_effective=self.date_effective)
+        self._ori_price = self.price
+        self._ori_date_effective = self.date_effective
+
+    def save(self, *args, **kwargs):
+        # Price edited without new date is effective from today,
+        # keep previous version in history.
+        if (not self._state.adding
+                and self._ori_price != self.price
+                and self._ori_date_effective == self.date_effective):
+            self.date_effective = timezone.localdate()
+        super().save(*args, **kwargs)
@@ -1,7 +1,7 @@
 import uuid
 from django.dispatch import receiver
 from django.db import models, transaction
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.utils import translation, timezone
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
@@ -16,9 +16,11 @@ from django_numerators.models import NumeratorMixin
 from simpellab.core.enums import MaxLength
 from simpellab.core.models import BaseModel, SimpleBaseModel
 from simpellab.core.managers import BasePolymorphicManager
+from simpellab.core.search import SearchIndexMixin
 from simpellab.utils.slugify import unique_slugify
 from simpellab.modules.partners.models import Partner
-from simpellab.modules.products.mixins import SellableMixin, StockableMixin
+from simpellab.modules.products.mixins import (
+    SellableMixin, StockableMixin, PriceHistoryMixin)
 
 
 _ = translation.gettext_lazy
@@ -27,8 +29,10 @@ _ = translation.gettext_lazy
 __all__ = [
     'UnitOfMeasure',
     'Fee',
+    'FeePrice',
     'Category',
     'Parameter',
+    'ParameterPrice',
     'Tag',
     'Product',
     'TaggedProduct',
@@ -75,7 +79,7 @@ class UnitOfMeasure(SnippetBase):
         verbose_name_plural = _('Units')
 
 
-class Fee(NumeratorMixin, SimpleBaseModel):
+class Fee(PriceHistoryMixin, NumeratorMixin, SimpleBaseModel):
     class Meta:
         verbose_name = _('Fee')
         verbose_name_plural = _('Fees')
@@ -109,6 +113,42 @@ class Fee(NumeratorMixin, SimpleBaseModel):
         return keys
 
 
+class PriceVersion(SimpleBaseModel):
+    """ Price effective from date_effective until next version """
+
+    class Meta:
+        abstract = True
+
+    price = models.DecimalField(
+        default=0,
+        max_digits=15,
+        decimal_places=2,
+        verbose_name=_('Price'))
+    date_effective = models.DateField(
+        default=timezone.now,
+        verbose_name=_('Date effective'))
+
+    def __str__(self):
+        return "{} ({})".format(self.price, self.date_effective)
+
+
+class FeePrice(PriceVersion):
+    class Meta:
+        verbose_name = _('Fee Price')
+        verbose_name_plural = _('Fee Prices')
+        ordering = ('-date_effective',)
+        indexes = [
+            models.Index(
+                fields=['fee', '-date_effective'],
+                name='products_fee_price_date_idx'),
+        ]
+
+    fee = models.ForeignKey(
+        Fee, on_delete=models.CASCADE,
+        related_name='prices',
+        verbose_name=_('Fee'))
+
+
 class Category(BaseModel, MPTTModel):
     class Meta:
         ordering = ['name']
@@ -158,12 +198,13 @@ class Category(BaseModel, MPTTModel):
         return super().save(*args, **kwargs)
 
 
-class Parameter(NumeratorMixin, SimpleBaseModel):
+class Parameter(SearchIndexMixin, PriceHistoryMixin, NumeratorMixin, SimpleBaseModel):
     class Meta:
         verbose_name = _('Parameter')
         verbose_name_plural = _('Parameters')
 
     doc_prefix = 'PRM'
+    search_index_fields = ['code', 'name']
 
     LAB = _('Laboratory')
     LIT = _('Inspection')
@@ -209,6 +250,23 @@ class Parameter(NumeratorMixin, SimpleBaseModel):
         return keys
 
 
+class ParameterPrice(PriceVersion):
+    class Meta:
+        verbose_name = _('Parameter Price')
+        verbose_name_plural = _('Parameter Prices')
+        ordering = ('-date_effective',)
+        indexes = [
+            models.Index(
+                fields=['parameter', '-date_effective'],
+                name='products_param_price_date_idx'),
+        ]
+
+    parameter = models.ForeignKey(
+        Parameter, on_delete=models.CASCADE,
+        related_name='prices',
+        verbose_name=_('Parameter'))
+
+
 class Tag(TagBase):
     class Meta:
         verbose_name = _("Tag")
@@ -219,7 +277,7 @@ class Tag(TagBase):
         return self._meta
 
 
-class Product(NumeratorMixin, SimpleBaseModel, PolymorphicModel):
+class Product(SearchIndexMixin, NumeratorMixin, SimpleBaseModel, PolymorphicModel):
     class Meta:
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
@@ -231,6 +289,7 @@ class Product(NumeratorMixin, SimpleBaseModel, PolymorphicModel):
         )
 
     objects = BasePolymorphicManager()
+    search_index_fields = ['name', 'alias_name', 'inner_id']
 
     name = models.CharField(
         verbose_name=_('name'),
@@ -319,14 +378,24 @@ class Product(NumeratorMixin, SimpleBaseModel, PolymorphicModel):
             self.save()
 
     def get_fee(self):
-        if not self.product_fees.count():
+        if self._state.adding:
             return 0
-        else:
-            return sum(map(lambda x: x.price, self.product_fees.all()))
+        return self.product_fees.aggregate(
+            total=models.Sum('price'))['total'] or 0
 
     def get_price(self):
         return self.price
 
+    def get_search_values(self):
+        values = super().get_search_values()
+        if self._state.adding:
+            return values
+        # taggit prefetch does not match uuid keys, go through items
+        items = self.tagged_products.all()
+        if 'tagged_products' not in getattr(self, '_prefetched_objects_cache', {}):
+            items = items.select_related('tag')
+        return values + [item.tag.name for item in items]
+
     def get_total_price(self):
         return self.price + self.fee
 
@@ -340,11 +409,16 @@ class Product(NumeratorMixin, SimpleBaseModel, PolymorphicModel):
 
     def add_to_cart(self, request):
         from simpellab.modules.carts.models import CommonCart
+        from simpellab.modules.carts.stores import get_cart_store
+        store = get_cart_store(request.user)
+        if store is not None:
+            return store.add(self, merge=True)
         with transaction.atomic():
             matrix = {'user':request.user, 'product': self}
             cart, create = CommonCart.objects.get_or_create(**matrix, defaults=matrix)
-            cart.quantity += 1
-            cart.save()
+            CommonCart.objects.filter(pk=cart.pk).update(
+                quantity=models.F('quantity') + 1)
+            cart.refresh_from_db(fields=['quantity'])
             return cart
 
 class TaggedProduct(TaggedItemBase):
@@ -395,7 +469,7 @@ class ProductFee(BaseModel):
         verbose_name_plural = _('Product Fees')
         unique_together = ('product', 'fee')
 
-    _ori_fee = None
+    _ori_fee_id = None
 
     product = models.ForeignKey(
         Product,
@@ -417,14 +491,13 @@ class ProductFee(BaseModel):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        if getattr(self, 'fee', False):
-            self._ori_fee = self.fee
+        self._ori_fee_id = self.__dict__.get('fee_id')
 
     def __str__(self):
         return self.fee.name
 
     def clean(self):
-        if self._state.adding is False and self._ori_fee != self.fee:
+        if self._state.adding is False and self._ori_fee_id != self.fee_id:
             msg = _("Fee can't be changed, please delete instead.")
             raise ValidationError({"fee": msg})
         pass
@@ -492,13 +565,38 @@ class Service(Product):
         super().save(*args, **kwargs)
 
 
+@receiver(post_save, sender=Fee)
+def after_save_fee(sender, **kwargs):
+    instance = kwargs.pop('instance', None)
+    if not kwargs.get('created') and instance._ori_price != instance.price:
+        from .pricing import sync_fee_prices, propagate_fee_prices_later
+        sync_fee_prices(instance, instance._ori_price)
+        instance.repriced_products = propagate_fee_prices_later([instance.pk])
+    instance.record_price(force=kwargs.get('created'))
+
+
+@receiver(post_save, sender=Parameter)
+def after_save_parameter(sender, **kwargs):
+    instance = kwargs.pop('instance', None)
+    instance.record_price(force=kwargs.get('created'))
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def after_change_product_tags(sender, **kwargs):
+    instance = kwargs.pop('instance', None)
+    if kwargs.get('action') in ['post_add', 'post_remove', 'post_clear']:
+        instance.refresh_search_index()
+
+
 @receiver(post_save, sender=ProductFee)
 def after_save_product_fee(sender, **kwargs):
+    from .pricing import reprice_products
     instance = kwargs.pop('instance', None)
-    instance.product.save()
+    reprice_products(Product._base_manager.filter(pk=instance.product_id))
 
 
 @receiver(post_delete, sender=ProductFee)
 def after_delete_product_fee(sender, **kwargs):
+    from .pricing import reprice_products
     instance = kwargs.pop('instance', None)
-    instance.product.save()
\ No newline at end of file
+    reprice_products(Product._base_manager.filter(pk=instance.product_id))
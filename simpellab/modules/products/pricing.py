@@ -0,0 +1,220 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from simpellab.modules.products.models import (
+    Fee, Parameter, Product, ProductFee)
+
+logger = logging.getLogger('simpellab.pricing')
+
+# Fee price changes reprice up to this many products in the request,
+# larger catalogs are repriced by rq worker.
+PRICE_PROPAGATION_SYNC_LIMIT = getattr(
+    settings, 'PRICE_PROPAGATION_SYNC_LIMIT', 500)
+
+PRICE_FIELD = models.DecimalField(max_digits=15, decimal_places=2)
+
+
+def product_fee_total():
+    """ Sum of product fees price, correlated to outer Product pk """
+    totals = ProductFee.objects.filter(
+        product=models.OuterRef('pk')
+    ).order_by().values('product').annotate(
+        total=models.Sum('price')
+    ).values('total')
+    return Coalesce(
+        models.Subquery(totals, output_field=PRICE_FIELD),
+        models.Value(0),
+        output_field=PRICE_FIELD
+    )
+
+
+def get_fee_products(fee_ids):
+    """ Products carrying any of the fees """
+    return Product._base_manager.filter(
+        pk__in=ProductFee.objects.filter(
+            fee_id__in=fee_ids).values('product_id'))
+
+
+def reprice_products(queryset=None):
+    """
+    Recompute fee and total_price of products in one UPDATE statement,
+    return number of products which price changed.
+    """
+    if queryset is None:
+        queryset = Product._base_manager.all()
+    fee = product_fee_total()
+    total_price = models.ExpressionWrapper(
+        models.F('price') + fee, output_field=PRICE_FIELD)
+    changed = queryset.order_by().exclude(fee=fee, total_price=total_price)
+    count = changed.update(fee=fee, total_price=total_price)
+    logger.info('%s product(s) repriced', count)
+    return count
+
+
+def sync_fee_prices(fee, old_price):
+    """
+    Copy new fee price to product fees still following old price,
+    product fee with other price are kept.
+    """
+    return ProductFee.objects.filter(
+        fee=fee, price=old_price).update(price=fee.price)
+
+
+def propagate_fee_prices(fee_ids=None):
+    """ Reprice every product carrying the fees, or all products """
+    if fee_ids is None:
+        return reprice_products()
+    return reprice_products(get_fee_products(fee_ids))
+
+
+def propagate_fee_prices_later(fee_ids):
+    """
+    Reprice products carrying the fees, small catalog is repriced now
+    and return changed count, otherwise enqueued after commit and
+    return None.
+    """
+    from simpellab.modules.products.workers import propagate_prices_later
+    fee_ids = list(fee_ids)
+    products = get_fee_products(fee_ids)
+    if products.count() <= PRICE_PROPAGATION_SYNC_LIMIT:
+        return reprice_products(products)
+    propagate_prices_later(fee_ids)
+    return None
+
+
+def as_date(value=None):
+    """ Date of DateField value which may be a datetime, default today """
+    if value is None:
+        return timezone.localdate()
+    if isinstance(value, datetime.datetime):
+        return timezone.localdate(value)
+    return value
+
+
+def price_at(model, date=None, outer='pk', default='price'):
+    """
+    Price of ``model`` (Fee or Parameter) referenced by ``outer`` from its
+    latest version effective on date, ``default`` field when no version.
+    """
+    rel = model._meta.get_field('prices')
+    latest = rel.related_model.objects.filter(**{
+        rel.field.name: models.OuterRef(outer),
+        'date_effective__lte': as_date(date)
+    }).order_by('-date_effective').values('price')[:1]
+    return Coalesce(
+        models.Subquery(latest, output_field=PRICE_FIELD),
+        models.F(default),
+        output_field=PRICE_FIELD
+    )
+
+
+def product_fee_price_at(date=None):
+    """
+    Product fee price effective on date, product fee following its fee
+    price resolve through the fee price history, product fee with other
+    price keep that price like in product_fee_total.
+    """
+    return models.Case(
+        models.When(
+            price=models.F('fee__price'),
+            then=price_at(Fee, date, outer='fee')),
+        default=models.F('price'),
+        output_field=PRICE_FIELD)
+
+
+def product_price_at(date=None, outer='pk', default='price'):
+    """ Product price plus its fees price effective on date """
+    fees = ProductFee.objects.filter(
+        product=models.OuterRef(outer)
+    ).annotate(
+        effective_price=product_fee_price_at(date)
+    ).order_by().values('product').annotate(
+        total=models.Sum('effective_price')
+    ).values('total')
+    fee = Coalesce(
+        models.Subquery(fees, output_field=PRICE_FIELD),
+        models.Value(0),
+        output_field=PRICE_FIELD
+    )
+    return models.ExpressionWrapper(
+        models.F(default) + fee, output_field=PRICE_FIELD)
+
+
+def resolve_prices(model, ids, date=None):
+    """ Map Fee or Parameter pk to its price effective on date """
+    rows = model._base_manager.filter(pk__in=ids).annotate(
+        effective_price=price_at(model, date)
+    ).values_list('pk', 'effective_price')
+    return dict(rows)
+
+
+def resolve_product_prices(ids, date=None):
+    """ Map Product pk to its total price effective on date """
+    rows = Product._base_manager.filter(pk__in=ids).annotate(
+        effective_price=product_price_at(date)
+    ).values_list('pk', 'effective_price')
+    return dict(rows)
+
+
+def resolve_item_prices(items, date=None):
+    """
+    Price order items queryset and their parameters on date in one
+    query, return mapping of item pk to (unit price, {parameter row pk:
+    price}).
+    """
+    fields = ['pk']
+    annotations = {
+        'product_price': product_price_at(
+            date, outer='product', default='product__price')
+    }
+    with_parameters = hasattr(items.model, 'get_parameter_prices')
+    if with_parameters:
+        fields.append('parameters__pk')
+        annotations['parameter_price'] = price_at(
+            Parameter, date,
+            outer='parameters__parameter',
+            default='parameters__parameter__price')
+    prices = {}
+    rows = items.non_polymorphic() if hasattr(items, 'non_polymorphic') else items
+    for row in rows.order_by().values(*fields).annotate(**annotations):
+        unit_price, parameters = prices.setdefault(
+            row['pk'], [row['product_price'], {}])
+        if with_parameters and row['parameters__pk'] is not None:
+            parameters[row['parameters__pk']] = row['parameter_price']
+    return {
+        pk: (unit_price + sum(parameters.values()), parameters)
+        for pk, (unit_price, parameters) in prices.items()
+    }
+
+
+def apply_price_versions(model, queryset=None, date=None):
+    """
+    Set price and date_effective of Fee or Parameter objects to their
+    version effective on date, scheduled prices take effect this way.
+    Return the updated objects.
+    """
+    rel = model._meta.get_field('prices')
+    latest = rel.related_model.objects.filter(**{
+        rel.field.name: models.OuterRef('pk'),
+        'date_effective__lte': as_date(date)
+    }).order_by('-date_effective')
+    if queryset is None:
+        queryset = model._base_manager.all()
+    queryset = queryset.annotate(
+        version_price=models.Subquery(latest.values('price')[:1]),
+        version_date=models.Subquery(latest.values('date_effective')[:1]),
+    ).filter(version_date__isnull=False).exclude(
+        price=models.F('version_price'),
+        date_effective=models.F('version_date'))
+    updated = []
+    for obj in queryset:
+        obj.price = obj.version_price
+        obj.date_effective = obj.version_date
+        obj.save()
+        updated.append(obj)
+    return updated
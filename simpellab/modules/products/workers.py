@@ -0,0 +1,17 @@
+import django_rq
+from django.db import transaction
+
+queue = django_rq.get_queue('default')
+
+
+def propagate_prices_task(fee_ids=None):
+    from .pricing import propagate_fee_prices
+    return propagate_fee_prices(fee_ids)
+
+
+def propagate_prices_later(fee_ids):
+    """ Reprice products carrying the fees after commit """
+    fee_ids = list(fee_ids)
+    transaction.on_commit(
+        lambda: queue.enqueue(propagate_prices_task, fee_ids)
+    )
@@ -4,15 +4,17 @@ from django.contrib import messages
 from django.contrib.admin.templatetags.admin_urls import add_preserved_filters
 from django.utils import translation
 from django.shortcuts import reverse, redirect
-from django.core.exceptions import ImproperlyConfigured
 
 from rangefilter.filter import DateRangeFilter
 from polymorphic.admin import PolymorphicParentModelAdmin, PolymorphicChildModelAdmin
 from admin_numeric_filter.admin import RangeNumericFilter
 
 from simpellab.core import hooks
-from simpellab.admin.admin import ModelAdmin, ReadOnlyAdminMixin, ModelMenuGroup
+from simpellab.admin.admin import (
+    ModelAdmin, ModelAdminPDFPrintMixin, PolymorphicParentAdminMixin,
+    ReadOnlyAdminMixin, ModelMenuGroup, StatusJournalAdminMixin)
 from simpellab.modules.sales.models import *
+from simpellab.modules.sales.recalculation import defer_recalculation
 
 
 _ = translation.ugettext_lazy
@@ -26,11 +28,31 @@ class OrderFeeInline(nested_admin.NestedTabularInline):
     readonly_fields = ['amount', 'total_fee']
 
 
-class SalesOrderChildAdmin(PolymorphicChildModelAdmin, nested_admin.NestedModelAdmin, ModelAdmin):
+class OrderInspectMixin:
+    """ Inspect real order instance with prefetched document rows """
+    inspect_template = 'admin/simpellab_sales/inspect.html'
+
+    def get_inspect_context(self, obj, request, extra_context=None):
+        context = super().get_inspect_context(obj, request, extra_context)
+        order_model = obj.get_real_instance_class()
+        context['instance'] = order_model.objects.prefetch_document().get(pk=obj.pk)
+        return context
+
+
+class SalesOrderChildAdmin(OrderInspectMixin, StatusJournalAdminMixin, PolymorphicChildModelAdmin, nested_admin.NestedModelAdmin, ModelAdmin):
     autocomplete_fields = ['customer']
     inlines = [OrderFeeInline]
     readonly_fields = ['total_order', 'discount', 'grand_total']
 
+    def save_related(self, request, form, formsets, change):
+        """ Recompute nested items and order totals once """
+        with defer_recalculation():
+            super().save_related(request, form, formsets, change)
+
+    def delete_model(self, request, obj):
+        with defer_recalculation():
+            super().delete_model(request, obj)
+
     def response_delete(self, request, obj_display, obj_id):
         """
         Determine the HttpResponse for the delete_view stage.
@@ -80,6 +102,19 @@ class SalesOrderChildAdmin(PolymorphicChildModelAdmin, nested_admin.NestedModelA
             return [OrderFeeInline]
 
 
+class OrderItemParameterFormSet(nested_admin.NestedInlineFormSet):
+    """ Insert new parameter rows with item bulk parameter API """
+
+    def save_new(self, form, commit=True):
+        return super().save_new(form, commit=False)
+
+    def save(self, commit=True):
+        instances = super().save(commit=commit)
+        if commit and self.new_objects:
+            self.instance.add_parameters(self.new_objects)
+        return instances
+
+
 class SalesOrderItemInline(nested_admin.NestedStackedInline):
     extra = 0
     min_num = 1
@@ -88,8 +123,10 @@ class SalesOrderItemInline(nested_admin.NestedStackedInline):
     readonly_fields = ['unit_price', 'total_price']
 
 
-class OrderAdminBase(ModelAdmin):
+class OrderAdminBase(OrderInspectMixin, StatusJournalAdminMixin, ModelAdminPDFPrintMixin, ModelAdmin):
     menu_icon = 'bookmark'
+    print_template = None
+    print_async = True
     list_display = ['customer', 'created_at']
     search_fields = ['inner_id', 'customer__name']
     list_display = [
@@ -109,80 +146,52 @@ class OrderAdminBase(ModelAdmin):
         ('grand_total', RangeNumericFilter),
         'status',
     ]
-    actions = ['trash_action', 'draft_action', 'validate_action']
+    actions = ['trash_action', 'draft_action', 'validate_action', 'print_selected_action']
 
     def state(self, obj):
         return obj.get_status_display()
 
+    def bulk_status_action(self, request, queryset, action):
+        report = getattr(queryset, 'bulk_%s' % action)(actor=request.user)
+        opts = self.model._meta
+        if report.changed:
+            self.message_user(
+                request,
+                _('%(count)s %(name)s successfully updated.') % {
+                    'count': len(report.changed),
+                    'name': opts.verbose_name_plural,
+                },
+                messages.SUCCESS,
+            )
+        for msg in report.messages:
+            self.message_user(request, msg, messages.WARNING)
+
     def trash_action(self, request, queryset):
-        try:
-            for i in queryset.all():
-                i.get_real_instance().trash()
-        except PermissionError as err:
-            print(err)
+        self.bulk_status_action(request, queryset, 'trash')
 
     trash_action.short_description = _('Trash selected Sales Orders')
 
     def draft_action(self, request, queryset):
-        try:
-            for i in queryset.all():
-                i.get_real_instance().draft()
-        except PermissionError as err:
-            print(err)
+        self.bulk_status_action(request, queryset, 'draft')
 
     draft_action.short_description = _('Draft selected Sales Orders')
 
     def validate_action(self, request, queryset):
-        try:
-            for i in queryset.all():
-                real = i.get_real_instance()
-                real.validate()
-        except PermissionError as err:
-            print(err)
+        self.bulk_status_action(request, queryset, 'validate')
 
     validate_action.short_description = _('Validate selected Sales Orders')
 
-    def get_inspect_context(self, obj, request, extra_context=None):
-        context = {
-            **self.admin_site.each_context(request),
-            'self': self,
-            'opts': self.opts,
-            'instance': obj.get_real_instance(),
-            **(extra_context or {})
-        }
-        return context
-
 
 class OrderAdmin(ReadOnlyAdminMixin, OrderAdminBase):
     pass
 
 
 @admin.register(SalesOrder)
-class PolymorphicOrderAdmin(PolymorphicParentModelAdmin, OrderAdminBase):
+class PolymorphicOrderAdmin(PolymorphicParentAdminMixin, PolymorphicParentModelAdmin, OrderAdminBase):
     child_models = [
         CommonOrder
     ]
-
-    def get_child_models(self):
-        """ 
-            Register child model using hooks
-
-            @hooks.register('sales_order_child_model', order=1)
-            def register_child_model():
-                return ChildModel
-        """
-        super_child_models = super().get_child_models()
-        child_models = list(super_child_models).copy()
-        
-        # list function that return SalesOrderModel
-        for func in hooks.get_hooks('sales_order_child_model'):
-            value = func()
-            if issubclass(value, SalesOrder):
-                child_models.append(value)
-            else:
-                raise ImproperlyConfigured('Hook sales_order_child_model should return SalesOrder subclass')
-        
-        return child_models
+    child_models_hook = 'sales_order_child_model'
 
 
 class CommonOrderItemInline(SalesOrderItemInline):
@@ -195,8 +204,11 @@ class CommonOrderAdmin(SalesOrderChildAdmin):
 
 
 @admin.register(Invoice)
-class InvoiceAdmin(ReadOnlyAdminMixin, ModelAdmin):
+class InvoiceAdmin(ReadOnlyAdminMixin, ModelAdminPDFPrintMixin, ModelAdmin):
     menu_icon = 'bookmark'
+    print_template = None
+    print_async = True
+    actions = ['print_selected_action']
     search_fields = ['inner_id', 'billed_to__name']
     list_display = [
         'inner_id', 
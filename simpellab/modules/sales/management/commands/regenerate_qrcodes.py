@@ -0,0 +1,55 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from simpellab.modules.sales.models import SalesOrder, Invoice
+from simpellab.modules.sales.qrcodes import generate_qrcodes
+from simpellab.modules.sales.workers import enqueue_qrcodes
+
+
+class Command(BaseCommand):
+    help = (
+        'Render document QRCodes in chunks, chunks are enqueued to rq '
+        'so every running worker renders in parallel.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*',
+            help='Model labels, default to SalesOrder and Invoice.')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate existing QRCode images too.')
+        parser.add_argument('--chunk-size', type=int, default=100)
+        parser.add_argument(
+            '--sync', action='store_true',
+            help='Render in this process instead of rq workers.')
+
+    def get_models(self, labels):
+        if not labels:
+            return [SalesOrder, Invoice]
+        try:
+            return [apps.get_model(label) for label in labels]
+        except (LookupError, ValueError) as err:
+            raise CommandError(err)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        force = options['force']
+        for model in self.get_models(options['models']):
+            queryset = model._default_manager.order_by('pk')
+            if hasattr(queryset, 'non_polymorphic'):
+                queryset = queryset.non_polymorphic()
+            if not force:
+                queryset = queryset.filter(
+                    models.Q(qrcode='') | models.Q(qrcode__isnull=True))
+            ids = list(queryset.values_list('pk', flat=True))
+            for i in range(0, len(ids), chunk_size):
+                chunk = ids[i:i + chunk_size]
+                if options['sync']:
+                    generate_qrcodes(model, chunk, force=force)
+                else:
+                    enqueue_qrcodes(model._meta.label, chunk, force=force)
+            self.stdout.write(self.style.SUCCESS('%s: %s QRCode(s) %s' % (
+                model._meta.verbose_name_plural, len(ids),
+                'rendered' if options['sync'] else 'enqueued')))
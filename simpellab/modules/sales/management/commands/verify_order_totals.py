@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.backends.utils import format_number
+from django.db.models.functions import Coalesce
+
+from simpellab.modules.sales.models import SalesOrder, OrderFee
+
+
+def sum_subquery(model, field):
+    """ Sum ``field`` of ``model`` rows belong to outer order """
+    sqs = Coalesce(
+        models.Subquery(
+            model.objects.filter(
+                order=models.OuterRef('pk')
+            ).order_by().values('order').annotate(
+                total=models.Sum(field)
+            ).values('total'),
+            output_field=models.DecimalField(max_digits=15, decimal_places=2)
+        ), 0)
+    return sqs
+
+
+def get_order_models():
+    """ Concrete SalesOrder subclasses that have order_items """
+    for model in apps.get_models():
+        if issubclass(model, SalesOrder) and model is not SalesOrder:
+            yield model
+
+
+def round_amount(value):
+    """ Round like stored order amounts """
+    field = SalesOrder._meta.get_field('grand_total')
+    return Decimal(format_number(
+        Decimal(str(value)), field.max_digits, field.decimal_places))
+
+
+def get_expected_totals(order):
+    """ Total order, discount and grand total from full aggregate """
+    total_order = round_amount(order.expected)
+    discount = round_amount(total_order * order.discount_percentage / 100)
+    return total_order, discount, round_amount(total_order - discount)
+
+
+class Command(BaseCommand):
+    help = (
+        'Verify delta maintained sales order total, discount and grand '
+        'total against full aggregate.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair', action='store_true',
+            help='Rewrite drifted order totals with the aggregate value.')
+
+    def handle(self, *args, **options):
+        drifted = 0
+        for model in get_order_models():
+            item_model = model._meta.get_field('order_items').related_model
+            queryset = model.objects.non_polymorphic().annotate(
+                expected=(
+                    sum_subquery(item_model, 'total_price')
+                    + sum_subquery(OrderFee, 'total_fee')
+                )
+            ).only('inner_id', 'total_order', 'discount_percentage',
+                   'discount', 'grand_total')
+            for order in queryset.iterator():
+                stored = (order.total_order, order.discount, order.grand_total)
+                expected = get_expected_totals(order)
+                if tuple(map(round_amount, stored)) == expected:
+                    continue
+                drifted += 1
+                self.stdout.write(
+                    '%s: %s stored %s/%s/%s, expected %s/%s/%s' % (
+                        (model._meta.verbose_name, order.inner_id)
+                        + stored + expected))
+                if options['repair']:
+                    self.repair(order, expected)
+        msg = '%s drifted order(s) found' % drifted
+        if options['repair']:
+            msg += ', repaired'
+        self.stdout.write(self.style.SUCCESS(msg))
+
+    @transaction.atomic
+    def repair(self, order, expected):
+        total_order, discount, grand_total = expected
+        SalesOrder.objects.filter(pk=order.pk).update(
+            total_order=total_order,
+            discount=discount,
+            grand_total=grand_total
+        )
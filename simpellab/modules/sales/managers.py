@@ -1,5 +1,9 @@
-from django.db import models
-from simpellab.core.managers import PolymorphicManager
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models, transaction
+from django.db.models import Prefetch
+from simpellab.core.managers import PolymorphicManager, PolymorphicStatusQuerySet
+from simpellab.utils.numerators import allocate_reg_numbers
+from .workers import generate_qrcodes_later
 
 
 class SalesQuotationManager(models.Manager):
@@ -8,8 +12,66 @@ class SalesQuotationManager(models.Manager):
         return qs
 
 
-class SalesOrderManager(PolymorphicManager):
+class SalesOrderQuerySet(PolymorphicStatusQuerySet):
+
+    def prefetch_document(self):
+        """
+        Fetch everything an order document show in a fixed number of
+        queries: customer contact and addresses, order fees, and order
+        items with product, product fees and parameters. Use on child
+        order model, eg. ``LaboratoriumOrder.objects.prefetch_document()``.
+        """
+        from simpellab.modules.products.models import ProductFee
+        from simpellab.modules.sales.models import OrderFee
+
+        item_model = self.model._meta.get_field('order_items').related_model
+        lookups = [
+            'customer__addresses',
+            Prefetch(
+                'order_fees',
+                queryset=OrderFee.objects.select_related('fee__unit_of_measure')),
+            Prefetch(
+                'order_items',
+                queryset=item_model.objects.non_polymorphic().select_related(
+                    'product__unit_of_measure')),
+            Prefetch(
+                'order_items__product__product_fees',
+                queryset=ProductFee.objects.select_related('fee')),
+        ]
+        try:
+            parameter_model = item_model._meta.get_field('parameters').related_model
+        except FieldDoesNotExist:
+            pass
+        else:
+            lookups.append(Prefetch(
+                'order_items__parameters',
+                queryset=parameter_model.objects.select_related(
+                    'parameter__unit_of_measure')))
+        return self.non_polymorphic().select_related(
+            'customer__contact').prefetch_related(*lookups)
+
+
+class SalesOrderManager(PolymorphicManager.from_queryset(SalesOrderQuerySet)):
+    queryset_class = SalesOrderQuerySet
+
     def get_queryset(self):
         qs = super().get_queryset()
         return qs
-        
\ No newline at end of file
+        
+
+class InvoiceManager(models.Manager):
+
+    @transaction.atomic
+    def bulk_create_for_orders(self, orders):
+        """
+        Create pending invoice for each sales order with single
+        bulk_create, numerator values are allocated in block and
+        QRCode generated by background job after commit.
+        """
+        invoices = [self.model.for_sales_order(order) for order in orders]
+        if not invoices:
+            return invoices
+        allocate_reg_numbers(invoices)
+        self.bulk_create(invoices)
+        generate_qrcodes_later(self.model, [invoice.pk for invoice in invoices])
+        return invoices
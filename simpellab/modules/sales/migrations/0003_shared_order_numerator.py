@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+def share_order_numerators(apps, schema_editor):
+    """
+    Orders of every app now count on one SalesOrder numerator, start it
+    from the highest counter of the former per app numerators so new
+    reg numbers don't collide with existing inner ids.
+    """
+    Numerator = apps.get_model('django_numerators', 'Numerator')
+    child_numerators = Numerator.objects.filter(
+        model='simpellab_sales.SalesOrder'
+    ).exclude(app_label='simpellab_sales').order_by('prefix', '-counter')
+    latest = {}
+    for numerator in child_numerators:
+        latest.setdefault(numerator.prefix, numerator)
+    for prefix, numerator in latest.items():
+        shared, created = Numerator.objects.get_or_create(
+            app_label='simpellab_sales',
+            model='simpellab_sales.SalesOrder',
+            prefix=prefix,
+            defaults={
+                'year': numerator.year,
+                'month': numerator.month,
+                'reset_mode': numerator.reset_mode,
+                'counter': numerator.counter,
+            })
+        if shared.counter < numerator.counter:
+            shared.counter = numerator.counter
+            shared.save(update_fields=['counter'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simpellab_sales', '0002_auto_20200722_0423'),
+        ('django_numerators', '0002_auto_20200410_0236'),
+    ]
+
+    operations = [
+        migrations.RunPython(share_order_numerators, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+from urllib.parse import urlsplit
+
+from django.core.exceptions import ValidationError
+from django.db import migrations
+from django.urls import Resolver404, resolve
+
+# Public url name of documents to their short url model
+PUBLIC_URL_MODELS = {
+    'sales_salesorder_inspect_public': 'salesorder',
+    'sales_invoice_inspect_public': 'invoice',
+}
+
+
+def backfill_short_url_index(apps, schema_editor):
+    """
+    Set content type and object id of short urls created before the
+    reverse index from the document id in their public url, so they
+    are found by index instead of url.
+    """
+    ShortUrl = apps.get_model('simpellab_shorturls', 'ShortUrl')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    matches = {}
+    for short_url in ShortUrl.objects.filter(content_type__isnull=True).iterator():
+        try:
+            match = resolve(urlsplit(short_url.original_url).path)
+        except Resolver404:
+            continue
+        model_name = PUBLIC_URL_MODELS.get(match.url_name)
+        if model_name is None:
+            continue
+        model = apps.get_model('simpellab_sales', model_name)
+        try:
+            object_id = model._meta.pk.to_python(match.kwargs['instance_id'])
+        except ValidationError:
+            continue
+        matches.setdefault(model_name, {})[object_id] = short_url
+    for model_name, short_urls in matches.items():
+        model = apps.get_model('simpellab_sales', model_name)
+        content_type, created = ContentType.objects.get_or_create(
+            app_label='simpellab_sales', model=model_name)
+        existing = model._base_manager.filter(
+            pk__in=list(short_urls)).values_list('pk', flat=True)
+        updated = []
+        for object_id in existing:
+            short_url = short_urls[object_id]
+            short_url.content_type = content_type
+            short_url.object_id = object_id
+            updated.append(short_url)
+        ShortUrl.objects.bulk_update(
+            updated, ['content_type', 'object_id'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simpellab_sales', '0003_shared_order_numerator'),
+        ('simpellab_shorturls', '0002_shorturl_reverse_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_short_url_index, migrations.RunPython.noop),
+    ]
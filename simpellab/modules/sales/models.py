@@ -1,5 +1,5 @@
 from django.db import models, transaction
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.utils import translation, timezone
 from django.shortcuts import reverse
@@ -7,8 +7,7 @@ from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.conf import settings
 
-from django_numerators.models import NumeratorMixin
-from django_qrcodes.models import QRCodeMixin
+from django_numerators.models import Numerator, NumeratorMixin, NumeratorReset
 from polymorphic.models import PolymorphicModel
 
 from simpellab.utils.text import number_to_text_id
@@ -24,8 +23,18 @@ from simpellab.core.mixins import (
     )
 from simpellab.modules.partners.models import Partner
 from simpellab.modules.products.enums import ProductType
-from simpellab.modules.products.models import Fee, Product
-from simpellab.modules.sales.managers import SalesOrderManager
+from simpellab.modules.products.models import Fee, Product, Parameter
+from simpellab.modules.products.pricing import (
+    as_date, resolve_item_prices, resolve_prices, resolve_product_prices)
+from simpellab.modules.sales.managers import SalesOrderManager, InvoiceManager
+from simpellab.modules.sales.qrcodes import AsyncQRCodeMixin
+from simpellab.modules.sales.recalculation import (
+    defer_recalculation,
+    get_deleting,
+    is_deleting,
+    recalculate_order,
+    recalculate_item
+    )
 from simpellab.modules.shorturls.models import ShortUrl
 
 _ = translation.gettext_lazy
@@ -33,6 +42,8 @@ _ = translation.gettext_lazy
 
 BASE_URL = getattr(settings, 'BASE_URL', 'http://localhost:8000')
 
+INCREMENTAL_TOTALS = getattr(settings, 'SALES_INCREMENTAL_TOTALS', False)
+
 
 __all__ = [
     'SalesOrder', # Base Class
@@ -45,7 +56,7 @@ __all__ = [
 ]
 
 
-class SalesOrder(PolymorphicModel, QRCodeMixin, NumeratorMixin, FiveStepStatusMixin, SimpleBaseModel):
+class SalesOrder(PolymorphicModel, AsyncQRCodeMixin, NumeratorMixin, FiveStepStatusMixin, SimpleBaseModel):
     class Meta:
         verbose_name = _('Sales Order')
         verbose_name_plural = _('Sales Orders')
@@ -62,6 +73,10 @@ class SalesOrder(PolymorphicModel, QRCodeMixin, NumeratorMixin, FiveStepStatusMi
 
     objects = SalesOrderManager()
 
+    # Maintain total_order with signed deltas from item and fee
+    # changes instead of re-aggregating them on every save
+    incremental_total = INCREMENTAL_TOTALS
+
     contract = models.BooleanField(
         default=False,
         help_text=_('This order is based on customer contract')
@@ -122,21 +137,36 @@ class SalesOrder(PolymorphicModel, QRCodeMixin, NumeratorMixin, FiveStepStatusMi
     def get_public_url_with_hostname(self):
         return ''.join([BASE_URL, self.get_public_url()])
 
+    short_url_related = ['customer']
+
+    def get_short_url_name(self):
+        return 'Sales Order %s' % self.customer.name
+
     def get_short_url(self):
-        try:
-            short_url = ShortUrl.objects.get(
-                original_url=self.get_public_url_with_hostname()
-            )
-        except ShortUrl.DoesNotExist:
-            short_url = ShortUrl(
-                name='Sales Order %s' % self.customer.name,
-                original_url= self.get_public_url_with_hostname(),
-                ads=False,
-                public=False
-            )
-            short_url.save()
+        short_url = self._short_url or ShortUrl.objects.get_or_create_for_object(
+            self, ads=False, public=False)
         return short_url.get_absolute_url_with_hostname()
 
+    def get_numerator(self):
+        """
+        Every order type share the SPJ prefix, django_numerators key the
+        counter by child app label which give orders of two apps the same
+        inner_id. Count them on one SalesOrder numerator, migration 0003
+        start it from the former per app counters.
+        """
+        opts = SalesOrder._meta
+        return Numerator.objects.get_or_create(
+            app_label=opts.app_label,
+            model=self.parent_model,
+            prefix=self.get_doc_prefix(),
+            defaults={
+                'year': self.get_date_field().year,
+                'month': (
+                    self.get_date_field().month
+                    if self.reset_mode == NumeratorReset.MONTHLY else 0),
+                'reset_mode': self.reset_mode,
+            })[0]
+
     def get_order_items(self):
         """ Get child object order_items """
         raise NotImplementedError(
@@ -144,6 +174,10 @@ class SalesOrder(PolymorphicModel, QRCodeMixin, NumeratorMixin, FiveStepStatusMi
                 + ' get_order_items() that '
                 + 'return order_items queryset') % self.__class__.__name__)
 
+    def resolve_item_prices(self, date=None):
+        """ Items and parameters prices effective on date, in one query """
+        return resolve_item_prices(self.get_order_items().all(), date)
+
     def calc_total_products(self):
         total_products = self.get_order_items().aggregate(
                 val=models.Sum('total_price')
@@ -157,11 +191,37 @@ class SalesOrder(PolymorphicModel, QRCodeMixin, NumeratorMixin, FiveStepStatusMi
         return total_fees
 
     def calc_total_order(self):
+        if self.incremental_total:
+            self.total_order = self.get_stored_total_order()
+            return self.total_order
         total_products = self.calc_total_products()
         total_fees = self.calc_total_fees()
         self.total_order = total_fees + total_products
         return self.total_order
 
+    def get_stored_total_order(self):
+        """ Get delta maintained total order from database """
+        if self._state.adding:
+            return 0
+        total_order = SalesOrder.objects.filter(pk=self.pk).values_list(
+            'total_order', flat=True).first()
+        return total_order or 0
+
+    def apply_total_delta(self, delta):
+        """ Add signed delta to order totals with single UPDATE """
+        output_field = models.DecimalField(max_digits=15, decimal_places=2)
+        total_order = models.ExpressionWrapper(
+            models.F('total_order') + delta,
+            output_field=output_field)
+        discount = models.ExpressionWrapper(
+            total_order * models.F('discount_percentage') / 100,
+            output_field=output_field)
+        SalesOrder.objects.filter(pk=self.pk).update(
+            total_order=total_order,
+            discount=discount,
+            grand_total=total_order - discount
+        )
+
     def calc_total_discount(self):
         self.discount = ((self.total_order * self.discount_percentage) / 100)
 
@@ -183,19 +243,14 @@ class SalesOrder(PolymorphicModel, QRCodeMixin, NumeratorMixin, FiveStepStatusMi
 
     def post_validate_action(self):
         """ Create Invoice after sales order validated """
-        invoice = Invoice(
-            sales_order=self,
-            sales_order_type=self.opts.model_name,
-            billed_to=self.customer,
-            due_date=self.created_at,
-            description=self.note,
-            total_order=self.total_order,
-            discount_percentage=self.discount_percentage,
-            discount=self.discount,
-            grand_total=self.grand_total
-        )
+        invoice = Invoice.for_sales_order(self)
         invoice.save()
 
+    @classmethod
+    def post_validate_batch(cls, orders):
+        """ Create Invoices after sales orders bulk validated """
+        Invoice.objects.bulk_create_for_orders(orders)
+
 
 class OrderFee(BaseModel):
     class Meta:
@@ -204,7 +259,8 @@ class OrderFee(BaseModel):
         ordering = ('fee',)
         unique_together = ('order', 'fee')
 
-    _ori_fee = None
+    _ori_fee_id = None
+    _ori_total_fee = 0
 
     order = models.ForeignKey(
         SalesOrder,
@@ -238,23 +294,31 @@ class OrderFee(BaseModel):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        if getattr(self, 'fee', None):
-            self._ori_fee = self.fee
+        # Compare ids, fetching fee here cost a query per loaded row
+        self._ori_fee_id = self.__dict__.get('fee_id')
+        self._ori_total_fee = self.__dict__.get('total_fee') or 0
 
     def __str__(self):
         return self.fee.name
 
     def clean(self):
         # Make sure price don't change directly when tarif price changed
-        if self._state.adding is False and self._ori_fee.id != self.fee.id:
+        if self._state.adding is False and self._ori_fee_id != self.fee_id:
             msg = _("Fee can't be changed, please delete instead.")
             raise ValidationError({"fee": msg})
 
+    def get_total_delta(self):
+        """ Signed total fee change made by current save """
+        return self.total_fee - self._ori_total_fee
+
     def save(self, *args, **kwargs):
+        if self._state.adding:
+            self._ori_total_fee = 0
         self.amount = self.fee.price
         self.total_fee = self.fee.price * self.quantity
         self.clean()
         super().save(*args, **kwargs)
+        self._ori_total_fee = self.total_fee
 
 
 class OrderItem(NumeratorMixin, PolymorphicModel, SimpleBaseModel):
@@ -263,7 +327,8 @@ class OrderItem(NumeratorMixin, PolymorphicModel, SimpleBaseModel):
         verbose_name_plural = _('Order Items')
         ordering = ('created_at',)
 
-    _ori_product = None
+    _ori_product_id = None
+    _ori_total_price = 0
 
     name = models.CharField(
         null=True, blank=False,
@@ -292,16 +357,16 @@ class OrderItem(NumeratorMixin, PolymorphicModel, SimpleBaseModel):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        if getattr(self, 'product', False):
-            self._ori_product = self.product
+        self._ori_product_id = self.__dict__.get('product_id')
+        self._ori_total_price = self.__dict__.get('total_price') or 0
 
     def __str__(self):
         return str(self.inner_id)
 
     def clean(self):
         not_adding = self._state.adding is False
-        if self._ori_product:
-            is_changed = self._ori_product.id != self.product.id
+        if self._ori_product_id:
+            is_changed = self._ori_product_id != self.product_id
         else:
             is_changed = False
         if not_adding and is_changed:
@@ -309,15 +374,114 @@ class OrderItem(NumeratorMixin, PolymorphicModel, SimpleBaseModel):
             raise ValidationError({"product": msg})
         super().clean()
 
+    def get_price_date(self):
+        """ Prices effective on item creation date are used """
+        return as_date(self.created_at)
+
+    def get_product_price(self):
+        return resolve_product_prices(
+            [self.product_id], self.get_price_date())[self.product_id]
+
     def calculate_unit_price(self):
-        unit_price = self.product.get_real_instance().total_price
+        unit_price = self.get_product_price()
         return unit_price
 
+    def get_total_delta(self):
+        """ Signed total price change made by current save """
+        return self.total_price - self._ori_total_price
+
     def save(self, *args, **kwargs):
+        if self._state.adding:
+            self._ori_total_price = 0
         self.unit_price = self.calculate_unit_price()
         self.total_price = self.quantity * self.unit_price
         self.clean()
         super().save(*args, **kwargs)
+        self._ori_total_price = self.total_price
+
+
+class ParameterOrderItemMixin(models.Model):
+    """ Order item with parameters, the parameter model should have
+        ``order_item`` foreign key with ``parameters`` related name """
+
+    class Meta:
+        abstract = True
+
+    def get_parameter_prices(self):
+        return self.parameters.aggregate(
+            total_parameters=models.Sum('price')
+        )['total_parameters'] or 0
+
+    def calculate_unit_price(self):
+        base_price = self.get_product_price()
+        parameters = self.get_parameter_prices()
+        unit_price = base_price + parameters
+        return unit_price
+
+    def make_parameters(self, parameters):
+        """
+        Build unsaved parameter rows, ``parameters`` items can be
+        Parameter, Parameter primary key or unsaved parameter row.
+        Price is snapshotted from Parameter price effective on row date.
+        """
+        model = self.parameters.model
+        pks = [
+            value for value in parameters
+            if not isinstance(value, (model, Parameter))
+        ]
+        fetched = {}
+        if pks:
+            for pk, parameter in Parameter.objects.in_bulk(pks).items():
+                fetched[str(pk)] = parameter
+        rows = []
+        unpriced = {}
+        for value in parameters:
+            if isinstance(value, model):
+                row = value
+            elif isinstance(value, Parameter):
+                row = model(parameter=value)
+            else:
+                row = model(parameter=fetched[str(value)])
+            row.order_item = self
+            row.clean()
+            if not row.date_effective:
+                row.date_effective = row.parameter.date_effective
+            if not row.price:
+                date = as_date(row.date_effective)
+                unpriced.setdefault(date, []).append(row)
+            rows.append(row)
+        # One price query per distinct row date, usually today
+        for date, date_rows in unpriced.items():
+            prices = resolve_prices(
+                Parameter, [row.parameter_id for row in date_rows], date)
+            for row in date_rows:
+                row.price = prices[row.parameter_id]
+        return rows
+
+    def add_parameters(self, parameters):
+        """ Bulk insert parameters, item and order totals
+            are recomputed once """
+        with defer_recalculation():
+            rows = self.make_parameters(parameters)
+            self.parameters.model.objects.bulk_create(rows)
+            recalculate_item(self)
+        return rows
+
+    def set_parameters(self, parameters):
+        """ Replace item parameters, rows of kept parameters
+            are left untouched with their price snapshot,
+            repeated parameters are added once """
+        with defer_recalculation():
+            rows = {}
+            for row in self.make_parameters(parameters):
+                rows.setdefault(row.parameter.pk, row)
+            rows = list(rows.values())
+            kept = [row.parameter.pk for row in rows]
+            self.parameters.exclude(parameter__in=kept).delete()
+            existing = set(self.parameters.values_list('parameter', flat=True))
+            new_rows = [row for row in rows if row.parameter.pk not in existing]
+            self.add_parameters(new_rows)
+        return rows
 
 
 class CommonOrder(SalesOrder):
@@ -351,7 +515,7 @@ class OrderItemParameter(BaseModel):
     class Meta:
         abstract = True
 
-    _ori_parameter = None
+    _ori_parameter_id = None
 
     note = models.CharField(
         max_length=MaxLength.MEDIUM.value,
@@ -371,14 +535,13 @@ class OrderItemParameter(BaseModel):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        if getattr(self, 'parameter', False):
-            self._ori_parameter = self.parameter
+        self._ori_parameter_id = self.__dict__.get('parameter_id')
 
     def clean(self):
         # Prevent parameter change
-        if getattr(self, 'parameter', None):
+        if getattr(self, 'parameter_id', None):
             not_adding = self._state.adding is False
-            is_changed = self._ori_parameter != self.parameter
+            is_changed = self._ori_parameter_id != self.parameter_id
             if not_adding and is_changed:
                 msg = _("Parameter can't be changed, please delete instead.")
                 raise ValidationError({"parameter": msg})
@@ -386,10 +549,10 @@ class OrderItemParameter(BaseModel):
 
     def save(self, *args, **kwargs):
         self.clean()
-        if not self.price:
-            self.price = self.parameter.price
         if not self.date_effective:
             self.date_effective = self.parameter.date_effective
+        if not self.price:
+            self.price = self.parameter.get_price_at(self.date_effective)
         super().save(*args, **kwargs)
 
 
@@ -408,11 +571,13 @@ class InvoiceStatusMixin(
     )
 
 
-class Invoice(QRCodeMixin, NumeratorMixin, InvoiceStatusMixin, SimpleBaseModel):
+class Invoice(AsyncQRCodeMixin, NumeratorMixin, InvoiceStatusMixin, SimpleBaseModel):
     class Meta:
         verbose_name = _('Invoice')
         verbose_name_plural = _('Invoices')
 
+    objects = InvoiceManager()
+
     doc_prefix = 'INV'
 
     contract = models.BooleanField(
@@ -484,6 +649,22 @@ class Invoice(QRCodeMixin, NumeratorMixin, InvoiceStatusMixin, SimpleBaseModel):
     def __str__(self):
         return self.inner_id
 
+    @classmethod
+    def for_sales_order(cls, sales_order):
+        """ Build unsaved invoice from sales order """
+        invoice = cls(
+            sales_order=sales_order,
+            sales_order_type=sales_order.opts.model_name,
+            due_date=sales_order.created_at,
+            description=sales_order.note,
+            total_order=sales_order.total_order,
+            discount_percentage=sales_order.discount_percentage,
+            discount=sales_order.discount,
+            grand_total=sales_order.grand_total
+        )
+        invoice.calc_invoice()
+        return invoice
+
     @property
     def is_closed(self):
         return self.status == Status.CLOSED.value
@@ -507,11 +688,13 @@ class Invoice(QRCodeMixin, NumeratorMixin, InvoiceStatusMixin, SimpleBaseModel):
             return
         if self.pay_valid_condition:
             self.pre_pay_action()
+            from_status = self.status
             self.status = Status.PAID.value
             self.refund = refund
             self.paid += amount 
             self.date_paid = timezone.now()
             self.save()
+            self.record_transition(from_status)
             self.post_pay_action()
         else:
             raise PermissionError(self.get_status_msg('paid'))
@@ -530,16 +713,19 @@ class Invoice(QRCodeMixin, NumeratorMixin, InvoiceStatusMixin, SimpleBaseModel):
     def is_payment_complete(self):
         return self.grand_total == self.paid
 
-    def save(self, *args, **kwargs):
+    def calc_invoice(self):
         if self._state.adding:
             self.status = Status.PENDING.value
         if self.is_payment_complete:
             self.status = Status.CLOSED.value
-            self.date_closed = timezone.now
-        self.billed_to = self.sales_order.customer
+            self.date_closed = timezone.now()
+        self.billed_to_id = self.sales_order.customer_id
         self.contract = self.sales_order.contract
         self.contract_number = self.sales_order.contract_number
         self.calc_refund_receivable()
+
+    def save(self, *args, **kwargs):
+        self.calc_invoice()
         super().save(*args, **kwargs)
 
     def get_qrcode_data(self): 
@@ -551,41 +737,54 @@ class Invoice(QRCodeMixin, NumeratorMixin, InvoiceStatusMixin, SimpleBaseModel):
     def get_public_url_with_hostname(self):
         return ''.join([BASE_URL, self.get_public_url()])
 
+    short_url_related = ['billed_to']
+
+    def get_short_url_name(self):
+        return 'Invoice %s' % self.billed_to.name
+
     def get_short_url(self):
-        try:
-            short_url = ShortUrl.objects.get(
-                original_url=self.get_public_url_with_hostname()
-            )
-        except ShortUrl.DoesNotExist:
-            short_url = ShortUrl(
-                name='Invoice %s' % self.billed_to.name,
-                original_url= self.get_public_url_with_hostname(),
-                ads=False,
-                public=False
-            )
-            short_url.save()
+        short_url = self._short_url or ShortUrl.objects.get_or_create_for_object(
+            self, ads=False, public=False)
         return short_url.get_absolute_url_with_hostname()
 
 
+@receiver(pre_delete)
+def before_delete_order_or_item(sender, **kwargs):
+    instance = kwargs.pop('instance', None)
+    if isinstance(instance, (SalesOrder, OrderItem)):
+        get_deleting().add(instance.pk)
+
+
+@receiver(post_delete)
+def after_delete_order_or_item(sender, **kwargs):
+    instance = kwargs.pop('instance', None)
+    # Polymorphic child and parent rows share the pk, the parent row
+    # is deleted last
+    if isinstance(instance, (SalesOrder, OrderItem)) and not sender._meta.parents:
+        get_deleting().discard(instance.pk)
+
+
 @receiver(post_save, sender=OrderFee)
 def after_save_order_fee(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    instance.order.save()
+    recalculate_order(instance.order, instance.get_total_delta())
 
 
 @receiver(post_delete, sender=OrderFee)
 def after_delete_order_fee(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    instance.order.get_real_instance().save()
+    if not is_deleting(instance.order_id):
+        recalculate_order(instance.order, -instance.total_fee)
 
 
 @receiver(post_save, sender=CommonOrderItem)
 def after_save_common_item(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    instance.order.save()
+    recalculate_order(instance.order, instance.get_total_delta())
 
 
 @receiver(post_delete, sender=CommonOrderItem)
 def after_delete_common_item(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    instance.order.save()
\ No newline at end of file
+    if not is_deleting(instance.order_id):
+        recalculate_order(instance.order, -instance.total_price)
\ No newline at end of file
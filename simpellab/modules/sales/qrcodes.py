@@ -0,0 +1,45 @@
+from django.db import models
+from django_qrcodes.models import QRCodeMixin
+
+from simpellab.modules.shorturls.models import ShortUrl, get_object_key
+from .workers import generate_qrcode_later
+
+
+class AsyncQRCodeMixin(QRCodeMixin):
+    """ QRCodeMixin rendering the image in background job,
+        after the saving transaction is committed """
+
+    class Meta:
+        abstract = True
+
+    # Fields read by get_short_url_name, selected with bulk rendered rows
+    short_url_related = []
+    # Short url set by generate_qrcodes, saves a lookup per object
+    _short_url = None
+
+    def save(self, *args, **kwargs):
+        # Start the MRO lookup after QRCodeMixin, its save renders the
+        # image in the request, before a new row has a pk for the file
+        # name. The job renders it after commit instead.
+        super(QRCodeMixin, self).save(*args, **kwargs)
+        if not self.qrcode:
+            generate_qrcode_later(self)
+
+
+def generate_qrcodes(model, ids, force=False):
+    """ Render QRCode image of ``model`` rows, short urls are
+        created in bulk first. Existing images kept unless ``force`` """
+    queryset = model._default_manager.filter(
+        pk__in=ids).select_related(*model.short_url_related)
+    if not force:
+        queryset = queryset.filter(models.Q(qrcode='') | models.Q(qrcode__isnull=True))
+    objs = list(queryset)
+    short_urls = ShortUrl.objects.get_or_create_for_objects(
+        objs, ads=False, public=False)
+    for obj in objs:
+        obj._short_url = short_urls[get_object_key(obj)[1]]
+        if force and obj.qrcode:
+            obj.qrcode.delete(save=False)
+        obj.generate_qrcode()
+        type(obj)._base_manager.filter(pk=obj.pk).update(qrcode=obj.qrcode.name)
+    return objs
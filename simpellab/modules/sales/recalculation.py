@@ -0,0 +1,150 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+
+__all__ = [
+    'defer_recalculation',
+    'recalculate_order',
+    'recalculate_item',
+    'get_deleting',
+    'is_deleting',
+]
+
+
+_local = threading.local()
+
+
+class RecalculationBatch:
+    """ Collect dirty order items and sales orders, and recompute
+        each of them exactly once when the batch is flushed """
+
+    def __init__(self):
+        self.items = OrderedDict()
+        self.orders = OrderedDict()
+        self.deltas = OrderedDict()
+
+    def _add(self, bucket, obj):
+        # Keep the most derived instance, polymorphic parent and
+        # child instances share the same primary key
+        current = bucket.get(obj.pk)
+        if current is None or isinstance(obj, current.__class__):
+            bucket[obj.pk] = obj
+
+    def add_item(self, item):
+        self._add(self.items, item)
+
+    def add_order(self, order):
+        self._add(self.orders, order)
+
+    def add_delta(self, order, delta):
+        current, total = self.deltas.get(order.pk, (order, 0))
+        self.deltas[order.pk] = (current, total + delta)
+
+    def discard(self, obj):
+        self.items.pop(obj.pk, None)
+        self.orders.pop(obj.pk, None)
+        self.deltas.pop(obj.pk, None)
+
+    def flush(self):
+        """ Save dirty items first, items saving mark their
+            orders dirty, then apply summed order deltas and
+            save each dirty order once """
+        while self.items or self.deltas or self.orders:
+            while self.items:
+                _, item = self.items.popitem(last=False)
+                item.save()
+            while self.deltas:
+                _, (order, delta) = self.deltas.popitem(last=False)
+                if delta:
+                    order.apply_total_delta(delta)
+            if self.orders:
+                _, order = self.orders.popitem(last=False)
+                order.get_real_instance().save()
+
+
+def get_current_batch():
+    return getattr(_local, 'batch', None)
+
+
+@contextmanager
+def defer_recalculation(using=None):
+    """
+    Coalesce order and order item total recomputation, use it
+    when saving many items, parameters or fees at once::
+
+        with defer_recalculation():
+            for item in items:
+                item.save()
+
+    Every dirty item and order is recomputed once on exit, inside
+    the same transaction. Nested blocks join the outermost batch.
+    """
+    batch = get_current_batch()
+    if batch is not None:
+        yield batch
+        return
+    batch = RecalculationBatch()
+    _local.batch = batch
+    try:
+        with transaction.atomic(using=using):
+            yield batch
+            batch.flush()
+    finally:
+        _local.batch = None
+
+
+def get_deleting():
+    """ Pk of sales orders and order items being deleted by this thread """
+    if getattr(_local, 'deleting', None) is None:
+        _local.deleting = set()
+    return _local.deleting
+
+
+def is_deleting(pk):
+    """
+    Rows deleted with their order or item don't recompute it, item
+    parameters are deleted before the item, order rows may be deleted
+    before the order or after it, the whole order is gone anyway.
+    """
+    return pk in get_deleting()
+
+
+def recalculate_item(item):
+    """ Recompute order item total now, or later if deferred """
+    batch = get_current_batch()
+    if batch is None:
+        item.save()
+    else:
+        batch.add_item(item)
+
+
+def recalculate_order(order, delta=None):
+    """
+    Recompute sales order total now, or later if deferred. When
+    order use incremental total, the signed ``delta`` is applied
+    with single UPDATE instead of resaving the order.
+    """
+    incremental = delta is not None and order.incremental_total
+    batch = get_current_batch()
+    if batch is None:
+        if not incremental:
+            order.get_real_instance().save()
+        elif delta:
+            order.apply_total_delta(delta)
+    elif incremental:
+        batch.add_delta(order, delta)
+    else:
+        batch.add_order(order)
+
+
+@receiver(post_delete)
+def discard_deleted_object(sender, instance, **kwargs):
+    """ Don't resave deleted object when batch flushed """
+    batch = get_current_batch()
+    if batch is not None and instance.pk is not None:
+        batch.discard(instance)
@@ -0,0 +1,58 @@
+import logging
+
+import django_rq
+from django.apps import apps
+from django.db import transaction
+from redis.exceptions import ConnectionError, TimeoutError
+
+logger = logging.getLogger('simpellab.qrcodes')
+
+queue = django_rq.get_queue('default')
+
+PENDING_STATUSES = ('queued', 'started', 'deferred', 'scheduled')
+
+
+def generate_qrcodes_task(model_label, ids, force=False):
+    from .qrcodes import generate_qrcodes
+    generate_qrcodes(apps.get_model(model_label), ids, force=force)
+
+
+def enqueue_qrcodes(model_label, ids, job_id=None, force=False):
+    """ Enqueue QRCode job, skipped if job with same id is pending """
+    if job_id is not None:
+        job = queue.fetch_job(job_id)
+        if job is not None and job.get_status() in PENDING_STATUSES:
+            return job
+    return queue.enqueue(
+        generate_qrcodes_task, model_label, ids, force=force, job_id=job_id)
+
+
+def try_enqueue_qrcodes(model_label, ids, job_id=None):
+    """
+    Enqueue QRCode job without failing the request when redis is down,
+    images left empty are rendered by manage.py regenerate_qrcodes.
+    """
+    try:
+        return enqueue_qrcodes(model_label, ids, job_id=job_id)
+    except (ConnectionError, TimeoutError) as err:
+        logger.warning('%s QRCode(s) of %s not enqueued: %s', len(ids), model_label, err)
+        return None
+
+
+def generate_qrcode_later(obj):
+    """ Generate object QRCode after commit, one pending job per object """
+    opts = obj._meta
+    job_id = 'qrcode-%s-%s-%s' % (opts.app_label, opts.model_name, obj.pk)
+    transaction.on_commit(
+        lambda: try_enqueue_qrcodes(opts.label, [obj.pk], job_id=job_id)
+    )
+
+
+def generate_qrcodes_later(model, ids):
+    """ Generate QRCode of many objects after commit """
+    ids = list(ids)
+    if not ids:
+        return
+    transaction.on_commit(
+        lambda: try_enqueue_qrcodes(model._meta.label, ids)
+    )
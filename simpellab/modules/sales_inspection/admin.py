@@ -5,7 +5,12 @@ from polymorphic.admin import PolymorphicChildModelAdmin
 from simpellab.core import hooks
 from simpellab.admin.admin import ModelAdmin
 from simpellab.modules.products.admin import ProductChildAdmin, ProductFeeInline
-from simpellab.modules.sales.admin import SalesOrderChildAdmin, OrderFeeInline, SalesOrderItemInline
+from simpellab.modules.sales.admin import (
+    SalesOrderChildAdmin,
+    OrderFeeInline,
+    SalesOrderItemInline,
+    OrderItemParameterFormSet
+    )
 from simpellab.modules.sales_inspection.models import *
 
 
@@ -15,6 +20,7 @@ class InspectionServiceAdmin(ProductChildAdmin):
 
 
 class InspectionOrderItemParameterInline(nested_admin.NestedTabularInline):
+    formset = OrderItemParameterFormSet
     extra = 0
     min_num = 1
     autocomplete_fields = ['parameter']
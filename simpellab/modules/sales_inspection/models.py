@@ -10,9 +10,16 @@ from django_numerators.models import NumeratorMixin
 from simpellab.core.enums import MaxLength
 from simpellab.core.models import SimpleBaseModel, BaseModel
 from simpellab.modules.carts.models import Cart
+from simpellab.modules.carts.stores import get_cart_store
 from simpellab.modules.products.models import Service, Parameter
 from simpellab.modules.blueprints.models import Blueprint
-from simpellab.modules.sales.models import SalesOrder, OrderItem, OrderItemParameter
+from simpellab.modules.sales.models import (
+    SalesOrder,
+    OrderItem,
+    OrderItemParameter,
+    ParameterOrderItemMixin
+    )
+from simpellab.modules.sales.recalculation import is_deleting, recalculate_order, recalculate_item
 
 _ = translation.ugettext_lazy
 
@@ -35,6 +42,9 @@ class InspectionService(Service):
         verbose_name_plural = _('Technical Inspections')
 
     def add_to_cart(self, request):
+        store = get_cart_store(request.user)
+        if store is not None:
+            return store.add(self)
         with transaction.atomic():
             matrix = {'user':request.user, 'product': self, 'quantity':1}
             cart = InspectionCart.objects.create(**matrix)
@@ -107,22 +117,10 @@ class InspectionBlueprint(Blueprint):
         related_name='blueprints'
         )
 
+    cart_model = InspectionCart
+
     def add_to_cart(self, request):
-        with transaction.atomic():
-            cart = InspectionCart.objects.create(
-                user=request.user,
-                product=self.product,
-                name=self.name,
-                note=self.note,
-                quantity=1
-            )
-            for bp_param in self.parameters.all():
-                InspectionCartParameter.objects.create(
-                    cart=cart,
-                    parameter=bp_param.parameter,
-                    note=bp_param.note
-                )
-            return cart
+        return self.apply(user=request.user)[0]
 
 class InspectionBlueprintParameter(SimpleBaseModel):
     class Meta:
@@ -163,7 +161,7 @@ class InspectionOrder(SalesOrder):
         return self.order_items
 
         
-class InspectionOrderItem(OrderItem):
+class InspectionOrderItem(ParameterOrderItemMixin, OrderItem):
     class Meta:
         verbose_name = _('Inspection Order Item')
         verbose_name_plural = _('Inspection Order Items')
@@ -179,17 +177,6 @@ class InspectionOrderItem(OrderItem):
         on_delete=models.PROTECT,
         related_name='orders')
 
-    def get_parameter_prices(self):
-        return self.parameters.aggregate(
-            total_parameters=models.Sum('price')
-        )['total_parameters'] or 0
-
-    def calculate_unit_price(self):
-        base_price = self.product.get_real_instance().total_price
-        parameters = self.get_parameter_prices()
-        unit_price = base_price + parameters
-        return unit_price
-
 
 class InspectionOrderItemParameter(OrderItemParameter):
     class Meta:
@@ -211,24 +198,24 @@ class InspectionOrderItemParameter(OrderItemParameter):
 @receiver(post_save, sender=InspectionOrderItem)
 def after_save_lit_item(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    instance.order.save()
+    recalculate_order(instance.order, instance.get_total_delta())
 
 
 @receiver(post_delete, sender=InspectionOrderItem)
 def after_delete_lit_item(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    instance.order.save()
+    if not is_deleting(instance.order_id):
+        recalculate_order(instance.order, -instance.total_price)
 
 
 @receiver(post_save, sender=InspectionOrderItemParameter)
 def after_save_lit_parameter(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    print(instance.order_item)
-    instance.order_item.save()
+    recalculate_item(instance.order_item)
 
 
 @receiver(post_delete, sender=InspectionOrderItemParameter)
 def after_delete_lit_parameter(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    print(instance.order_item)
-    instance.order_item.save()
\ No newline at end of file
+    if not is_deleting(instance.order_item_id):
+        recalculate_item(instance.order_item)
\ No newline at end of file
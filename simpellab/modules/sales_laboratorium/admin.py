@@ -8,7 +8,12 @@ from simpellab.core import hooks
 from simpellab.admin.admin import ModelAdmin
 from simpellab.modules.products.admin import ProductChildAdmin, ProductFeeInline
 from simpellab.modules.sales_laboratorium.models import *
-from simpellab.modules.sales.admin import SalesOrderChildAdmin, OrderFeeInline, SalesOrderItemInline
+from simpellab.modules.sales.admin import (
+    SalesOrderChildAdmin,
+    OrderFeeInline,
+    SalesOrderItemInline,
+    OrderItemParameterFormSet
+    )
 
 
 @admin.register(LaboratoriumService)
@@ -18,6 +23,7 @@ class LaboratoriumServiceAdmin(ProductChildAdmin):
 
 
 class LaboratoriumOrderItemParameterInline(nested_admin.NestedTabularInline):
+    formset = OrderItemParameterFormSet
     extra = 0
     min_num = 1
     model = LaboratoriumOrderItemParameter
@@ -9,9 +9,16 @@ from django_numerators.models import NumeratorMixin
 from simpellab.core.enums import MaxLength
 from simpellab.core.models import SimpleBaseModel, BaseModel
 from simpellab.modules.products.models import Service, Parameter
-from simpellab.modules.sales.models import SalesOrder, OrderItem, OrderItemParameter
+from simpellab.modules.sales.models import (
+    SalesOrder,
+    OrderItem,
+    OrderItemParameter,
+    ParameterOrderItemMixin
+    )
+from simpellab.modules.sales.recalculation import is_deleting, recalculate_order, recalculate_item
 from simpellab.modules.blueprints.models import Blueprint
 from simpellab.modules.carts.models import Cart
+from simpellab.modules.carts.stores import get_cart_store
 
 
 _ = translation.ugettext_lazy
@@ -38,6 +45,9 @@ class LaboratoriumService(Service):
         return 'LAB'
 
     def add_to_cart(self, request):
+        store = get_cart_store(request.user)
+        if store is not None:
+            return store.add(self)
         with transaction.atomic():
             matrix = {'user':request.user, 'product': self, 'quantity':1}
             cart = LaboratoriumCart.objects.create(**matrix)
@@ -116,22 +126,10 @@ class LaboratoriumBlueprint(Blueprint):
         related_name='blueprints'
         )
 
+    cart_model = LaboratoriumCart
+
     def add_to_cart(self, request):
-        with transaction.atomic():
-            cart = LaboratoriumCart.objects.create(
-                user=request.user,
-                product=self.product,
-                name=self.name,
-                note=self.note,
-                quantity=1
-            )
-            for bp_param in self.parameters.all():
-                LaboratoriumCartParameter.objects.create(
-                    cart=cart,
-                    parameter=bp_param.parameter,
-                    note=bp_param.note
-                )
-            return cart
+        return self.apply(user=request.user)[0]
 
 class LaboratoriumBlueprintParameter(SimpleBaseModel):
     class Meta:
@@ -172,7 +170,7 @@ class LaboratoriumOrder(SalesOrder):
         return self.order_items
 
 
-class LaboratoriumOrderItem(OrderItem):
+class LaboratoriumOrderItem(ParameterOrderItemMixin, OrderItem):
     class Meta:
         verbose_name = _('Laboratorium Order Item')
         verbose_name_plural = _('Laboratorium Order Items')
@@ -188,17 +186,6 @@ class LaboratoriumOrderItem(OrderItem):
         on_delete=models.CASCADE,
         related_name='orders')
     
-    def get_parameter_prices(self):
-        return self.parameters.aggregate(
-            total_parameters=models.Sum('price')
-        )['total_parameters'] or 0
-
-    def calculate_unit_price(self):
-        base_price = self.product.get_real_instance().total_price
-        parameters = self.get_parameter_prices()
-        unit_price = base_price + parameters
-        return unit_price
-
 
 class LaboratoriumOrderItemParameter(OrderItemParameter):
     class Meta:
@@ -220,24 +207,24 @@ class LaboratoriumOrderItemParameter(OrderItemParameter):
 @receiver(post_save, sender=LaboratoriumOrderItem)
 def after_save_lab_item(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    instance.order.save()
+    recalculate_order(instance.order, instance.get_total_delta())
 
 
 @receiver(post_delete, sender=LaboratoriumOrderItem)
 def after_delete_lab_item(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    instance.order.save()
+    if not is_deleting(instance.order_id):
+        recalculate_order(instance.order, -instance.total_price)
 
 
 @receiver(post_save, sender=LaboratoriumOrderItemParameter)
 def after_save_lab_item_parameter(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    print(instance.order_item)
-    instance.order_item.save()
+    recalculate_item(instance.order_item)
 
 
 @receiver(post_delete, sender=LaboratoriumOrderItemParameter)
 def after_delete_lab_item_parameter(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    print(instance.order_item)
-    instance.order_item.save()
\ No newline at end of file
+    if not is_deleting(instance.order_item_id):
+        recalculate_item(instance.order_item)
\ No newline at end of file
@@ -10,6 +10,7 @@ from simpellab.core.enums import MaxLength
 from simpellab.core.models import SimpleBaseModel, BaseModel
 from simpellab.modules.products.models import Service, Parameter
 from simpellab.modules.sales.models import SalesOrder, OrderItem
+from simpellab.modules.sales.recalculation import is_deleting, recalculate_order
 
 _ = translation.ugettext_lazy
 
@@ -63,10 +64,11 @@ class MiscOrderItem(OrderItem):
 @receiver(post_save, sender=MiscOrderItem)
 def after_save_order_product(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    instance.order.save()
+    recalculate_order(instance.order, instance.get_total_delta())
 
 
 @receiver(post_delete, sender=MiscOrderItem)
 def after_delete_order_product(sender, **kwargs):
     instance = kwargs.pop('instance', None)
-    instance.order.save()
\ No newline at end of file
+    if not is_deleting(instance.order_id):
+        recalculate_order(instance.order, -instance.total_price)
\ No newline at end of file
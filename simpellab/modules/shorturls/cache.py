@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+__all__ = ['ShortUrlTarget', 'resolve_short_url', 'invalidate_short_url']
+
+
+CACHE_TIMEOUT = getattr(settings, 'SHORTURL_CACHE_TIMEOUT', 60 * 60 * 24)
+LOCAL_CACHE_SIZE = getattr(settings, 'SHORTURL_LOCAL_CACHE_SIZE', 1024)
+LOCAL_CACHE_TTL = getattr(settings, 'SHORTURL_LOCAL_CACHE_TTL', 60)
+LOCAL_CACHE_CHECK_INTERVAL = getattr(settings, 'SHORTURL_LOCAL_CACHE_CHECK_INTERVAL', 1)
+
+
+ShortUrlTarget = namedtuple(
+    'ShortUrlTarget', ['pk', 'original_url', 'ads', 'public'])
+
+
+class LRUCache:
+    """ Thread safe in process LRU cache with per entry TTL """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + self.ttl)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class VersionedLRUCache(LRUCache):
+    """
+    LRUCache cleared when the version in Django cache changes, bumped
+    by every process changing an entry. The version is read at most
+    once per ``check_interval``, other processes serve a changed entry
+    for that long at most.
+    """
+
+    def __init__(self, maxsize, ttl, version_key, check_interval):
+        super().__init__(maxsize, ttl)
+        self.version_key = version_key
+        self.check_interval = check_interval
+        self.version = None
+        self.checked = float('-inf')
+
+    def check_version(self):
+        now = time.monotonic()
+        if now - self.checked < self.check_interval:
+            return
+        self.checked = now
+        version = cache.get(self.version_key)
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def bump_version(self):
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            # Missing or evicted, seed a value not used before
+            cache.set(self.version_key, int(time.time() * 1000), None)
+
+
+local_cache = VersionedLRUCache(
+    LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL, 'shorturl:version', LOCAL_CACHE_CHECK_INTERVAL)
+
+
+def get_cache_key(hashed_url):
+    return 'shorturl:%s' % hashed_url
+
+
+def resolve_short_url(hashed_url):
+    """
+    Get ShortUrlTarget of ``hashed_url`` or None, look in process
+    LRU first, then Django cache, then database.
+    """
+    local_cache.check_version()
+    target = local_cache.get(hashed_url)
+    if target is not None:
+        return target
+    key = get_cache_key(hashed_url)
+    value = cache.get(key)
+    if value is None:
+        from .models import ShortUrl
+        value = ShortUrl.objects.filter(hashed_url=hashed_url).values_list(
+            'pk', 'original_url', 'ads', 'public').first()
+        if value is None:
+            return None
+        cache.set(key, value, CACHE_TIMEOUT)
+    target = ShortUrlTarget(*value)
+    local_cache.set(hashed_url, target)
+    return target
+
+
+def invalidate_short_url(hashed_url):
+    """ Drop cached target here, other processes see the version bump """
+    local_cache.delete(hashed_url)
+    cache.delete(get_cache_key(hashed_url))
+    local_cache.bump_version()
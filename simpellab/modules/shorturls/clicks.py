@@ -0,0 +1,133 @@
+import atexit
+import logging
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from redis.exceptions import ConnectionError, TimeoutError
+
+
+__all__ = ['click_buffer', 'flush_clicks']
+
+
+FLUSH_THRESHOLD = getattr(settings, 'SHORTURL_CLICK_FLUSH_THRESHOLD', 100)
+FLUSH_INTERVAL = getattr(settings, 'SHORTURL_CLICK_FLUSH_INTERVAL', 60)
+
+logger = logging.getLogger('simpellab.shorturls')
+
+
+def flush_clicks(counts):
+    """ Add buffered ``{pk: clicks}`` to ShortUrl.clicked, one
+        UPDATE for every distinct click count """
+    from django.db.models import F
+    from .models import ShortUrl
+    groups = {}
+    for pk, clicks in counts.items():
+        groups.setdefault(clicks, []).append(pk)
+    for clicks, pks in groups.items():
+        ShortUrl.objects.filter(pk__in=pks).update(
+            clicked=F('clicked') + clicks)
+
+
+class ClickBuffer:
+    """ Count short url clicks in process memory and hand them
+        to background job when threshold or interval reached. A
+        daemon timer flushes an idle buffer after the interval, a
+        killed process loses at most one interval of clicks. """
+
+    def __init__(self, threshold=FLUSH_THRESHOLD, interval=FLUSH_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.total = 0
+        self.last_flush = time.monotonic()
+        self.timer = None
+
+    def add(self, pk, clicks=1):
+        with self.lock:
+            self.counts[pk] += clicks
+            self.total += clicks
+            due = (
+                self.total >= self.threshold
+                or time.monotonic() - self.last_flush >= self.interval
+            )
+            if due:
+                counts = self.pop()
+            else:
+                counts = None
+                self.schedule()
+        if counts:
+            self.dispatch(counts)
+
+    def schedule(self):
+        """ Start flush timer if not running, call with lock held """
+        if self.timer is not None and self.timer.is_alive():
+            return
+        if not math.isfinite(self.interval):
+            return
+        self.timer = threading.Timer(self.interval, self.flush_later)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def pop(self):
+        counts, self.counts = self.counts, Counter()
+        self.total = 0
+        self.last_flush = time.monotonic()
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        return counts
+
+    def flush_later(self):
+        """ Timer callback, dispatch clicks of an idle buffer """
+        with self.lock:
+            counts = self.pop()
+        try:
+            if counts:
+                self.dispatch(counts)
+        finally:
+            # Timer thread owns its database connection
+            connections.close_all()
+
+    def dispatch(self, counts):
+        """ Enqueue counts, write them in the request when redis is
+            down and keep them for next flush if that fails too """
+        from .workers import flush_clicks_later
+        try:
+            flush_clicks_later(dict(counts))
+        except (ConnectionError, TimeoutError) as err:
+            logger.warning('Clicks written without background job: %s', err)
+            try:
+                flush_clicks(counts)
+            except DatabaseError:
+                logger.exception('Clicks kept in buffer')
+                self.restore(counts)
+
+    def restore(self, counts):
+        with self.lock:
+            self.counts.update(counts)
+            self.total += sum(counts.values())
+            self.schedule()
+
+    def flush(self):
+        """ Write pending clicks now """
+        with self.lock:
+            counts = self.pop()
+        if counts:
+            flush_clicks(counts)
+
+
+click_buffer = ClickBuffer()
+
+
+@atexit.register
+def flush_on_exit():
+    try:
+        click_buffer.flush()
+    except Exception:
+        # Database may be gone when interpreter exit
+        pass
@@ -0,0 +1,123 @@
+import hashlib
+import hmac
+import string
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+
+__all__ = ['base62', 'scramble', 'allocate_codes', 'allocate_code']
+
+
+ALPHABET = string.digits + string.ascii_letters
+
+BLOCK_SIZE = getattr(settings, 'SHORTURL_CODE_BLOCK_SIZE', 100)
+
+CODE_LENGTH = getattr(settings, 'SHORTURL_CODE_LENGTH', 6)
+
+CODE_KEY = getattr(settings, 'SHORTURL_CODE_KEY', settings.SECRET_KEY)
+
+FEISTEL_ROUNDS = 4
+
+
+def base62(value, length=1):
+    """ Encode positive integer with [0-9a-zA-Z], left padded to length """
+    chars = []
+    while value:
+        value, rem = divmod(value, 62)
+        chars.append(ALPHABET[rem])
+    return ''.join(reversed(chars)).rjust(length, ALPHABET[0])
+
+
+def _feistel(value, half_bits, key):
+    """ Keyed permutation of [0, 2 ** (2 * half_bits)) """
+    mask = (1 << half_bits) - 1
+    left, right = value >> half_bits, value & mask
+    for i in range(FEISTEL_ROUNDS):
+        digest = hmac.new(key, b'%d:%d' % (i, right), hashlib.sha256).digest()
+        left, right = right, left ^ (int.from_bytes(digest[:8], 'big') & mask)
+    return (left << half_bits) | right
+
+
+def scramble(value, length=CODE_LENGTH, key=CODE_KEY):
+    """
+    Map sequence value to a non sequential value of the same
+    ``62 ** length`` block. The mapping is a bijection, distinct sequence
+    values never give the same code, but consecutive ones look unrelated
+    without the key. Feistel output outside the block is walked again.
+    """
+    size = 62 ** length
+    block, value = divmod(value, size)
+    half_bits = ((size - 1).bit_length() + 1) // 2
+    key = key.encode() if isinstance(key, str) else key
+    value = _feistel(value, half_bits, key)
+    while value >= size:
+        value = _feistel(value, half_bits, key)
+    return block * size + value
+
+
+class CodeBlock:
+    """ Range of sequence values reserved by one thread """
+
+    def __init__(self, start, end):
+        self.next = start
+        self.end = end
+
+    @property
+    def is_exhausted(self):
+        return self.next >= self.end
+
+
+class CodeAllocator:
+    """
+    Hand out base62 short codes from a database sequence, values
+    are reserved in blocks so most codes are allocated in memory and
+    scrambled so codes can't be guessed from one another.
+
+    Inside a transaction only the needed values are reserved, a block
+    kept for later would be handed out again by another worker if the
+    transaction is rolled back.
+    """
+
+    def __init__(self, name='shorturl', block_size=BLOCK_SIZE):
+        self.name = name
+        self.block_size = block_size
+        self.local = threading.local()
+
+    def reserve(self, size):
+        from .models import ShortUrlSequence
+        with transaction.atomic():
+            sequence, created = ShortUrlSequence.objects.select_for_update(
+                ).get_or_create(name=self.name)
+            start = sequence.value
+            sequence.value = start + size
+            sequence.save(update_fields=['value'])
+        return CodeBlock(start, start + size)
+
+    def allocate(self, count=1):
+        """ Get ``count`` unused codes """
+        codes = []
+        while len(codes) < count:
+            block = getattr(self.local, 'block', None)
+            if block is None or block.is_exhausted:
+                size = count - len(codes)
+                if not transaction.get_connection().in_atomic_block:
+                    size = max(self.block_size, size)
+                block = self.reserve(size)
+                self.local.block = block
+            while len(codes) < count and not block.is_exhausted:
+                codes.append(base62(scramble(block.next), CODE_LENGTH))
+                block.next += 1
+        return codes
+
+
+allocator = CodeAllocator()
+
+
+def allocate_codes(count):
+    return allocator.allocate(count)
+
+
+def allocate_code():
+    return allocator.allocate(1)[0]
@@ -0,0 +1,60 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.shortcuts import get_object_or_404, redirect
+from django.test import RequestFactory
+
+from simpellab.modules.shorturls.cache import local_cache, invalidate_short_url
+from simpellab.modules.shorturls.clicks import click_buffer
+from simpellab.modules.shorturls.models import ShortUrl
+from simpellab.modules.shorturls.views import shortener_view
+
+
+def database_redirect(request, hashed_url):
+    """ Redirect resolved with database query on every hit """
+    url = get_object_or_404(ShortUrl, hashed_url=hashed_url)
+    return redirect(url.original_url)
+
+
+class Command(BaseCommand):
+    help = 'Measure short url redirects per second, with and without cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--code', help='hashed_url to resolve, default to first public short url.')
+
+    def run(self, view, hashed_url, total):
+        request = RequestFactory().get('/go/%s/' % hashed_url)
+        request.user = AnonymousUser()
+        start = time.perf_counter()
+        for i in range(total):
+            view(request, hashed_url)
+        return total / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        hashed_url = options['code']
+        if hashed_url is None:
+            hashed_url = ShortUrl.objects.filter(
+                ads=False, public=True
+            ).values_list('hashed_url', flat=True).first()
+        if hashed_url is None:
+            raise CommandError('No public short url to benchmark.')
+
+        total = options['requests']
+        # Keep benchmark clicks in buffer, they are dropped at the end
+        limits = click_buffer.threshold, click_buffer.interval
+        click_buffer.flush()
+        click_buffer.threshold = click_buffer.interval = float('inf')
+        try:
+            before = self.run(database_redirect, hashed_url, total)
+            invalidate_short_url(hashed_url)
+            after = self.run(shortener_view, hashed_url, total)
+        finally:
+            click_buffer.pop()
+            click_buffer.threshold, click_buffer.interval = limits
+            local_cache.clear()
+
+        self.stdout.write('database : %.0f redirects/s' % before)
+        self.stdout.write('cached   : %.0f redirects/s' % after)
+        self.stdout.write(self.style.SUCCESS('speedup  : %.1fx' % (after / before)))
@@ -0,0 +1,41 @@
+# Generated by Django 3.0.8 on 2026-10-18 06:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('simpellab_shorturls', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShortUrlSequence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True, verbose_name='Name')),
+                ('value', models.BigIntegerField(default=1, verbose_name='Next value')),
+            ],
+            options={
+                'verbose_name': 'Short Url Sequence',
+                'verbose_name_plural': 'Short Url Sequences',
+            },
+        ),
+        migrations.AddField(
+            model_name='shorturl',
+            name='content_type',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType', verbose_name='Content type'),
+        ),
+        migrations.AddField(
+            model_name='shorturl',
+            name='object_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, verbose_name='Object id'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='shorturl',
+            unique_together={('content_type', 'object_id')},
+        ),
+    ]
@@ -1,19 +1,134 @@
-from hashlib import md5
-from django.db import models
+from collections import OrderedDict
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 from django.shortcuts import reverse
 from simpellab.core.models import BaseModel
 from simpellab.core.enums import MaxLength
 from django.conf import settings
+from .cache import invalidate_short_url
+from .codes import allocate_codes, allocate_code
+from .clicks import click_buffer
 
 
 BASE_URL = getattr(settings, 'BASE_URL', 'http://localhost:8000')
 
 
+def get_object_key(obj):
+    """
+    Content type and pk of topmost concrete parent, polymorphic
+    child and parent instances share the same short url. Parent pk
+    is read directly since child pointer is unset before first save.
+    """
+    parents = obj._meta.get_parent_list()
+    model = parents[-1] if parents else obj._meta.concrete_model
+    content_type = ContentType.objects.get_for_model(model)
+    return content_type, getattr(obj, model._meta.pk.attname)
+
+
+class ShortUrlManager(models.Manager):
+
+    def get_or_create_for_objects(self, objs, **defaults):
+        """
+        Get short url of each object, resolved with (content type,
+        object id) index. Objects should implement
+        ``get_public_url_with_hostname()`` and ``get_short_url_name()``.
+        Missing short urls are created with single bulk_create, if a
+        concurrent call created some of them first they are read back.
+        Return dict of object id and ShortUrl instance.
+        """
+        keys = OrderedDict()
+        for obj in objs:
+            content_type, object_id = get_object_key(obj)
+            keys[object_id] = (content_type, obj)
+        short_urls = {
+            short_url.object_id: short_url
+            for short_url in self.filter(
+                content_type__in=set(ct for ct, obj in keys.values()),
+                object_id__in=list(keys))
+            if keys[short_url.object_id][0].pk == short_url.content_type_id
+        }
+        missing = [key for key in keys if key not in short_urls]
+        if not missing:
+            return short_urls
+
+        # Short urls created before the reverse index
+        urls = OrderedDict(
+            (keys[key][1].get_public_url_with_hostname(), key)
+            for key in missing
+        )
+        legacy = self.filter(original_url__in=list(urls), content_type__isnull=True)
+        for short_url in legacy:
+            key = urls.pop(short_url.original_url)
+            short_url.content_type, short_url.object_id = keys[key][0], key
+            self.filter(pk=short_url.pk).update(
+                content_type=short_url.content_type,
+                object_id=short_url.object_id)
+            short_urls[key] = short_url
+
+        created = [
+            self.model(
+                name=keys[key][1].get_short_url_name(),
+                original_url=url,
+                hashed_url=code,
+                content_type=keys[key][0],
+                object_id=key,
+                **defaults
+            ) for (url, key), code in zip(urls.items(), allocate_codes(len(urls)))
+        ]
+        try:
+            with transaction.atomic():
+                self.bulk_create(created)
+        except IntegrityError:
+            created = [self._create_or_get(short_url) for short_url in created]
+        short_urls.update({short_url.object_id: short_url for short_url in created})
+        return short_urls
+
+    def _create_or_get(self, short_url):
+        """ Save short url or get the row another request saved first """
+        try:
+            with transaction.atomic():
+                short_url.save(force_insert=True)
+            return short_url
+        except IntegrityError:
+            return self.get(
+                content_type=short_url.content_type,
+                object_id=short_url.object_id)
+
+    def get_or_create_for_object(self, obj, **defaults):
+        content_type, object_id = get_object_key(obj)
+        return self.get_or_create_for_objects([obj], **defaults)[object_id]
+
+
+class ShortUrlSequence(models.Model):
+    """ Sequence of short url code, reserved in blocks """
+
+    class Meta:
+        verbose_name = _('Short Url Sequence')
+        verbose_name_plural = _('Short Url Sequences')
+
+    name = models.CharField(
+        max_length=MaxLength.SHORT.value,
+        unique=True,
+        verbose_name=_('Name'))
+    value = models.BigIntegerField(
+        default=1,
+        verbose_name=_('Next value'))
+
+    def __str__(self):
+        return self.name
+
+
 class ShortUrl(BaseModel):
     class Meta:
         verbose_name = _('Short Url')
         verbose_name_plural = _('Short Urls')
+        unique_together = ('content_type', 'object_id')
+
+    objects = ShortUrlManager()
 
     name = models.CharField(
         max_length=MaxLength.MEDIUM.value,
@@ -33,6 +148,17 @@ class ShortUrl(BaseModel):
         unique=True,
         verbose_name='Original Url'
     )
+    content_type = models.ForeignKey(
+        ContentType,
+        null=True, blank=True, editable=False,
+        on_delete=models.CASCADE,
+        verbose_name=_('Content type')
+        )
+    object_id = models.UUIDField(
+        null=True, blank=True, editable=False,
+        verbose_name=_('Object id')
+        )
+    content_object = GenericForeignKey('content_type', 'object_id')
     ads = models.BooleanField(default=False)
     public = models.BooleanField(default=True)
     clicked = models.PositiveIntegerField(default=0)
@@ -51,11 +177,18 @@ class ShortUrl(BaseModel):
         return ''.join([BASE_URL, self.get_absolute_url()])
 
     def click(self):
-        self.clicked += 1
-        self.save()
+        """ Count click, written to database later in batch """
+        click_buffer.add(self.pk)
 
     def save(self, *args, **kwargs):
-        if self._state.adding:
-            self.hashed_url = md5(self.original_url.encode()).hexdigest()[:10]
+        if self._state.adding and not self.hashed_url:
+            self.hashed_url = allocate_code()
+
+        return super().save(*args, **kwargs)
+
 
-        return super().save(*args, **kwargs)
\ No newline at end of file
+@receiver(post_save, sender=ShortUrl)
+@receiver(post_delete, sender=ShortUrl)
+def after_change_short_url(sender, **kwargs):
+    instance = kwargs.pop('instance', None)
+    invalidate_short_url(instance.hashed_url)
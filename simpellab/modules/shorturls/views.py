@@ -7,24 +7,26 @@ from django.shortcuts import (
     )
 from django.conf import settings
 from .models import ShortUrl
+from .cache import resolve_short_url
+from .clicks import click_buffer
+
 
 def ads_view(request, url_obj):
     return render(request, 'shorturls/ads_view.html', context={'instance':url_obj})
 
 
-def nonads_view(request, url_obj):
-    url_obj.click()
-    return redirect(url_obj.original_url)
-
-
 def shortener_view(request, hashed_url):
-    url = get_object_or_404(ShortUrl, hashed_url=hashed_url)
+    target = resolve_short_url(hashed_url)
+    if target is None:
+        raise Http404
 
-    if url.ads:
+    if target.ads:
+        url = get_object_or_404(ShortUrl, pk=target.pk)
         return ads_view(request, url)
 
-    if not url.public and not request.user.is_authenticated:
-        return redirect(settings.LOGIN_URL + '?next=%s' % url.get_absolute_url())
+    if not target.public and not request.user.is_authenticated:
+        next_url = reverse('goto_shorturl', args=(hashed_url,))
+        return redirect(settings.LOGIN_URL + '?next=%s' % next_url)
 
-    return nonads_view(request, url)
-    
+    click_buffer.add(target.pk)
+    return redirect(target.original_url)
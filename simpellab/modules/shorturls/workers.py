@@ -0,0 +1,13 @@
+import django_rq
+
+queue = django_rq.get_queue('default')
+
+
+def flush_clicks_task(counts):
+    from .clicks import flush_clicks
+    flush_clicks(counts)
+
+
+def flush_clicks_later(counts):
+    """ Write buffered click counts in background job """
+    queue.enqueue(flush_clicks_task, counts)
@@ -109,6 +109,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if DEBUG:
+    # Count hook lookups of the whole request, see X-Hook-Lookups header
+    MIDDLEWARE = ['simpellab.core.middleware.HookLookupMiddleware'] + MIDDLEWARE
+
 ROOT_URLCONF = 'simpellab.urls'
 
 TEMPLATES = [
@@ -139,6 +143,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Test threads connect to the file test database, writers wait
+        # for each other where in memory database raise table locked.
+        'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
     }
 }
 
@@ -280,6 +287,10 @@ CACHES = {
     },
 }
 
+# Rendered admin menu is cached per permission set and language (seconds),
+# permission and group changes expire it immediately
+MENU_CACHE_TIMEOUT = 60 * 60
+
 # =============================================================================
 # Redis Queues
 # =============================================================================
@@ -304,6 +315,64 @@ RQ_QUEUES = {
     }
 }
 
+# Fee price change reprice products in the request when no more than
+# PRICE_PROPAGATION_SYNC_LIMIT products carry it, otherwise in rq worker.
+PRICE_PROPAGATION_SYNC_LIMIT = 500
+
+# Cart lines are kept as Cart rows ('database') or in a redis hash per
+# user ('redis') using CART_REDIS_CACHE connection until checkout,
+# untouched redis carts expire after CART_TIMEOUT seconds.
+CART_STORE = 'database'
+CART_REDIS_CACHE = 'default'
+CART_TIMEOUT = 60 * 60 * 24 * 30
+
+
+# =============================================================================
+# Search Settings
+# =============================================================================
+
+# Number of best matches returned from SQLite FTS5 search index to admin
+# autocomplete, rebuild the index with manage.py rebuild_search_index
+SEARCH_RESULTS_LIMIT = 500
+
+
+# =============================================================================
+# Sales Settings
+# =============================================================================
+
+# Maintain sales order totals with signed deltas instead of re-aggregating
+# order items and fees, check drift with manage.py verify_order_totals
+SALES_INCREMENTAL_TOTALS = False
+
+
+# =============================================================================
+# Short URL Settings
+# =============================================================================
+
+# Clicks are counted in memory and written in batch when one of these
+# limits is reached (number of clicks, seconds since last write), an idle
+# process flushes by timer after the interval
+SHORTURL_CLICK_FLUSH_THRESHOLD = 100
+SHORTURL_CLICK_FLUSH_INTERVAL = 60
+
+# Redirect targets are cached in Django cache (seconds) and in a per
+# process LRU (entries, seconds). The LRU checks a shared version every
+# check interval (seconds), other processes serve a changed target for
+# that long at most.
+SHORTURL_CACHE_TIMEOUT = 60 * 60 * 24
+SHORTURL_LOCAL_CACHE_SIZE = 1024
+SHORTURL_LOCAL_CACHE_TTL = 60
+SHORTURL_LOCAL_CACHE_CHECK_INTERVAL = 1
+
+# Short url codes are base62 sequence values, each worker reserves
+# this many values at once
+SHORTURL_CODE_BLOCK_SIZE = 100
+
+# Sequence values are scrambled with this key into codes of this length,
+# changing either may give codes already in use
+SHORTURL_CODE_LENGTH = 6
+# SHORTURL_CODE_KEY = SECRET_KEY
+
 
 # =============================================================================
 # Django WKHTMLTOPDF and PYDF
@@ -314,6 +383,22 @@ WKHTMLTOPDF_PATH = os.path.join(PYPDF_PATH, 'bin','wkhtmltopdf')
 
 WKHTMLTOPDF_CMD = os.getenv('WKHTMLTOPDF_CMD', '')
 
+# Rendered PDF are cached on disk by hash of their html, least recently
+# used files are removed when total size exceed PDF_CACHE_MAX_SIZE bytes
+PDF_CACHE_ROOT = os.path.join(BASE_DIR, 'pdfcache')
+PDF_CACHE_MAX_SIZE = 512 * 1024 * 1024
+
+# No more than PDF_MAX_PROCESSES wkhtmltopdf run at once on each host,
+# print waits PDF_PROCESS_TIMEOUT seconds for a free slot. Async print
+# render PDF with worker of PDF_RENDER_QUEUE, PDF_CACHE_ROOT should be
+# shared by web and worker hosts.
+PDF_MAX_PROCESSES = 2
+PDF_PROCESS_TIMEOUT = 30
+PDF_RENDER_QUEUE = 'default'
+
+# Printing more selected objects than this always render in background
+PDF_SYNC_MAX_DOCUMENTS = 5
+
 # Optional 
 # WKHTMLTOPDF_CMD_OPTIONS = {
 #     'quiet': False,
@@ -0,0 +1,70 @@
+from django.db import connections, models, router
+
+
+def _insert_returning(table_model, objs, fields, using, size):
+    """
+    Insert root rows of auto primary key model and set returned keys,
+    one INSERT per batch when database return rows from bulk insert
+    (PostgreSQL), otherwise one INSERT per object.
+    """
+    opts = table_model._meta
+    returning_fields = opts.db_returning_fields
+    manager = table_model._base_manager
+    if connections[using].features.can_return_rows_from_bulk_insert:
+        batches = [objs[i:i + size] for i in range(0, len(objs), size)]
+    else:
+        batches = [[obj] for obj in objs]
+    for batch in batches:
+        rows = manager._insert(
+            batch, fields=fields, returning_fields=returning_fields, using=using)
+        if len(batch) == 1 and rows and not isinstance(rows[0], (list, tuple)):
+            rows = [rows]
+        for obj, row in zip(batch, rows):
+            for field, value in zip(returning_fields, row):
+                setattr(obj, field.attname, value)
+
+
+def bulk_create_inherited(objs, batch_size=None):
+    """
+    ``bulk_create`` for multi-table inherited models (polymorphic order
+    items, carts) which Django refuse to bulk insert. Rows are inserted
+    table by table from the root parent, one INSERT per table and batch.
+    Root primary keys are either set before insert, like UUID default of
+    SimpleBaseModel, or returned by the database for auto primary key.
+
+    Like ``bulk_create``, ``save()`` is not called and no signal is sent.
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+    model = objs[0].__class__
+    opts = model._meta
+    using = router.db_for_write(model)
+    connection = connections[using]
+    tables = list(reversed(opts.get_parent_list())) + [model]
+    auto_pk = objs[0]._get_pk_val(tables[0]._meta) is None
+    for obj in objs:
+        if hasattr(obj, 'pre_save_polymorphic'):
+            obj.pre_save_polymorphic(using=using)
+    for table_model in tables:
+        fields = table_model._meta.local_concrete_fields
+        size = batch_size or connection.ops.bulk_batch_size(fields, objs) or len(objs)
+        if table_model is tables[0] and auto_pk:
+            fields = [
+                field for field in fields
+                if not isinstance(field, models.AutoField)
+            ]
+            _insert_returning(table_model, objs, fields, using, size)
+            continue
+        # Child tables refer to root primary key with their parent links
+        for obj in objs:
+            for parent, field in table_model._meta.parents.items():
+                if field:
+                    setattr(obj, field.attname, obj._get_pk_val(parent._meta))
+        for i in range(0, len(objs), size):
+            table_model._base_manager._insert(
+                objs[i:i + size], fields=fields, using=using)
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = using
+    return objs
@@ -0,0 +1,34 @@
+from collections import OrderedDict
+from django.db import transaction
+from django_numerators.models import Numerator
+
+
+def allocate_reg_numbers(objs):
+    """
+    Reserve a block of numerator counter for unsaved NumeratorMixin
+    instances and set their ``reg_number`` and ``inner_id``, use it
+    before ``bulk_create`` which skip ``NumeratorMixin.save``.
+
+    Counter row is locked and updated once per numerator instead of
+    once per instance. Numerator is not kept on instances, their later
+    ``save`` would write back a stale counter.
+    """
+    groups = OrderedDict()
+    for obj in objs:
+        key = (obj.get_doc_prefix(), obj.format_date())
+        groups.setdefault(key, []).append(obj)
+
+    with transaction.atomic():
+        for group in groups.values():
+            numerator = group[0].get_numerator()
+            numerator = Numerator.objects.select_for_update().get(pk=numerator.pk)
+            counter = numerator.counter
+            for obj in group:
+                if obj.reg_number is None:
+                    counter += 1
+                    obj.reg_number = counter
+                counter = max(counter, obj.reg_number)
+                obj.format_inner_id()
+            numerator.counter = counter
+            numerator.save(update_fields=['counter'])
+    return objs
@@ -1,5 +1,8 @@
 # https://djangosnippets.org/snippets/690/
+import operator
 import re
+
+from django.db import models
 from django.template.defaultfilters import slugify
 
 
@@ -12,31 +15,82 @@ def unique_slugify(instance, value, slug_field_name='slug', queryset=None,
     store the slug in (and the field to check against for uniqueness).
 
     ``queryset`` usually doesn't need to be explicitly provided - it'll default
-    to using the ``.all()`` queryset from the model's default manager.
+    to using the ``.all()`` queryset from the default manager of the model
+    which define the slug field.
     """
-    slug_field = instance._meta.get_field(slug_field_name)
+    bulk_unique_slugify(
+        [instance], lambda obj: value, slug_field_name=slug_field_name,
+        queryset=queryset, slug_separator=slug_separator)
 
-    slug = getattr(instance, slug_field.attname)
-    slug_len = slug_field.max_length
 
-    # Sort out the initial slug, limiting its length if necessary.
-    slug = slugify(value)
-    if slug_len:
-        slug = slug[:slug_len]
-    slug = _slug_strip(slug, slug_separator)
-    original_slug = slug
+def bulk_unique_slugify(instances, value='name', slug_field_name='slug',
+                        queryset=None, slug_separator='-', chunk_size=100):
+    """
+    Calculates and stores unique slugs for many instances of one model,
+    use it before ``bulk_create``. ``value`` is the source field name or
+    a callable taking the instance.
+
+    Existing slugs sharing a prefix with the new slugs are fetched in one
+    query per ``chunk_size`` prefixes, suffixes (``-2``, ``-3``, ...)
+    are then picked in memory.
+    """
+    instances = list(instances)
+    if not instances:
+        return instances
+    if not callable(value):
+        value = operator.attrgetter(value)
+    slug_field = instances[0]._meta.get_field(slug_field_name)
+    slug_len = slug_field.max_length
 
-    # Create the queryset if one wasn't explicitly provided and exclude the
-    # current instance from the queryset.
     if queryset is None:
-        queryset = instance.__class__._default_manager.all()
-    if instance.pk:
-        queryset = queryset.exclude(pk=instance.pk)
+        queryset = slug_field.model._default_manager.all()
+    pks = [obj.pk for obj in instances if obj.pk and not obj._state.adding]
+    if pks:
+        queryset = queryset.exclude(pk__in=pks)
 
-    # Find a unique slug. If one matches, at '-2' to the end and try again
-    # (then '-3', etc).
+    # Sort out the initial slugs, limiting their length if necessary.
+    slugs = []
+    for obj in instances:
+        slug = slugify(value(obj))
+        if slug_len:
+            slug = slug[:slug_len]
+        slugs.append(_slug_strip(slug, slug_separator))
+
+    taken = _get_taken_slugs(
+        queryset, slug_field_name, slugs, slug_len, slug_separator, chunk_size)
+    for obj, original_slug in zip(instances, slugs):
+        slug = _next_free_slug(original_slug, taken, slug_len, slug_separator)
+        taken.add(slug)
+        setattr(obj, slug_field.attname, slug)
+    return instances
+
+
+def _get_taken_slugs(queryset, slug_field_name, slugs, slug_len,
+                     slug_separator, chunk_size):
+    """ Existing slugs which may collide with suffixed ``slugs`` """
+    prefixes = set()
+    for slug in slugs:
+        # Suffixed slugs are truncated to fit slug_len, leave room for
+        # the longest suffix we expect.
+        if slug_len:
+            slug = _slug_strip(slug[:max(slug_len - 10, 1)], slug_separator)
+        prefixes.add(slug or slug_separator)
+    prefixes = sorted(prefixes)
+    taken = set()
+    for i in range(0, len(prefixes), chunk_size):
+        condition = models.Q()
+        for prefix in prefixes[i:i + chunk_size]:
+            condition |= models.Q(**{'%s__startswith' % slug_field_name: prefix})
+        taken.update(
+            queryset.filter(condition).values_list(slug_field_name, flat=True))
+    return taken
+
+
+def _next_free_slug(original_slug, taken, slug_len, slug_separator):
+    """ Add '-2' to the end of slug, then '-3', etc until it is free """
+    slug = original_slug
     next = 2
-    while not slug or queryset.filter(**{slug_field_name: slug}):
+    while not slug or slug in taken:
         slug = original_slug
         end = '%s%s' % (slug_separator, next)
         if slug_len and len(slug) + len(end) > slug_len:
@@ -44,8 +98,7 @@ def unique_slugify(instance, value, slug_field_name='slug', queryset=None,
             slug = _slug_strip(slug, slug_separator)
         slug = '%s%s' % (slug, end)
         next += 1
-
-    setattr(instance, slug_field.attname, slug)
+    return slug
 
 
 def _slug_strip(value, separator='-'):
@@ -1 +1,1504 @@
-from django.test import TestCase
\ No newline at end of file
+import io
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from django_numerators.models import Numerator
+from PyPDF2 import PdfFileReader, PdfFileWriter
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from simpellab.admin import workers as pdf_workers
+from simpellab.admin.pdf import PDFCache, PDFRenderBusy, pdf_cache, process_slot
+from simpellab.admin.admin import PolymorphicParentAdminMixin, check_polymorphic_admins
+from simpellab.admin.views import get_print_token, print_selected_view
+from simpellab.core import hooks
+from simpellab.core.middleware import HookLookupMiddleware
+from simpellab.core.enums import Status
+from simpellab.core.journal import journal_transitions
+from simpellab.core.menus import (
+    CachedMenu, MenuItem, get_menu_version, get_permission_fingerprint, invalidate_menus)
+from simpellab.core.models import StatusTransition
+from simpellab.core.search import search
+from simpellab.modules.carts import stores as cart_stores
+from simpellab.modules.carts.checkout import checkout_carts, checkout_store
+from simpellab.modules.carts.models import Cart, CommonCart
+from simpellab.modules.partners.models import (
+    Partner, BalanceCheckpoint, BalanceMutation, ContactPerson, PartnerAddress, PartnerContact)
+from simpellab.modules.products.models import (
+    Asset, Fee, FeePrice, Inventory, Parameter, ParameterPrice, Product, ProductFee,
+    UnitOfMeasure)
+from simpellab.modules.products.pricing import (
+    apply_price_versions, reprice_products, resolve_product_prices)
+from simpellab.modules.sales import workers as qrcode_workers
+from simpellab.modules.sales.models import Invoice, OrderFee, SalesOrder
+from simpellab.modules.sales.recalculation import defer_recalculation
+from simpellab.modules.sales_inspection.models import InspectionOrder
+from simpellab.modules.sales_laboratorium.models import (
+    LaboratoriumBlueprint, LaboratoriumBlueprintParameter, LaboratoriumCart,
+    LaboratoriumCartParameter, LaboratoriumOrder, LaboratoriumOrderItem,
+    LaboratoriumOrderItemParameter, LaboratoriumService)
+from simpellab.modules.shorturls.cache import local_cache, resolve_short_url
+from simpellab.modules.shorturls.clicks import ClickBuffer, click_buffer
+from simpellab.modules.shorturls.codes import CodeAllocator, allocate_codes, scramble
+from simpellab.modules.shorturls.models import ShortUrl, get_object_key
+from simpellab.utils.slugify import bulk_unique_slugify
+
+
+class PartnerBalanceConcurrencyTest(TransactionTestCase):
+    threads = 8
+    mutations = 25
+
+    def test_concurrent_mutations_keep_balance(self):
+        partner = Partner.objects.create(name='Concurrent Partner')
+        errors = []
+
+        def worker():
+            try:
+                for i in range(self.mutations):
+                    BalanceMutation.objects.create(
+                        partner=Partner(pk=partner.pk),
+                        flow=BalanceMutation.IN,
+                        reference='TEST',
+                        amount=Decimal('1.00'))
+            except Exception as err:
+                errors.append(err)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker) for i in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        partner.refresh_from_db()
+        expected = Decimal(self.threads * self.mutations)
+        self.assertEqual(partner.balance, expected)
+        self.assertEqual(partner.balance_mutations.total(), expected)
+
+
+class PartnerBalanceTest(TestCase):
+
+    def setUp(self):
+        self.partner = Partner.objects.create(name='Partner')
+        self.today = timezone.localdate()
+
+    def mutate(self, amount, days_ago=0, flow=BalanceMutation.IN):
+        mutation = BalanceMutation.objects.create(
+            partner=Partner(pk=self.partner.pk), flow=flow,
+            reference='TEST', amount=Decimal(amount))
+        if days_ago:
+            BalanceMutation.objects.filter(pk=mutation.pk).update(
+                created_at=mutation.created_at - timedelta(days=days_ago))
+            mutation.refresh_from_db()
+        return mutation
+
+    def assertBalance(self, expected):
+        self.partner.refresh_from_db()
+        self.assertEqual(self.partner.balance, Decimal(expected))
+        self.assertEqual(self.partner.balance_mutations.total(), Decimal(expected))
+
+    def test_stale_instances_keep_balance(self):
+        first = Partner.objects.get(pk=self.partner.pk)
+        second = Partner.objects.get(pk=self.partner.pk)
+        mutation = self.mutate(10)
+        BalanceMutation.objects.create(
+            partner=first, reference='TEST', amount=Decimal(5))
+        BalanceMutation.objects.create(
+            partner=second, reference='TEST', amount=Decimal(7),
+            flow=BalanceMutation.OUT)
+        mutation.amount = Decimal(20)
+        mutation.save()
+        self.assertBalance(18)
+        mutation.delete()
+        self.assertBalance(-2)
+
+    def test_checkpoints_follow_past_mutations(self):
+        old = self.mutate(100, days_ago=5)
+        self.mutate(50, days_ago=2)
+        date = self.today - timedelta(days=1)
+        BalanceCheckpoint.create_for_date(date)
+        self.assertEqual(self.partner.get_balance_as_of(date), 150)
+
+        old.amount = Decimal(80)
+        old.save()
+        self.assertFalse(self.partner.balance_checkpoints.exists())
+        self.assertEqual(self.partner.get_balance_as_of(date), 130)
+
+        BalanceCheckpoint.create_for_date(date)
+        old.delete()
+        self.assertFalse(self.partner.balance_checkpoints.exists())
+        self.assertEqual(self.partner.get_balance_as_of(date), 50)
+        self.assertBalance(50)
+
+        BalanceCheckpoint.create_for_date(date)
+        self.mutate(10)
+        self.assertEqual(self.partner.balance_checkpoints.count(), 1)
+        self.assertEqual(self.partner.get_balance_as_of(self.today), 60)
+
+
+class SalesOrderDocumentQueryTest(TestCase):
+    items = 40
+    parameters = 3
+
+    def setUp(self):
+        uom = UnitOfMeasure.objects.create(name='pcs')
+        customer = Partner.objects.create(name='Lab Customer', is_customer=True)
+        PartnerAddress.objects.create(partner=customer, street='Street', is_primary=True)
+        PartnerContact.objects.create(partner=customer, phone='123')
+        fee = Fee.objects.create(name='Sampling', price=1000, unit_of_measure=uom)
+        service = LaboratoriumService.objects.create(
+            name='Water content', price=50000, unit_of_measure=uom)
+        ProductFee.objects.create(product=service, fee=fee)
+        parameters = [
+            Parameter.objects.create(name='P%s' % i, price=100, unit_of_measure=uom)
+            for i in range(self.parameters)
+        ]
+        self.order = LaboratoriumOrder.objects.create(customer=customer)
+        OrderFee.objects.create(order=self.order, fee=fee)
+        for i in range(self.items):
+            item = LaboratoriumOrderItem.objects.create(
+                order=self.order, product=service, name='Sample %s' % i)
+            for parameter in parameters:
+                LaboratoriumOrderItemParameter.objects.create(
+                    order_item=item, parameter=parameter)
+
+    def test_document_queries_do_not_grow_with_items(self):
+        with self.assertNumQueries(6):
+            order = LaboratoriumOrder.objects.prefetch_document().get(pk=self.order.pk)
+
+        with self.assertNumQueries(0):
+            str(order.customer.primary_address)
+            order.customer.full_contactinfo
+            for row in order.order_fees.all():
+                str(row.fee), row.fee.unit_of_measure
+            rows = order.order_items.all()
+            for row in rows:
+                row.product.inner_id, row.product.unit_of_measure
+                [str(fee) for fee in row.product.product_fees.all()]
+                [str(param) for param in row.parameters.all()]
+
+        self.assertEqual(len(rows), self.items)
+        self.assertEqual(len(rows[0].parameters.all()), self.parameters)
+
+
+class FeePricePropagationTest(TestCase):
+    products = 5
+
+    def setUp(self):
+        uom = UnitOfMeasure.objects.create(name='pcs')
+        self.fee = Fee.objects.create(name='Sampling', price=1000, unit_of_measure=uom)
+        self.services = [
+            LaboratoriumService.objects.create(
+                name='Service %s' % i, price=500, unit_of_measure=uom)
+            for i in range(self.products)
+        ]
+        for service in self.services:
+            ProductFee.objects.create(product=service, fee=self.fee)
+
+    def test_fee_price_change_reprices_products(self):
+        self.fee.price = 2000
+        with self.assertNumQueries(6):
+            self.fee.save()
+        self.assertEqual(self.fee.repriced_products, self.products)
+        for service in self.services:
+            service.refresh_from_db()
+            self.assertEqual(service.fee, Decimal('2000'))
+            self.assertEqual(service.total_price, Decimal('2500'))
+        self.assertEqual(reprice_products(), 0)
+
+
+class PriceHistoryTest(TestCase):
+
+    def setUp(self):
+        uom = UnitOfMeasure.objects.create(name='pcs')
+        self.today = timezone.localdate()
+        self.tomorrow = self.today + timedelta(days=1)
+        self.parameter = Parameter.objects.create(
+            name='Moisture', price=100, unit_of_measure=uom)
+        ParameterPrice.objects.create(
+            parameter=self.parameter, price=150, date_effective=self.tomorrow)
+        service = LaboratoriumService.objects.create(
+            name='Water content', price=500, unit_of_measure=uom)
+        order = LaboratoriumOrder.objects.create(customer=Partner.objects.create(name='Customer'))
+        self.item = LaboratoriumOrderItem.objects.create(
+            order=order, product=service, name='Sample')
+        self.item.add_parameters([self.parameter])
+
+    def test_price_resolved_on_date(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.parameter.get_price_at(self.today), Decimal('100'))
+        self.assertEqual(self.parameter.get_price_at(self.tomorrow), Decimal('150'))
+        self.assertEqual(self.item.parameters.get().price, Decimal('100'))
+
+    def test_order_priced_in_one_query(self):
+        with self.assertNumQueries(1):
+            prices = self.item.order.resolve_item_prices(self.tomorrow)
+        unit_price, parameters = prices[self.item.pk]
+        self.assertEqual(unit_price, Decimal('650'))
+        self.assertEqual(list(parameters.values()), [Decimal('150')])
+
+    def test_overridden_product_fee_price_kept(self):
+        uom = UnitOfMeasure.objects.create(name='kg')
+        fee = Fee.objects.create(name='Sampling', price=1000, unit_of_measure=uom)
+        FeePrice.objects.create(fee=fee, price=1200, date_effective=self.tomorrow)
+        following, overridden = [
+            LaboratoriumService.objects.create(
+                name='Service %s' % i, price=500, unit_of_measure=uom)
+            for i in range(2)
+        ]
+        ProductFee.objects.create(product=following, fee=fee)
+        ProductFee.objects.create(product=overridden, fee=fee, price=700)
+        reprice_products()
+        for service, price in [(following, 1500), (overridden, 1200)]:
+            service.refresh_from_db()
+            self.assertEqual(service.total_price, Decimal(price))
+            item = LaboratoriumOrderItem.objects.create(
+                order=self.item.order, product=service, name='Sample')
+            self.assertEqual(item.calculate_unit_price(), service.total_price)
+        prices = resolve_product_prices([following.pk, overridden.pk], self.tomorrow)
+        self.assertEqual(prices[following.pk], Decimal('1700'))
+        self.assertEqual(prices[overridden.pk], Decimal('1200'))
+
+    def test_scheduled_price_applied(self):
+        self.assertEqual(apply_price_versions(Parameter), [])
+        updated = apply_price_versions(Parameter, date=self.tomorrow)
+        self.assertEqual(len(updated), 1)
+        self.parameter.refresh_from_db()
+        self.assertEqual(self.parameter.price, Decimal('150'))
+
+
+class SlugAllocationTest(TestCase):
+
+    def test_bulk_slugs_allocated_in_one_query(self):
+        uom = UnitOfMeasure.objects.create(name='pcs')
+        LaboratoriumService.objects.create(
+            name='Water content', price=1, unit_of_measure=uom)
+        services = [
+            LaboratoriumService(name='Water content', price=1, unit_of_measure=uom)
+            for i in range(20)
+        ]
+        with self.assertNumQueries(1):
+            bulk_unique_slugify(services)
+        self.assertEqual(services[0].slug, 'water-content-2')
+        self.assertEqual(services[-1].slug, 'water-content-21')
+
+
+class CartCheckoutTest(TestCase):
+
+    def setUp(self):
+        uom = UnitOfMeasure.objects.create(name='pcs')
+        self.user = get_user_model().objects.create(username='sales')
+        self.customer = Partner.objects.create(name='Customer', is_customer=True)
+        self.service = LaboratoriumService.objects.create(
+            name='Water content', price=500, unit_of_measure=uom)
+        self.parameters = [
+            Parameter.objects.create(name='P%s' % i, price=100, unit_of_measure=uom)
+            for i in range(3)
+        ]
+
+    def fill_carts(self, count):
+        for i in range(count):
+            cart = LaboratoriumCart.objects.create(
+                user=self.user, product=self.service, quantity=1,
+                name='Sample %s' % i)
+            for parameter in self.parameters:
+                LaboratoriumCartParameter.objects.create(cart=cart, parameter=parameter)
+
+    def checkout(self, count):
+        self.fill_carts(count)
+        with CaptureQueriesContext(connection) as context:
+            orders = checkout_carts(self.user, self.customer)
+        return orders, len(context.captured_queries)
+
+    def test_checkout_queries_do_not_grow_with_carts(self):
+        self.checkout(1)
+        orders, few = self.checkout(5)
+        orders, many = self.checkout(20)
+        self.assertEqual(few, many)
+        self.assertFalse(Cart.objects.exists())
+
+        order = orders[0]
+        order.refresh_from_db()
+        self.assertEqual(order.total_order, Decimal('16000'))
+        self.assertEqual(order.order_items.count(), 20)
+        self.assertEqual(
+            LaboratoriumOrderItemParameter.objects.filter(order_item__order=order).count(), 60)
+        item = order.order_items.first()
+        self.assertEqual(item.unit_price, Decimal('800'))
+
+
+class FakeRedis:
+    """ In memory redis hashes, bytes in and out like redis-py """
+
+    def __init__(self):
+        self.data = {}
+
+    def encode(self, value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def hash(self, key):
+        return self.data.setdefault(key, {})
+
+    def hset(self, key, field, value):
+        self.hash(key)[self.encode(field)] = self.encode(value)
+
+    def hsetnx(self, key, field, value):
+        if self.hexists(key, field):
+            return 0
+        self.hset(key, field, value)
+        return 1
+
+    def hincrby(self, key, field, amount=1):
+        value = int(self.hash(key).get(self.encode(field), 0)) + amount
+        self.hset(key, field, value)
+        return value
+
+    def hexists(self, key, field):
+        return self.encode(field) in self.hash(key)
+
+    def hdel(self, key, *fields):
+        return len([
+            field for field in fields
+            if self.hash(key).pop(self.encode(field), None) is not None])
+
+    def hgetall(self, key):
+        return dict(self.hash(key))
+
+    def hmget(self, key, fields):
+        return [self.hash(key).get(self.encode(field)) for field in fields]
+
+    def hlen(self, key):
+        return len(self.hash(key))
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def expire(self, key, timeout):
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self.connection, name)
+        return lambda *args: self.commands.append((method, args))
+
+    def execute(self):
+        return [method(*args) for method, args in self.commands]
+
+
+class RedisCartStoreTest(TestCase):
+
+    def setUp(self):
+        uom = UnitOfMeasure.objects.create(name='pcs')
+        self.user = get_user_model().objects.create(
+            username='sales', is_staff=True, is_superuser=True)
+        self.customer = Partner.objects.create(name='Customer', is_customer=True)
+        self.service = LaboratoriumService.objects.create(
+            name='Water content', price=500, unit_of_measure=uom)
+        self.parameter = Parameter.objects.create(name='pH', price=100, unit_of_measure=uom)
+        self.redis = FakeRedis()
+        patches = [
+            mock.patch.object(cart_stores, 'CART_STORE', 'redis'),
+            mock.patch('django_redis.get_redis_connection', return_value=self.redis),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.store = cart_stores.get_cart_store(self.user)
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def test_add_update_and_remove_lines(self):
+        first = self.service.add_to_cart(self.request)
+        second = self.store.add(
+            self.service, name='Sample 2', parameters=[(str(self.parameter.pk), 'note')])
+        self.assertNotEqual(first.key, second.key)
+        self.store.set_quantity(second.key, 3)
+        self.store.set_quantity('missing', 5)
+        self.assertEqual(self.store.count(), 2)
+        with self.assertNumQueries(2):
+            lines = self.store.get_lines()
+        self.assertEqual([line.key for line in lines], [first.key, second.key])
+        self.assertEqual([line.quantity for line in lines], [1, 3])
+        self.assertEqual(lines[1].parameter_objects, [self.parameter])
+        self.assertEqual(lines[1].total_price, Decimal('1800'))
+        self.store.remove(first.key)
+        self.assertEqual([line.key for line in self.store.get_lines()], [second.key])
+        self.service.delete()
+        self.assertEqual(self.store.get_lines(), [])
+
+    def test_merged_add_increments_quantity(self):
+        product = Product.objects.create(name='Bottle', price=10)
+        lines = [product.add_to_cart(self.request) for i in range(3)]
+        self.assertEqual([line.quantity for line in lines], [1, 2, 3])
+        self.assertEqual(self.store.count(), 1)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_failed_checkout_restores_lines(self):
+        line = self.store.add(self.service, name='Sample')
+        with mock.patch('simpellab.modules.carts.checkout.create_orders',
+                        side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                checkout_store(self.store, self.customer)
+        self.assertEqual(
+            [(restored.key, restored.quantity) for restored in self.store.get_lines()],
+            [(line.key, 1)])
+        orders = checkout_store(self.store, self.customer)
+        self.assertEqual(len(orders), 1)
+        self.assertEqual(self.store.count(), 0)
+
+    def test_store_cart_views(self):
+        kept = self.store.add(self.service, name='Kept')
+        removed = self.store.add(self.service, name='Removed')
+        self.client.force_login(self.user)
+        url = reverse('admin:simpellab_carts_cart_changelist')
+        response = self.client.post(url, {'remove': removed.key})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        response = self.client.get(url)
+        self.assertEqual([line.key for line in response.context['lines']], [kept.key])
+        response = self.client.post(
+            reverse('admin:simpellab_carts_cart_create_order'),
+            {'customer': self.customer.pk, 'customer_po': 'PO-1'})
+        self.assertRedirects(
+            response, reverse('admin:simpellab_sales_salesorder_changelist'),
+            fetch_redirect_response=False)
+        self.assertEqual(SalesOrder.objects.get().customer_po, 'PO-1')
+        self.assertEqual(self.store.count(), 0)
+
+
+class CommonCartTest(TestCase):
+
+    def test_add_to_cart_increments_quantity(self):
+        user = get_user_model().objects.create(username='sales')
+        product = Product.objects.create(name='Bottle', price=10)
+        request = RequestFactory().get('/')
+        request.user = user
+        carts = [product.add_to_cart(request) for i in range(2)]
+        self.assertEqual([cart.quantity for cart in carts], [1, 2])
+        self.assertEqual(CommonCart.objects.get(user=user, product=product).quantity, 2)
+
+
+class BlueprintApplyTest(TestCase):
+
+    def setUp(self):
+        uom = UnitOfMeasure.objects.create(name='pcs')
+        self.user = get_user_model().objects.create(username='sales')
+        service = LaboratoriumService.objects.create(
+            name='Water content', price=500, unit_of_measure=uom)
+        self.blueprint = LaboratoriumBlueprint.objects.create(
+            user=self.user, product=service, name='Sample')
+        for i in range(3):
+            LaboratoriumBlueprintParameter.objects.create(
+                blueprint=self.blueprint,
+                parameter=Parameter.objects.create(
+                    name='P%s' % i, price=100, unit_of_measure=uom))
+        self.order = LaboratoriumOrder.objects.create(
+            customer=Partner.objects.create(name='Customer'))
+
+    def apply(self, n):
+        with CaptureQueriesContext(connection) as context:
+            items = self.blueprint.apply(n, order=self.order)
+        return items, len(context.captured_queries)
+
+    def test_order_queries_do_not_grow_with_samples(self):
+        self.apply(1)
+        items, few = self.apply(5)
+        items, many = self.apply(20)
+        self.assertEqual(few, many)
+        self.assertEqual(items[0].unit_price, Decimal('800'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_order, Decimal('20800'))
+        self.assertEqual(
+            LaboratoriumOrderItemParameter.objects.filter(order_item__order=self.order).count(), 78)
+
+    def test_cart_lines_named(self):
+        carts = self.blueprint.apply(3, names=['A', 'B'], user=self.user)
+        self.assertEqual([cart.name for cart in carts], ['A', 'B', 'Sample'])
+        self.assertEqual(LaboratoriumCart.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(LaboratoriumCartParameter.objects.count(), 9)
+
+
+class SearchIndexTest(TestCase):
+
+    def setUp(self):
+        uom = UnitOfMeasure.objects.create(name='pcs')
+        self.product = LaboratoriumService.objects.create(
+            name='Kadar Air Tanah', price=1, unit_of_measure=uom)
+        LaboratoriumService.objects.create(
+            name='Kadar Garam', price=1, unit_of_measure=uom)
+        self.partner = Partner.objects.create(name='PT Åbadi Jaya')
+
+    def names(self, queryset, term):
+        return [obj.name for obj in search(queryset, term)]
+
+    def test_search_follows_changes(self):
+        self.assertEqual(self.names(Product.objects.all(), 'kadar tan'), ['Kadar Air Tanah'])
+        self.assertEqual(self.names(Product.objects.all(), 'geoteknik'), [])
+        self.product.tags.add('geoteknik')
+        self.assertEqual(self.names(Product.objects.all(), 'geoteknik'), ['Kadar Air Tanah'])
+
+        self.product.name = 'Kadar Lumpur'
+        self.product.save()
+        self.assertEqual(self.names(Product.objects.all(), 'tanah'), [])
+        self.product.delete()
+        self.assertEqual(self.names(Product.objects.all(), 'kadar'), ['Kadar Garam'])
+
+    def test_limit_only_ranked_search(self):
+        self.assertEqual(len(search(Product.objects.all(), 'kadar', limit=1)), 1)
+        self.assertEqual(
+            sorted(obj.name for obj in search(Product.objects.all(), 'kadar')),
+            ['Kadar Air Tanah', 'Kadar Garam'])
+
+    def test_partner_searched_by_contacts(self):
+        self.assertEqual(self.names(Partner.objects.all(), 'abadi'), ['PT Åbadi Jaya'])
+        ContactPerson.objects.create(partner=self.partner, name='Budi', phone='0813')
+        self.assertEqual(self.names(Partner.objects.all(), 'budi'), ['PT Åbadi Jaya'])
+
+
+class OrderNumeratorTest(TestCase):
+
+    def test_order_types_continue_former_counters(self):
+        Numerator.objects.create(
+            app_label='simpellab_sales_laboratorium',
+            model='simpellab_sales.SalesOrder',
+            prefix='SPJ', year=timezone.now().year, counter=7)
+        migration = import_module(
+            'simpellab.modules.sales.migrations.0003_shared_order_numerator')
+        migration.share_order_numerators(apps, None)
+
+        customer = Partner.objects.create(name='Customer')
+        lab = LaboratoriumOrder.objects.create(customer=customer)
+        inspection = InspectionOrder.objects.create(customer=customer)
+        self.assertEqual([lab.reg_number, inspection.reg_number], [8, 9])
+        self.assertNotEqual(lab.inner_id, inspection.inner_id)
+
+
+class InvoiceBulkCreateTest(TestCase):
+
+    def setUp(self):
+        customer = Partner.objects.create(name='Customer')
+        self.orders = [
+            LaboratoriumOrder.objects.create(customer=customer) for i in range(6)
+        ]
+
+    def test_invoices_created_in_fixed_queries(self):
+        Invoice.objects.bulk_create_for_orders(self.orders[:1])
+        # Numerator lookup, lock and update, one insert, whatever the count
+        with self.assertNumQueries(8):
+            invoices = Invoice.objects.bulk_create_for_orders(self.orders[1:])
+        self.assertEqual(len(invoices), 5)
+        self.assertEqual(Invoice.objects.count(), 6)
+
+    def test_reg_numbers_unique_and_contiguous(self):
+        Invoice.for_sales_order(self.orders[0]).save()
+        invoices = Invoice.objects.bulk_create_for_orders(self.orders[1:5])
+        Invoice.for_sales_order(self.orders[5]).save()
+        rows = Invoice.objects.order_by('reg_number')
+        self.assertEqual(
+            [row.reg_number for row in rows], list(range(1, 7)))
+        self.assertEqual(
+            [invoice.reg_number for invoice in invoices], [2, 3, 4, 5])
+        self.assertEqual(len(set(row.inner_id for row in rows)), 6)
+
+
+class ShortUrlCodeTest(TestCase):
+
+    def test_scramble_is_a_permutation(self):
+        values = [scramble(value, length=2) for value in range(62 ** 2)]
+        self.assertEqual(sorted(values), list(range(62 ** 2)))
+        self.assertNotEqual(values[:10], list(range(10)))
+
+    def test_codes_are_unique_and_not_sequential(self):
+        codes = allocate_codes(200)
+        self.assertEqual(len(set(codes)), 200)
+        self.assertEqual({len(code) for code in codes}, {6})
+        self.assertNotEqual(sorted(codes), codes)
+
+    def test_rolled_back_codes_not_handed_out(self):
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                allocate_codes(1)
+                raise DatabaseError
+        # Sequence is rolled back, another worker reserves same values
+        other = CodeAllocator().allocate(5)
+        self.assertFalse(set(other) & set(allocate_codes(5)))
+
+    def test_legacy_short_urls_indexed(self):
+        order = LaboratoriumOrder.objects.create(
+            customer=Partner.objects.create(name='Customer'))
+        legacy = ShortUrl.objects.create(
+            name='Legacy', original_url=order.get_public_url_with_hostname())
+        other = ShortUrl.objects.create(name='Other', original_url='https://example.com/')
+        migration = import_module(
+            'simpellab.modules.sales.migrations.0004_backfill_short_url_index')
+        migration.backfill_short_url_index(apps, None)
+        legacy.refresh_from_db()
+        self.assertEqual((legacy.content_type, legacy.object_id), get_object_key(order))
+        self.assertIsNone(ShortUrl.objects.get(pk=other.pk).content_type)
+        # Found by index, without url lookup
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                order.get_short_url(), legacy.get_absolute_url_with_hostname())
+
+    def test_concurrently_created_short_url_is_read_back(self):
+        order = LaboratoriumOrder.objects.create(
+            customer=Partner.objects.create(name='Customer'))
+        existing = order.get_short_url()
+        content_type, object_id = get_object_key(order)
+        duplicate = ShortUrl(
+            name='Duplicate', original_url=order.get_public_url_with_hostname(),
+            content_type=content_type, object_id=object_id)
+        short_url = ShortUrl.objects._create_or_get(duplicate)
+        self.assertEqual(short_url.get_absolute_url_with_hostname(), existing)
+        self.assertEqual(ShortUrl.objects.count(), 1)
+
+
+class ShortUrlCacheTest(TestCase):
+
+    def setUp(self):
+        self.addCleanup(local_cache.clear)
+        self.addCleanup(cache.clear)
+        self.short_url = ShortUrl.objects.create(
+            name='Report', original_url='https://example.com/report/1')
+
+    def test_resolved_without_queries_after_warm_up(self):
+        url = reverse('goto_shorturl', args=(self.short_url.hashed_url,))
+        with mock.patch.object(click_buffer, 'add') as add:
+            self.client.get(url)
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+        self.assertRedirects(
+            response, self.short_url.original_url, fetch_redirect_response=False)
+        add.assert_called_with(self.short_url.pk)
+        # Other processes are served by the shared cache
+        local_cache.clear()
+        with self.assertNumQueries(0):
+            target = resolve_short_url(self.short_url.hashed_url)
+        self.assertEqual(target.original_url, self.short_url.original_url)
+
+    def test_changed_url_served_after_save_and_delete(self):
+        hashed_url = self.short_url.hashed_url
+        resolve_short_url(hashed_url)
+        self.short_url.original_url = 'https://example.com/report/2'
+        self.short_url.save()
+        self.assertEqual(
+            resolve_short_url(hashed_url).original_url, 'https://example.com/report/2')
+        self.short_url.delete()
+        self.assertIsNone(resolve_short_url(hashed_url))
+
+    def test_change_in_other_process_served_after_check_interval(self):
+        interval = mock.patch.object(local_cache, 'check_interval', 60)
+        interval.start()
+        self.addCleanup(interval.stop)
+        hashed_url = self.short_url.hashed_url
+        resolve_short_url(hashed_url)
+        # Saved by another process, its LRU is not this one
+        with mock.patch.object(local_cache, 'delete'):
+            self.short_url.original_url = 'https://example.com/report/2'
+            self.short_url.save()
+        self.assertEqual(
+            resolve_short_url(hashed_url).original_url, 'https://example.com/report/1')
+        local_cache.checked -= local_cache.check_interval
+        self.assertEqual(
+            resolve_short_url(hashed_url).original_url, 'https://example.com/report/2')
+        # Evicted version key is seeded, not restarted
+        cache.set(local_cache.version_key, 1, None)
+        local_cache.checked -= local_cache.check_interval
+        local_cache.check_version()
+        cache.delete(local_cache.version_key)
+        local_cache.bump_version()
+        self.assertNotIn(cache.get(local_cache.version_key), [None, 1, 2])
+
+
+class ClickBufferTest(TestCase):
+
+    def setUp(self):
+        self.short_url = ShortUrl.objects.create(
+            name='Report', original_url='https://example.com/report/1')
+        self.buffer = ClickBuffer(threshold=3, interval=60)
+        self.addCleanup(self.buffer.pop)
+        patcher = mock.patch('simpellab.modules.shorturls.workers.flush_clicks_later')
+        self.flush_clicks_later = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_clicked(self):
+        return ShortUrl.objects.get(pk=self.short_url.pk).clicked
+
+    def test_flushed_at_threshold(self):
+        for i in range(2):
+            self.buffer.add(self.short_url.pk)
+        self.flush_clicks_later.assert_not_called()
+        self.assertTrue(self.buffer.timer.is_alive())
+        self.buffer.add(self.short_url.pk)
+        self.flush_clicks_later.assert_called_once_with({self.short_url.pk: 3})
+        self.assertEqual(self.buffer.total, 0)
+        self.assertIsNone(self.buffer.timer)
+
+    def test_idle_buffer_flushed_by_timer(self):
+        flushed = threading.Event()
+        self.flush_clicks_later.side_effect = lambda counts: flushed.set()
+        self.buffer.interval = 0.05
+        self.buffer.add(self.short_url.pk)
+        self.assertTrue(flushed.wait(5))
+        self.flush_clicks_later.assert_called_once_with({self.short_url.pk: 1})
+        self.assertEqual(self.buffer.total, 0)
+
+    def test_written_in_request_when_redis_down(self):
+        self.flush_clicks_later.side_effect = RedisConnectionError
+        with self.assertLogs('simpellab.shorturls', 'WARNING'):
+            for i in range(3):
+                self.buffer.add(self.short_url.pk)
+        self.assertEqual(self.get_clicked(), 3)
+        self.assertEqual(self.buffer.total, 0)
+
+    def test_kept_in_buffer_when_database_fails(self):
+        self.flush_clicks_later.side_effect = RedisConnectionError
+        with mock.patch('simpellab.modules.shorturls.clicks.flush_clicks',
+                        side_effect=DatabaseError), \
+                self.assertLogs('simpellab.shorturls', 'WARNING'):
+            for i in range(3):
+                self.buffer.add(self.short_url.pk)
+        self.assertEqual(self.buffer.counts, {self.short_url.pk: 3})
+        self.assertEqual(self.get_clicked(), 0)
+        self.assertTrue(self.buffer.timer.is_alive())
+        self.buffer.flush()
+        self.assertEqual(self.get_clicked(), 3)
+
+
+class BulkTransitionReportTest(TestCase):
+
+    def setUp(self):
+        customer = Partner.objects.create(name='Customer')
+        self.orders = {}
+        for name, status in [
+                ('valid', Status.VALID), ('approved', Status.APPROVED),
+                ('draft', Status.DRAFT), ('raced', Status.VALID),
+                ('refused', Status.VALID)]:
+            order = LaboratoriumOrder.objects.create(customer=customer)
+            LaboratoriumOrder._base_manager.filter(pk=order.pk).update(
+                status=status.value)
+            self.orders[name] = order.pk
+
+    def test_each_row_reported_once(self):
+        orders = self.orders
+
+        def pre_approve(order):
+            if order.pk == orders['raced']:
+                # Another request trashed the row after it was read
+                LaboratoriumOrder._base_manager.filter(pk=order.pk).update(
+                    status=Status.TRASH.value)
+
+        def post_approve(order):
+            if order.pk == orders['refused']:
+                raise PermissionError('Refused')
+
+        with mock.patch.object(LaboratoriumOrder, 'pre_approve_action', pre_approve), \
+                mock.patch.object(LaboratoriumOrder, 'post_approve_action', post_approve):
+            report = LaboratoriumOrder.objects.filter(
+                pk__in=orders.values()).bulk_approve()
+
+        results = {name: [] for name in orders}
+        names = {pk: name for name, pk in orders.items()}
+        for obj, result, msg in report:
+            results[names[obj.pk]].append(result)
+        self.assertEqual(results, {
+            'valid': [report.CHANGED],
+            'approved': [report.IGNORED],
+            'draft': [report.REJECTED],
+            'raced': [report.SKIPPED],
+            'refused': [report.REJECTED],
+        })
+        statuses = dict(LaboratoriumOrder._base_manager.filter(
+            pk__in=orders.values()).values_list('pk', 'status'))
+        self.assertEqual(statuses[orders['raced']], Status.TRASH.value)
+        self.assertEqual(statuses[orders['refused']], Status.VALID.value)
+        self.assertEqual(statuses[orders['valid']], Status.APPROVED.value)
+        self.assertEqual(
+            list(StatusTransition.objects.to_status(
+                Status.APPROVED.value).object_ids()),
+            [orders['valid']])
+
+    def test_refused_row_side_effects_rolled_back(self):
+        def post_approve(order):
+            LaboratoriumOrder._base_manager.filter(pk=order.pk).update(note='Approved')
+            if order.pk == self.orders['refused']:
+                raise PermissionError('Refused')
+
+        with mock.patch.object(LaboratoriumOrder, 'post_approve_action', post_approve):
+            LaboratoriumOrder.objects.filter(
+                pk__in=[self.orders['valid'], self.orders['refused']]).bulk_approve()
+        notes = dict(LaboratoriumOrder._base_manager.filter(
+            pk__in=self.orders.values()).values_list('pk', 'note'))
+        self.assertEqual(notes[self.orders['valid']], 'Approved')
+        self.assertNotEqual(notes[self.orders['refused']], 'Approved')
+
+    def test_overridden_row_hook_not_replaced_by_batch_hook(self):
+        customer = Partner.objects.create(name='Customer')
+        lab = LaboratoriumOrder.objects.create(customer=customer)
+        inspection = InspectionOrder.objects.create(customer=customer)
+        post_validate = mock.Mock()
+        with mock.patch.object(InspectionOrder, 'post_validate_action', post_validate), \
+                mock.patch.object(SalesOrder, 'post_validate_batch') as batch:
+            report = SalesOrder.objects.filter(pk__in=[lab.pk, inspection.pk]).bulk_validate()
+        self.assertEqual(len(report.changed), 2)
+        self.assertEqual([order.pk for order in batch.call_args[0][0]], [lab.pk])
+        post_validate.assert_called_once_with()
+
+
+class TransitionJournalTest(TestCase):
+
+    def setUp(self):
+        self.order = LaboratoriumOrder.objects.create(
+            customer=Partner.objects.create(name='Customer'))
+        self.user = get_user_model().objects.create(username='admin')
+
+    def test_transition_writes_journal_row(self):
+        self.order.trash()
+        row = StatusTransition.objects.for_object(self.order).get()
+        self.assertEqual(
+            (row.from_status, row.to_status),
+            (Status.DRAFT.value, Status.TRASH.value))
+
+    def test_journal_block_writes_rows_at_exit(self):
+        with journal_transitions(actor=self.user) as journal:
+            self.order.trash()
+            self.order.draft()
+            self.assertEqual(len(journal.entries), 2)
+            self.assertFalse(StatusTransition.objects.exists())
+        rows = StatusTransition.objects.for_object(self.order)
+        self.assertEqual(
+            sorted(rows.values_list('to_status', 'actor')),
+            sorted([(Status.TRASH.value, self.user.pk),
+                    (Status.DRAFT.value, self.user.pk)]))
+
+
+class IncrementalTotalsTest(TestCase):
+
+    def setUp(self):
+        uom = UnitOfMeasure.objects.create(name='pcs')
+        self.customer = Partner.objects.create(name='Customer')
+        self.fee = Fee.objects.create(name='Sampling', price=1250, unit_of_measure=uom)
+        self.service = LaboratoriumService.objects.create(
+            name='Water content', price=33333, unit_of_measure=uom)
+        self.parameters = [
+            Parameter.objects.create(name='P%s' % i, price=1111 * (i + 1), unit_of_measure=uom)
+            for i in range(3)
+        ]
+
+    def build_order(self):
+        order = LaboratoriumOrder.objects.create(
+            customer=self.customer, discount_percentage=Decimal('7.5'))
+        fee = OrderFee.objects.create(order=order, fee=self.fee)
+        items = []
+        for i in range(3):
+            item = LaboratoriumOrderItem.objects.create(
+                order=order, product=self.service, name='Sample %s' % i)
+            for parameter in self.parameters[:i + 1]:
+                LaboratoriumOrderItemParameter.objects.create(
+                    order_item=item, parameter=parameter)
+            items.append(item)
+        LaboratoriumOrderItemParameter.objects.filter(
+            order_item=items[0]).first().delete()
+        LaboratoriumOrderItem.objects.get(pk=items[1].pk).delete()
+        fee.delete()
+        return LaboratoriumOrder.objects.get(pk=order.pk)
+
+    def totals(self, order):
+        return order.total_order, order.discount, order.grand_total
+
+    def verify(self, *args):
+        out = StringIO()
+        call_command('verify_order_totals', *args, stdout=out)
+        return out.getvalue()
+
+    def test_incremental_totals_match_full_recalculation(self):
+        with mock.patch.object(SalesOrder, 'incremental_total', True):
+            incremental = self.build_order()
+        full = self.build_order()
+        self.assertEqual(self.totals(incremental), self.totals(full))
+        full.calc_all_total()
+        self.assertEqual(self.totals(incremental), self.totals(full))
+        self.assertIn('0 drifted', self.verify())
+
+    def test_verify_checks_discount_and_grand_total(self):
+        order = self.build_order()
+        expected = self.totals(order)
+        SalesOrder.objects.filter(pk=order.pk).update(grand_total=0)
+        self.assertIn('1 drifted', self.verify())
+        SalesOrder.objects.filter(pk=order.pk).update(discount=0)
+        self.assertIn('1 drifted', self.verify('--repair'))
+        order.refresh_from_db()
+        self.assertEqual(self.totals(order), expected)
+
+
+class DeferRecalculationTest(TestCase):
+
+    def setUp(self):
+        uom = UnitOfMeasure.objects.create(name='pcs')
+        self.fees = [
+            Fee.objects.create(name='Fee %s' % i, price=1000, unit_of_measure=uom)
+            for i in range(2)
+        ]
+        self.service = LaboratoriumService.objects.create(
+            name='Water content', price=50000, unit_of_measure=uom)
+        self.parameters = [
+            Parameter.objects.create(name='P%s' % i, price=100, unit_of_measure=uom)
+            for i in range(3)
+        ]
+        self.order = LaboratoriumOrder.objects.create(
+            customer=Partner.objects.create(name='Customer'))
+
+    def spy(self, model, name):
+        return mock.patch.object(
+            model, name, autospec=True, side_effect=getattr(model, name))
+
+    def test_cascade_recomputes_each_order_once(self):
+        with self.spy(SalesOrder, 'calc_total_order') as calc_order, \
+                self.spy(LaboratoriumOrderItem, 'calculate_unit_price') as calc_item:
+            with defer_recalculation():
+                for fee in self.fees:
+                    OrderFee.objects.create(order=self.order, fee=fee)
+                for i in range(2):
+                    item = LaboratoriumOrderItem.objects.create(
+                        order=self.order, product=self.service, name='Sample %s' % i)
+                    for parameter in self.parameters:
+                        LaboratoriumOrderItemParameter.objects.create(
+                            order_item=item, parameter=parameter)
+        self.assertEqual(calc_order.call_count, 1)
+        # Once on insert, once on flush for each item
+        self.assertEqual(calc_item.call_count, 4)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_order, 2 * 1000 + 2 * (50000 + 300))
+
+    def test_deleted_objects_skipped_at_flush(self):
+        item = LaboratoriumOrderItem.objects.create(
+            order=self.order, product=self.service, name='Sample')
+        with defer_recalculation():
+            LaboratoriumOrderItemParameter.objects.create(
+                order_item=item, parameter=self.parameters[0])
+            item.delete()
+        self.assertFalse(LaboratoriumOrderItem.objects.filter(pk=item.pk).exists())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_order, 0)
+
+        with defer_recalculation():
+            OrderFee.objects.create(order=self.order, fee=self.fees[0])
+            self.order.delete()
+        self.assertFalse(SalesOrder.objects.filter(pk=self.order.pk).exists())
+
+
+class ItemParametersTest(TestCase):
+
+    def setUp(self):
+        uom = UnitOfMeasure.objects.create(name='pcs')
+        self.service = LaboratoriumService.objects.create(
+            name='Water content', price=500, unit_of_measure=uom)
+        self.parameters = [
+            Parameter.objects.create(name='P%s' % i, price=100 * (i + 1), unit_of_measure=uom)
+            for i in range(8)
+        ]
+        self.order = LaboratoriumOrder.objects.create(
+            customer=Partner.objects.create(name='Customer'))
+
+    def create_item(self):
+        return LaboratoriumOrderItem.objects.create(
+            order=self.order, product=self.service, name='Sample')
+
+    def count_queries(self, func, *args):
+        with CaptureQueriesContext(connection) as context:
+            func(*args)
+        return len(context.captured_queries)
+
+    def assertItemTotal(self, item, total):
+        item = LaboratoriumOrderItem.objects.get(pk=item.pk)
+        self.assertEqual(item.unit_price, total)
+
+    def test_add_parameters_query_count(self):
+        # Price lookup, one insert, item and order recomputed once
+        few, many = self.create_item(), self.create_item()
+        self.assertEqual(
+            self.count_queries(few.add_parameters, self.parameters[:4]),
+            self.count_queries(many.add_parameters, self.parameters))
+        self.assertItemTotal(few, 500 + 1000)
+        self.assertItemTotal(many, 500 + 3600)
+
+    def set_parameters(self, parameters):
+        """ Keep half of existing parameters and add as many, with duplicates """
+        half = len(parameters) // 2
+        item = self.create_item()
+        item.add_parameters(parameters[:half])
+        kept, added = parameters[half // 2:half], parameters[half:]
+        values = []
+        for parameter in kept + added:
+            values += [parameter, parameter.pk, str(parameter.pk)]
+        count = self.count_queries(item.set_parameters, values)
+        self.assertEqual(
+            sorted(item.parameters.values_list('parameter', flat=True)),
+            sorted(parameter.pk for parameter in kept + added))
+        self.assertItemTotal(item, 500 + sum(p.price for p in kept + added))
+        return count
+
+    def test_set_parameters_dedupes_input(self):
+        p0, p1, p2 = self.parameters[:3]
+        item = self.create_item()
+        item.add_parameters([p0, p1])
+        rows = item.set_parameters([p1, p2.pk, p2, str(p1.pk)])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(
+            sorted(item.parameters.values_list('parameter', flat=True)),
+            sorted([p1.pk, p2.pk]))
+        self.assertItemTotal(item, 500 + 200 + 300)
+
+    def test_set_parameters_query_count(self):
+        self.assertEqual(
+            self.set_parameters(self.parameters[:4]),
+            self.set_parameters(self.parameters))
+
+
+def make_pdf(pages=1):
+    writer = PdfFileWriter()
+    for i in range(pages):
+        writer.addBlankPage(100, 100)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def count_pages(content):
+    return PdfFileReader(io.BytesIO(content)).getNumPages()
+
+
+class PDFTestMixin:
+    """ PDF cache in temporary directory, wkhtmltopdf and RQ mocked """
+
+    def setUp(self):
+        super().setUp()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        patches = [
+            mock.patch.object(pdf_cache, 'root', root.name),
+            mock.patch('simpellab.admin.pdf.convert_to_pdf', return_value=make_pdf()),
+            mock.patch.object(pdf_workers, 'queue'),
+        ]
+        self.convert_to_pdf, self.queue = [p.start() for p in patches][1:]
+        for p in patches:
+            self.addCleanup(p.stop)
+        self.queue.fetch_job.return_value = None
+        self.addCleanup(cache.delete_many, ['pdfcache:hits', 'pdfcache:misses'])
+
+
+class PDFCacheTest(PDFTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = PDFCache(root=pdf_cache.root, max_size=1000)
+
+    def test_key_stable(self):
+        key = self.cache.make_key(['<p>1</p>', None], {'margin-top': 40, 'orientation': 'Portrait'})
+        self.assertEqual(
+            key, self.cache.make_key(['<p>1</p>', None], {'orientation': 'Portrait', 'margin-top': 40}))
+        self.assertNotEqual(
+            key, self.cache.make_key(['<p>1</p>', None], {'margin-top': 20, 'orientation': 'Portrait'}))
+        self.assertNotEqual(key, self.cache.make_key([None, '<p>1</p>'], {}))
+
+    def test_rendered_once_and_counted(self):
+        first = self.cache.render('<p>1</p>', cmd_options={'margin-top': 40})
+        second = self.cache.render('<p>1</p>', cmd_options={'margin-top': 40})
+        self.assertEqual(first, second)
+        self.assertEqual(self.convert_to_pdf.call_count, 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['files']), (1, 1, 1))
+        out = StringIO()
+        call_command('pdf_cache', '--clear', stdout=out)
+        self.assertEqual(self.cache.stats()['files'], 0)
+
+    def test_least_recently_used_evicted(self):
+        keys = ['a', 'b', 'c']
+        for i, key in enumerate(keys):
+            self.cache.set(key, b'x' * 400)
+            # Distinct mtime on file systems with coarse resolution
+            os.utime(self.cache.get_path(key), (i, i))
+        self.assertFalse(self.cache.exists('a'))
+        self.cache.get('b')
+        self.cache.set('d', b'x' * 400)
+        self.assertEqual(
+            [self.cache.exists(key) for key in 'abcd'], [False, True, False, True])
+
+    def test_print_response_reused(self):
+        user = get_user_model().objects.create(
+            username='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(user)
+        order = LaboratoriumOrder.objects.create(
+            customer=Partner.objects.create(name='Customer'))
+        invoice = Invoice.objects.bulk_create_for_orders([order])[0]
+        url = reverse('admin:simpellab_sales_invoice_print', args=(invoice.pk,))
+        modeladmin = admin.site._registry[Invoice]
+        with mock.patch.object(modeladmin, 'print_async', False):
+            for i in range(2):
+                response = self.client.get(url)
+                self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(self.convert_to_pdf.call_count, 1)
+
+
+class PrintSelectedTest(PDFTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create(
+            username='admin', is_staff=True, is_superuser=True)
+        customer = Partner.objects.create(name='Customer')
+        orders = [LaboratoriumOrder.objects.create(customer=customer) for i in range(3)]
+        Invoice.objects.bulk_create_for_orders(orders)
+        self.modeladmin = admin.site._registry[Invoice]
+
+    def print_selected(self):
+        request = RequestFactory().post('/')
+        request.user = self.user
+        return print_selected_view(
+            request, self.modeladmin, Invoice.objects.order_by('reg_number'))
+
+    def test_selected_merged_in_request(self):
+        with mock.patch.object(self.modeladmin, 'print_async', False):
+            response = self.print_selected()
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(count_pages(b''.join(response.streaming_content)), 3)
+        self.assertEqual(self.convert_to_pdf.call_count, 3)
+        # Documents are reused from cache
+        with mock.patch.object(self.modeladmin, 'print_async', False):
+            self.print_selected()
+        self.assertEqual(self.convert_to_pdf.call_count, 3)
+
+    def test_selected_rendered_by_job(self):
+        with mock.patch.object(self.modeladmin.print_view_class, 'get_document') as get_document:
+            response = self.print_selected()
+        get_document.assert_not_called()
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/print/', response.url)
+        func, *args = self.queue.enqueue.call_args[0]
+        self.assertEqual(func, pdf_workers.render_selected_pdf_task)
+        site_name, model_label, pks, key, user_pk = args
+        self.assertEqual(model_label, 'simpellab_sales.Invoice')
+        self.assertEqual(
+            pks, list(Invoice.objects.order_by('reg_number').values_list('pk', flat=True)))
+        self.assertEqual(user_pk, self.user.pk)
+
+        self.assertEqual(func(*args), key)
+        self.assertEqual(count_pages(pdf_cache.get(key)), 3)
+        # Unchanged selection is served from cache
+        self.queue.enqueue.reset_mock()
+        self.print_selected()
+        self.queue.enqueue.assert_not_called()
+
+
+class PrintJobTest(PDFTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create(
+            username='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(user)
+        order = LaboratoriumOrder.objects.create(
+            customer=Partner.objects.create(name='Customer'))
+        self.invoice = Invoice.objects.bulk_create_for_orders([order])[0]
+
+    def print_invoice(self):
+        return self.client.get(
+            reverse('admin:simpellab_sales_invoice_print', args=(self.invoice.pk,)))
+
+    def test_process_slots_limited(self):
+        with mock.patch('simpellab.admin.pdf.PDF_LOCK_ROOT', pdf_cache.root):
+            with process_slot(slots=1):
+                with self.assertRaises(PDFRenderBusy):
+                    with process_slot(slots=1, timeout=0):
+                        pass
+            with process_slot(slots=1, timeout=0) as slot:
+                self.assertEqual(slot, 0)
+
+    def test_busy_print_retried_later(self):
+        self.convert_to_pdf.side_effect = PDFRenderBusy
+        modeladmin = admin.site._registry[Invoice]
+        with mock.patch.object(modeladmin, 'print_async', False):
+            response = self.print_invoice()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+    def test_pending_print_enqueued_once(self):
+        response = self.print_invoice()
+        self.assertEqual(self.queue.enqueue.call_count, 1)
+        status_url = response.url
+        self.assertIn('/print/', status_url)
+        self.queue.fetch_job.return_value = mock.Mock(**{'get_status.return_value': 'queued'})
+        self.assertEqual(self.print_invoice().url, status_url)
+        self.assertEqual(self.queue.enqueue.call_count, 1)
+
+        response = self.client.get(status_url + '&format=json')
+        self.assertEqual(response.json(), {'status': 'queued', 'download_url': None})
+
+        # Job runs, status page redirect to download
+        func, *args = self.queue.enqueue.call_args[0]
+        func(*args)
+        download_url = self.client.get(status_url).url
+        response = self.client.get(download_url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(count_pages(b''.join(response.streaming_content)), 1)
+
+    def test_print_key_scoped_to_model(self):
+        status_url = self.print_invoice().url
+        func, *args = self.queue.enqueue.call_args[0]
+        key = func(*args)
+        download = reverse('admin:simpellab_sales_invoice_print_download', args=(key,))
+        token = get_print_token(Invoice._meta, key)
+        self.assertEqual(
+            self.client.get('%s?token=%s' % (download, token)).status_code, 200)
+        self.assertEqual(self.client.get(status_url.split('?')[0]).status_code, 404)
+        self.assertEqual(self.client.get(download).status_code, 404)
+        token = get_print_token(SalesOrder._meta, key)
+        self.assertEqual(
+            self.client.get('%s?token=%s' % (download, token)).status_code, 404)
+        token = get_print_token(Invoice._meta, 'other')
+        self.assertEqual(
+            self.client.get('%s?token=%s' % (download, token)).status_code, 404)
+
+
+class PolymorphicAdminTest(TestCase):
+
+    def setUp(self):
+        cache = mock.patch.dict(PolymorphicParentAdminMixin._child_models, clear=True)
+        cache.start()
+        self.addCleanup(cache.stop)
+        self.admin_class = type(admin.site._registry[Product])
+
+    def test_child_models_resolved_once(self):
+        with mock.patch.object(hooks, 'get_hooks', wraps=hooks.get_hooks) as get_hooks:
+            for i in range(2):
+                modeladmin = self.admin_class(Product, admin.site)
+                self.assertEqual(modeladmin.get_child_models()[:2], [Asset, Inventory])
+        get_hooks.assert_called_once_with('product_child_model')
+        expected = {
+            model: ContentType.objects.get_for_model(model, for_concrete_model=False).id
+            for model in modeladmin.get_child_models()
+        }
+        self.assertEqual(modeladmin.child_content_type_ids, expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.admin_class(Product, admin.site).child_content_type_ids, expected)
+
+    def test_invalid_child_model_hook_reported(self):
+        with mock.patch.object(hooks, 'get_hooks', return_value=[lambda: Partner]):
+            errors = check_polymorphic_admins()
+        self.assertIn(
+            ('simpellab_admin.E001', self.admin_class),
+            [(error.id, error.obj) for error in errors])
+        self.assertNotIn(self.admin_class, PolymorphicParentAdminMixin._child_models)
+
+
+class MenuCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create(username='menu', is_staff=True)
+        self.perm = Permission.objects.get(codename='view_product')
+
+    def get_fingerprint(self):
+        return get_permission_fingerprint(
+            get_user_model().objects.get(pk=self.user.pk))
+
+    def test_fingerprint_changes_on_user_permission_change(self):
+        before = self.get_fingerprint()
+        self.user.user_permissions.add(self.perm)
+        added = self.get_fingerprint()
+        self.assertNotEqual(added, before)
+        self.user.user_permissions.clear()
+        self.assertEqual(self.get_fingerprint(), before)
+
+    def test_fingerprint_changes_on_group_change(self):
+        group = Group.objects.create(name='sales')
+        group.permissions.add(self.perm)
+        before = self.get_fingerprint()
+        self.user.groups.add(group)
+        in_group = self.get_fingerprint()
+        self.assertNotEqual(in_group, before)
+        group.permissions.remove(self.perm)
+        self.assertEqual(self.get_fingerprint(), before)
+        group.permissions.add(self.perm)
+        self.assertEqual(self.get_fingerprint(), in_group)
+        group.delete()
+        self.assertEqual(self.get_fingerprint(), before)
+
+    def test_version_not_reused_after_eviction(self):
+        cache.set('menu:version', 1, None)
+        invalidate_menus()
+        self.assertEqual(get_menu_version(), 2)
+        cache.delete('menu:version')
+        invalidate_menus()
+        self.assertNotIn(get_menu_version(), [1, 2])
+        cache.delete('menu:version')
+        self.assertNotIn(get_menu_version(), [1, 2])
+
+    def test_active_item_marked_for_request_path(self):
+        menu = CachedMenu('test_menu_item')
+        items = [
+            lambda request: MenuItem('Orders', '/orders/', order=1),
+            lambda request: MenuItem('Invoices', '/invoices/', order=2),
+        ]
+        factory = RequestFactory()
+        with mock.patch.object(CachedMenu, 'registered_menu_items', items), \
+                mock.patch('simpellab.core.menus.render_to_string',
+                           wraps=render_to_string) as render:
+            for path, active in [('/orders/', 'Orders'), ('/invoices/', 'Invoices'),
+                                 ('/partners/', None)]:
+                request = factory.get(path)
+                request.user = self.user
+                html = menu.render_html(request)
+                self.assertNotIn('__menu_active_', html)
+                marked = [
+                    label for label in ['Orders', 'Invoices']
+                    if '<li class="mm-active">' in html.split(label)[0].rsplit('</li>', 1)[-1]
+                ]
+                self.assertEqual(marked, [active] if active else [])
+        self.assertEqual(render.call_count, 2)
+
+
+class AsyncQRCodeTest(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        patches = [
+            mock.patch.object(qrcode_workers, 'queue'),
+            # Run commit callbacks at once, the test transaction never commits
+            mock.patch.object(transaction, 'on_commit', side_effect=lambda func: func()),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.queue = qrcode_workers.queue
+        self.queue.fetch_job.return_value = None
+        self.customer = Partner.objects.create(name='Customer')
+
+    def test_save_enqueues_instead_of_rendering(self):
+        with mock.patch('django_qrcodes.models.QRCodeMixin.make_image') as make_image:
+            order = LaboratoriumOrder.objects.create(customer=self.customer)
+        make_image.assert_not_called()
+        self.assertFalse(order.qrcode)
+        self.queue.enqueue.assert_called_once_with(
+            qrcode_workers.generate_qrcodes_task, order._meta.label, [order.pk],
+            force=False, job_id='qrcode-%s-%s-%s' % (
+                order._meta.app_label, order._meta.model_name, order.pk))
+
+    def test_pending_job_not_enqueued_again(self):
+        order = LaboratoriumOrder.objects.create(customer=self.customer)
+        self.queue.fetch_job.return_value = mock.Mock(**{'get_status.return_value': 'queued'})
+        order.save()
+        self.assertEqual(self.queue.enqueue.call_count, 1)
+        self.queue.fetch_job.return_value.get_status.return_value = 'finished'
+        order.save()
+        self.assertEqual(self.queue.enqueue.call_count, 2)
+
+    def test_saved_when_redis_down(self):
+        self.queue.fetch_job.side_effect = RedisConnectionError
+        with self.assertLogs('simpellab.qrcodes', 'WARNING'):
+            order = LaboratoriumOrder.objects.create(customer=self.customer)
+        self.assertTrue(SalesOrder.objects.filter(pk=order.pk).exists())
+        self.queue.enqueue.assert_not_called()
+
+    def test_regenerate_qrcodes(self):
+        pks = sorted(
+            LaboratoriumOrder.objects.create(customer=self.customer).pk for i in range(3))
+        self.queue.reset_mock()
+        call_command('regenerate_qrcodes', 'simpellab_sales.SalesOrder',
+                     '--chunk-size', '2', stdout=StringIO())
+        self.assertEqual(
+            [call[0][2] for call in self.queue.enqueue.call_args_list],
+            [pks[:2], pks[2:]])
+        call_command('regenerate_qrcodes', 'simpellab_sales.SalesOrder', '--sync',
+                     stdout=StringIO())
+        rendered = {order.qrcode.name for order in SalesOrder.objects.all()}
+        self.assertEqual(len(rendered), 3)
+        self.assertTrue(all(rendered))
+        # Existing images kept without --force
+        with mock.patch('django_qrcodes.models.QRCodeMixin.make_image') as make_image:
+            call_command('regenerate_qrcodes', 'simpellab_sales.SalesOrder', '--sync',
+                         stdout=StringIO())
+        make_image.assert_not_called()
+
+
+class HookRegistryTest(TestCase):
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(hooks, '_hooks', {}),
+            mock.patch.object(hooks, '_frozen_hooks', None),
+            mock.patch.object(hooks, '_searched_for_hooks', True),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_hooks_sorted_by_order(self):
+        first, second, third = mock.Mock(), mock.Mock(), mock.Mock()
+        hooks.register('test_hook', third, order=2)
+        hooks.register('test_hook', first, order=-1)
+        self.assertIs(hooks.register('test_hook')(second), second)
+        self.assertEqual(hooks.get_hooks('test_hook'), (first, second, third))
+        self.assertEqual(hooks.get_hooks('missing_hook'), ())
+
+    def test_registry_frozen_on_first_lookup(self):
+        hook = mock.Mock()
+        hooks.register('test_hook', hook)
+        frozen = hooks.get_hooks('test_hook')
+        self.assertIsNotNone(hooks._frozen_hooks)
+        self.assertIs(hooks.get_hooks('test_hook'), frozen)
+        with self.assertRaises(ImproperlyConfigured):
+            hooks.register('test_hook', mock.Mock())
+        with self.assertRaises(ImproperlyConfigured):
+            hooks.register('other_hook')(mock.Mock())
+        self.assertEqual(hooks.get_hooks('test_hook'), (hook,))
+
+    def test_lookups_counted_in_debug_header(self):
+        def view(request):
+            hooks.get_hooks('test_hook')
+            hooks.get_hooks('test_hook')
+            return HttpResponse()
+        request = RequestFactory().get('/')
+        with override_settings(DEBUG=True):
+            response = HookLookupMiddleware(view)(request)
+        self.assertEqual(response['X-Hook-Lookups'], '2')
+        with override_settings(DEBUG=False):
+            response = HookLookupMiddleware(view)(request)
+        self.assertFalse(response.has_header('X-Hook-Lookups'))